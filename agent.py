@@ -0,0 +1,299 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from itertools import islice
+from datetime import datetime
+from urllib.parse import urlsplit
+import psutil
+
+from utils.network_utils import sample_interfaces
+from utils.protocol_stats import ProtocolSampler
+from utils.metrics import timed
+from utils.constants import (
+    COLLECTOR_INTERVAL, AGENT_BATCH_ROWS, AGENT_FLUSH_SECONDS, AGENT_BUFFER_ROWS,
+    AGENT_MAX_BACKOFF, UDP_MAX_DATAGRAM,
+)
+
+WIRE_VERSION = 1
+
+def encode_batch(host, agent_id, batch_id, rows):
+    """
+    One batch on the wire: columnar JSON (one list per column, timestamps as ISO
+    strings), zlib-compressed. Columnar keeps repeated keys out of the payload and
+    compresses well because each column's values are alike.
+    """
+    columns = {}
+    for row in rows:
+        for col, value in row.items():
+            columns.setdefault(col, []).append(value.isoformat() if isinstance(value, datetime) else value)
+    payload = {"v": WIRE_VERSION, "host": host, "agent": agent_id, "batch": batch_id,
+               "rows": len(rows), "columns": columns}
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), 6)
+
+def decode_batch(blob):
+    """Inverse of encode_batch; raises ValueError on anything malformed."""
+    try:
+        payload = json.loads(zlib.decompress(blob))
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError(f"undecodable batch: {exc}") from exc
+    if not isinstance(payload, dict) or payload.get("v") != WIRE_VERSION or not payload.get("host"):
+        raise ValueError("unsupported batch")
+    if not isinstance(payload.get("columns"), dict) or not isinstance(payload.get("batch"), int) \
+            or not isinstance(payload.get("rows"), int) or "agent" not in payload:
+        raise ValueError("incomplete batch")
+    return payload
+
+class HttpTransport:
+    """POST /ingest over one keep-alive connection. send() -> (accepted, retry_after)."""
+
+    def __init__(self, url, timeout=10.0):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._conn = None
+
+    def send(self, blob):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self._conn.request("POST", "/ingest", body=blob, headers={
+                "Content-Type": "application/json", "Content-Encoding": "deflate",
+            })
+            response = self._conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.status in (429, 503):
+            # aggregator is saturated: keep the batch and slow down
+            return False, float(response.getheader("Retry-After") or 1.0)
+        if response.status >= 400:
+            raise OSError(f"aggregator rejected batch: HTTP {response.status}")
+        return True, 0.0
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class UdpTransport:
+    """Fire-and-forget datagrams: no acknowledgement, so no retry or backpressure."""
+
+    max_bytes = UDP_MAX_DATAGRAM
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.address = (parts.hostname, parts.port)
+        family = socket.AF_INET6 if ":" in parts.hostname else socket.AF_INET
+        self._sock = socket.socket(family, socket.SOCK_DGRAM)
+
+    def send(self, blob):
+        if len(blob) > self.max_bytes:
+            raise ValueError("batch exceeds one datagram")
+        self._sock.sendto(blob, self.address)
+        return True, 0.0
+
+    def close(self):
+        self._sock.close()
+
+def make_transport(url):
+    scheme = urlsplit(url).scheme
+    if scheme == "http":
+        return HttpTransport(url)
+    if scheme == "udp":
+        return UdpTransport(url)
+    raise ValueError(f"unsupported aggregator URL scheme: {scheme!r} (use http:// or udp://)")
+
+class Agent:
+    """
+    Lightweight remote sampler. One thread samples the local NICs with the same code
+    as the collector (sample_interfaces) into a bounded local buffer; another pushes
+    compressed batches to the aggregator. Batches stay in the buffer until accepted,
+    so an unreachable or saturated aggregator means retries with exponential backoff
+    (honouring Retry-After) rather than lost samples; if the outage outlasts the
+    buffer, the oldest rows are dropped and counted.
+    """
+
+    def __init__(self, url, name=None, interval=COLLECTOR_INTERVAL, ifaces=None,
+                 batch_rows=AGENT_BATCH_ROWS, flush_seconds=AGENT_FLUSH_SECONDS,
+                 buffer_rows=AGENT_BUFFER_ROWS, max_backoff=AGENT_MAX_BACKOFF,
+                 net_io=None, net_if_addrs=None, procfs_root=None):
+        self.url = url
+        self.name = name or socket.gethostname()
+        self.agent_id = uuid.uuid4().hex  # lets the aggregator tell restarts from retries
+        self.interval = float(interval)
+        self.ifaces = ifaces
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.max_backoff = max_backoff
+        self.transport = make_transport(url)
+        self._net_io = net_io or (lambda: psutil.net_io_counters(pernic=True))
+        self._net_if_addrs = net_if_addrs or psutil.net_if_addrs
+        self.protocol_sampler = ProtocolSampler(procfs_root=procfs_root) if procfs_root else ProtocolSampler()
+        self.prev_counters = {}
+        self._buffer = deque()
+        self._buffer_rows = buffer_rows
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._next_batch = 0
+        self.stats = {"samples": 0, "rows": 0, "sent_rows": 0, "sent_batches": 0, "sent_bytes": 0,
+                      "dropped_rows": 0, "retries": 0, "throttled": 0, "last_error": None}
+
+    @property
+    def buffered(self):
+        return len(self._buffer)
+
+    def sample_once(self):
+        net_io = self._net_io()
+        rows = sample_interfaces(self.ifaces or list(net_io.keys()), self.prev_counters, net_io=net_io,
+                                 addrs=self._net_if_addrs(), protocol_sampler=self.protocol_sampler)
+        with self._lock:
+            overflow = max(0, min(len(self._buffer), len(self._buffer) + len(rows) - self._buffer_rows))
+            for _ in range(overflow):
+                self._buffer.popleft()
+            self._buffer.extend(rows)
+            self.stats["dropped_rows"] += overflow
+            self.stats["samples"] += 1
+            self.stats["rows"] += len(rows)
+        if len(self._buffer) >= self.batch_rows:
+            self._wake.set()
+        return len(rows)
+
+    def _sample_loop(self):
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample_once()
+            except Exception as exc:  # keep sampling through transient psutil errors
+                self.stats["last_error"] = repr(exc)
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def _take_batch(self):
+        with self._lock:
+            return list(islice(self._buffer, self.batch_rows))
+
+    def _encode(self, rows):
+        blob = encode_batch(self.name, self.agent_id, self._next_batch, rows)
+        limit = getattr(self.transport, "max_bytes", None)
+        while limit and len(blob) > limit and len(rows) > 1:
+            rows = rows[:len(rows) // 2]
+            blob = encode_batch(self.name, self.agent_id, self._next_batch, rows)
+        return rows, blob
+
+    def flush_once(self):
+        """Push one batch. Returns rows accepted; raises on transport errors."""
+        rows = self._take_batch()
+        if not rows:
+            return 0
+        rows, blob = self._encode(rows)
+        with timed("agent_push", rows=len(rows)):
+            accepted, retry_after = self.transport.send(blob)
+        if not accepted:
+            self.stats["throttled"] += 1
+            self._stop_event.wait(retry_after)
+            return 0
+        with self._lock:
+            # sample_once may have dropped some of these rows from the front meanwhile;
+            # remove whatever of this batch is still there
+            sent = {id(row) for row in rows}
+            while self._buffer and id(self._buffer[0]) in sent:
+                self._buffer.popleft()
+        self._next_batch += 1
+        self.stats["sent_rows"] += len(rows)
+        self.stats["sent_batches"] += 1
+        self.stats["sent_bytes"] += len(blob)
+        return len(rows)
+
+    def _send_loop(self):
+        backoff = 0.5
+        while not self._stop_event.is_set() or self._buffer:
+            if len(self._buffer) < self.batch_rows and not self._stop_event.is_set():
+                self._wake.wait(self.flush_seconds)
+                self._wake.clear()
+            try:
+                while self._buffer and self.flush_once():
+                    pass
+                backoff = 0.5
+            except Exception as exc:
+                self.stats["retries"] += 1
+                self.stats["last_error"] = repr(exc)
+                if self._stop_event.is_set():
+                    return  # shutting down: don't hang on an unreachable aggregator
+                self._stop_event.wait(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def start(self):
+        for target, name in ((self._sample_loop, "agent-sampler"), (self._send_loop, "agent-sender")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.transport.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sample this host's interfaces and push them to a Wi-Fi Guardian aggregator.")
+    parser.add_argument("url", help="aggregator address, e.g. http://10.0.0.5:9200 or udp://10.0.0.5:9201")
+    parser.add_argument("--name", default=None, help="host name shown in the dashboard (default: hostname)")
+    parser.add_argument("--interval", type=float, default=COLLECTOR_INTERVAL, help="seconds between samples")
+    parser.add_argument("--ifaces", nargs="*", default=None, help="interfaces to sample (default: all)")
+    parser.add_argument("--batch-rows", type=int, default=AGENT_BATCH_ROWS)
+    parser.add_argument("--flush-seconds", type=float, default=AGENT_FLUSH_SECONDS)
+    parser.add_argument("--buffer-rows", type=int, default=AGENT_BUFFER_ROWS)
+    parser.add_argument("--fake-ifaces", type=int, default=0,
+                        help="replay this many synthetic interfaces instead of psutil (load testing)")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between status lines")
+    args = parser.parse_args(argv)
+
+    source = {}
+    if args.fake_ifaces:
+        from utils.synthetic import generate_history, FakeCounters
+        fake = FakeCounters(generate_history(args.fake_ifaces * 1_000, ifaces=args.fake_ifaces,
+                                             interval=args.interval, seed=os.getpid()))
+        source = {"net_io": fake.net_io_counters, "net_if_addrs": fake.net_if_addrs,
+                  "procfs_root": os.devnull}
+    agent = Agent(args.url, name=args.name, interval=args.interval, ifaces=args.ifaces,
+                  batch_rows=args.batch_rows, flush_seconds=args.flush_seconds,
+                  buffer_rows=args.buffer_rows, **source).start()
+    deadline = None if args.duration is None else time.monotonic() + args.duration
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(args.report_every if deadline is None
+                       else max(0.0, min(args.report_every, deadline - time.monotonic())))
+            s = agent.stats
+            print(
+                f"host={agent.name} rows={s['rows']} sent={s['sent_rows']} buffered={agent.buffered} "
+                f"batches={s['sent_batches']} bytes={s['sent_bytes']} dropped={s['dropped_rows']} "
+                f"retries={s['retries']} throttled={s['throttled']}"
+                + (f" error={s['last_error']}" if s["last_error"] else ""),
+                flush=True,
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from utils.agent import decode_batch
+from utils.history_store import HistoryStore
+from utils.features import FeatureEngine
+from utils.anomaly import StreamingDetector, to_feature_matrix
+from utils.network_utils import fill_pending_locations
+from utils.collector import score_backlog
+from utils.metrics import timed
+from utils.constants import (
+    AGGREGATOR_HOST, AGGREGATOR_PORT, AGGREGATOR_UDP_PORT, AGGREGATOR_WORKERS,
+    AGGREGATOR_QUEUE_BATCHES, AGGREGATOR_HOST_CAPACITY,
+)
+
+MAX_BODY_BYTES = 16 * 2**20
+
+class HostState:
+    """History, rolling features and detector for one remote host."""
+
+    def __init__(self, name, capacity=AGGREGATOR_HOST_CAPACITY, alerts=None):
+        self.name = name
+        self.alerts = alerts  # utils.alerts.AlertPipeline, or None
+        self.store = HistoryStore(capacity=capacity)
+        self.features = FeatureEngine()
+        self.detector = StreamingDetector()
+        self.agent_id = None
+        self.last_batch = -1
+        self.batches = 0
+        self.rows = 0
+        self.duplicates = 0
+        self.last_seen = None
+
+    def ingest(self, payload):
+        """
+        Apply one decoded batch; returns the rows appended. A batch id at or below the
+        last one from the same agent run is a retry whose ack was lost and is skipped
+        (over UDP this also drops reordered datagrams, which is fine for a lossy path).
+        """
+        if payload["agent"] == self.agent_id and payload["batch"] <= self.last_batch:
+            self.duplicates += 1
+            return 0
+        self.agent_id, self.last_batch = payload["agent"], payload["batch"]
+        self.last_seen = time.time()
+        df = pd.DataFrame(payload["columns"])
+        if df.empty:
+            return 0
+        df["timestamp"] = pd.to_datetime(df["timestamp"], format="ISO8601")
+        df = df.join(self.features.update(df))
+        result = self.detector.update(to_feature_matrix(df))
+        if result is not None:
+            df["anomaly"], df["anomaly_score"] = result
+        self.store.append(df)
+        if self.alerts is not None:
+            self.alerts.write(df, host=self.name)
+        score_backlog(self.store, self.detector)
+        fill_pending_locations(self.store)
+        self.batches += 1
+        self.rows += len(df)
+        return len(df)
+
+    def summary(self):
+        return {
+            "host": self.name, "rows": self.rows, "batches": self.batches, "duplicates": self.duplicates,
+            "anomalies": int((self.store.view("anomaly") == -1).sum()),
+            "last_seen_s": round(time.time() - self.last_seen, 1) if self.last_seen else None,
+        }
+
+class _UdpIngest(asyncio.DatagramProtocol):
+    def __init__(self, aggregator):
+        self.aggregator = aggregator
+
+    def datagram_received(self, data, addr):
+        try:
+            payload = decode_batch(data)
+        except ValueError:
+            self.aggregator.stats["bad_batches"] += 1
+            return
+        if not self.aggregator.submit(payload):
+            self.aggregator.stats["udp_dropped"] += 1  # no way to push back on a datagram
+
+class Aggregator:
+    """
+    Central ingest point for utils.agent pushes, on one asyncio event loop.
+
+    HTTP (POST /ingest, keep-alive) and UDP batches are decoded on the loop and queued
+    to one of `workers` bounded queues, chosen by host so each host's batches are
+    applied in order. Workers run the CPU-heavy part (features, detector, history
+    append) on a thread pool. When a host's queue is full, HTTP pushes get 503 with
+    Retry-After so agents back off and keep buffering; UDP batches are dropped and
+    counted. GET /hosts returns a JSON summary per host. Scored batches are passed to
+    `alerts` (utils.alerts.AlertPipeline) under their host's name.
+
+    port=0 listens on a free port; `port` holds the bound one once ready. On stop,
+    open keep-alive connections are closed and their handlers finish before the
+    loop exits.
+    """
+
+    def __init__(self, host=AGGREGATOR_HOST, port=AGGREGATOR_PORT, udp_port=AGGREGATOR_UDP_PORT,
+                 workers=AGGREGATOR_WORKERS, queue_batches=AGGREGATOR_QUEUE_BATCHES,
+                 capacity=AGGREGATOR_HOST_CAPACITY, alerts=None):
+        self.bind_host = host
+        self.port = port
+        self.udp_port = udp_port
+        self.workers = workers
+        self.queue_batches = queue_batches
+        self.capacity = capacity
+        self.alerts = alerts
+        self.hosts = {}
+        self.stats = {"batches": 0, "rows": 0, "rejected": 0, "udp_dropped": 0, "bad_batches": 0, "errors": 0}
+        self.last_error = None
+        self.ready = threading.Event()
+        self._hosts_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="aggregator")
+        self._queues = []
+        self._clients = {}  # connection handler task -> its writer
+        self._loop = None
+        self._stopping = None
+        self._thread = None
+
+    def host(self, name):
+        with self._hosts_lock:
+            state = self.hosts.get(name)
+            if state is None:
+                state = self.hosts[name] = HostState(name, self.capacity, self.alerts)
+            return state
+
+    def summary(self):
+        with self._hosts_lock:
+            states = list(self.hosts.values())
+        return [state.summary() for state in sorted(states, key=lambda s: s.name)]
+
+    def submit(self, payload):
+        """Queue a decoded batch; False when the host's worker is saturated."""
+        queue = self._queues[zlib.crc32(payload["host"].encode()) % len(self._queues)]
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def _ingest(self, state, payload):
+        with timed("aggregator_ingest") as span:
+            span.rows = state.ingest(payload)
+        return span.rows
+
+    async def _worker(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            payload = await queue.get()
+            try:
+                host = self.host(payload["host"])
+                rows = await loop.run_in_executor(self._executor, self._ingest, host, payload)
+                self.stats["batches"] += 1
+                self.stats["rows"] += rows
+            except Exception as exc:  # a bad batch must not stop the worker
+                self.stats["errors"] += 1
+                self.last_error = repr(exc)
+            finally:
+                queue.task_done()
+
+    def _route(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if method == "POST" and path == "/ingest":
+            try:
+                payload = decode_batch(body)
+            except ValueError as exc:
+                self.stats["bad_batches"] += 1
+                return 400, {"error": str(exc)}, {}
+            if not self.submit(payload):
+                self.stats["rejected"] += 1
+                return 503, {"error": "busy"}, {"Retry-After": "1"}
+            return 202, {"accepted": payload["rows"]}, {}
+        if method == "GET" and path == "/hosts":
+            return 200, {"hosts": self.summary(), "stats": self.stats}, {}
+        return 404, {"error": "not found"}, {}
+
+    async def _handle_http(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, body, extra = 413, {"error": "batch too large"}, {}
+                    headers["connection"] = "close"
+                else:
+                    status, body, extra = self._route(method, path, await reader.readexactly(length))
+                data = json.dumps(body).encode()
+                head = [f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}",
+                        "Content-Type: application/json", f"Content-Length: {len(data)}"]
+                head += [f"{k}: {v}" for k, v in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._clients.pop(task, None)
+            writer.close()
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._queues = [asyncio.Queue(self.queue_batches) for _ in range(self.workers)]
+        tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        server = await asyncio.start_server(self._handle_http, self.bind_host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        udp = None
+        if self.udp_port:
+            udp, _ = await self._loop.create_datagram_endpoint(
+                lambda: _UdpIngest(self), local_addr=(self.bind_host, self.udp_port))
+        self.ready.set()
+        try:
+            async with server:
+                await self._stopping.wait()
+        finally:
+            if udp is not None:
+                udp.close()
+            # closing a connection ends its handler's read with EOF, so handlers return
+            # normally instead of being cancelled mid-read when the loop shuts down
+            for writer in list(self._clients.values()):
+                writer.close()
+            if self._clients:
+                await asyncio.wait(list(self._clients), timeout=5.0)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        try:
+            asyncio.run(self.serve())
+        except OSError as exc:  # port taken, e.g. by another app instance
+            self.last_error = repr(exc)
+        finally:
+            self.ready.set()
+
+    def start(self, timeout=5.0):
+        """Run the event loop on a daemon thread; returns once listening (or failed)."""
+        self._thread = threading.Thread(target=self._run, name="aggregator-loop", daemon=True)
+        self._thread.start()
+        self.ready.wait(timeout)
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout=5.0):
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+def get_aggregator():
+    """Start (once per process) and return the shared aggregator."""
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            from utils.alerts import get_alert_pipeline
+            _aggregator = Aggregator(alerts=get_alert_pipeline()).start()
+        return _aggregator
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Receive samples from Wi-Fi Guardian agents on many hosts.")
+    parser.add_argument("--host", default=AGGREGATOR_HOST, help="address to listen on (0.0.0.0 for all)")
+    parser.add_argument("--port", type=int, default=AGGREGATOR_PORT, help="HTTP port")
+    parser.add_argument("--udp-port", type=int, default=AGGREGATOR_UDP_PORT, help="UDP port (0 disables UDP)")
+    parser.add_argument("--workers", type=int, default=AGGREGATOR_WORKERS)
+    parser.add_argument("--no-alerts", action="store_true",
+                        help="don't dispatch anomaly incidents to alert sinks")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between status lines")
+    args = parser.parse_args(argv)
+
+    from utils.alerts import get_alert_pipeline
+    alerts = None if args.no_alerts else get_alert_pipeline()
+    aggregator = Aggregator(args.host, args.port, args.udp_port, workers=args.workers, alerts=alerts).start()
+    if not aggregator.running:
+        parser.exit(1, f"aggregator failed to start: {aggregator.last_error}\n")
+    last = time.monotonic()
+    deadline = None if args.duration is None else last + args.duration
+    last_rows = 0
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(args.report_every if deadline is None
+                       else max(0.0, min(args.report_every, deadline - time.monotonic())))
+            now, s = time.monotonic(), aggregator.stats
+            rate = (s["rows"] - last_rows) / max(now - last, 1e-9)
+            last, last_rows = now, s["rows"]
+            print(
+                f"hosts={len(aggregator.hosts)} rows={s['rows']} rows_per_s={rate:.0f} "
+                f"batches={s['batches']} rejected={s['rejected']} udp_dropped={s['udp_dropped']} "
+                f"bad={s['bad_batches']} errors={s['errors']}"
+                + (f" error={aggregator.last_error}" if aggregator.last_error else ""),
+                flush=True,
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        aggregator.stop()
+        if alerts is not None:
+            alerts.close()
+
+if __name__ == "__main__":
+    main()
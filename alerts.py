@@ -0,0 +1,519 @@
+import argparse
+import http.client
+import json
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+
+from utils.metrics import timed
+from utils.constants import (
+    ALERTS_ENABLED, ALERT_WINDOW, ALERT_QUEUE_SIZE, ALERT_BATCH_SIZE, ALERT_BATCH_SECONDS, ALERT_RETRIES,
+    ALERT_MAX_BACKOFF, ALERT_FILE, ALERT_WEBHOOK_URL, ALERT_SYSLOG_ADDRESS,
+)
+
+def _iso(ns):
+    return pd.Timestamp(int(ns)).isoformat()
+
+class Incident:
+    """Consecutive anomalies on one host/interface, no more than the window apart."""
+    __slots__ = ("host", "interface", "opened", "last_seen", "events", "min_score",
+                 "bytes_sent", "bytes_recv")
+
+    def __init__(self, host, interface, ts, score, sent, recv):
+        self.host = host
+        self.interface = interface
+        self.opened = self.last_seen = ts
+        self.events = 0
+        self.min_score = score
+        self.bytes_sent = self.bytes_recv = 0
+        self.add(ts, score, sent, recv)
+
+    @property
+    def id(self):
+        # stable across retries, so receivers can drop redelivered notifications
+        return f"{self.host}/{self.interface}/{_iso(self.opened)}"
+
+    def add(self, ts, score, sent, recv):
+        self.last_seen = max(self.last_seen, ts)
+        self.events += 1
+        # anomaly scores follow decision_function: lower is more anomalous
+        self.min_score = min(self.min_score, score)
+        self.bytes_sent += sent
+        self.bytes_recv += recv
+
+    def as_dict(self):
+        return {
+            "id": self.id, "host": self.host, "interface": self.interface,
+            "opened": _iso(self.opened), "last_seen": _iso(self.last_seen),
+            "duration_s": (self.last_seen - self.opened) / 1e9, "events": self.events,
+            "min_anomaly_score": None if np.isnan(self.min_score) else float(self.min_score),
+            "bytes_sent": int(self.bytes_sent), "bytes_recv": int(self.bytes_recv),
+        }
+
+class IncidentTracker:
+    """
+    Deduplicates anomalous samples and coalesces them into incidents, on sample time.
+
+    An anomaly on a host/interface with no open incident opens one; later anomalies
+    within `window` seconds of the last one extend it. A sample at or before the
+    incident's last anomaly is a re-report of a row already counted (e.g. a rescore)
+    and is dropped. expire(host, now) resolves the host's incidents whose last
+    anomaly is more than `window` seconds before `now`.
+    """
+
+    def __init__(self, window=ALERT_WINDOW):
+        self.window = int(window * 1e9)
+        self.open = {}  # (host, interface) -> Incident
+        self.duplicates = 0
+
+    def observe(self, host, interface, ts, score, sent, recv):
+        """Count one anomaly; returns (opened incident or None, resolved incident or None)."""
+        key = (host, interface)
+        incident = self.open.get(key)
+        if incident is not None and ts <= incident.last_seen:
+            self.duplicates += 1
+            return None, None
+        if incident is not None and ts - incident.last_seen <= self.window:
+            incident.add(ts, score, sent, recv)
+            return None, None
+        opened = self.open[key] = Incident(host, interface, ts, score, sent, recv)
+        return opened, incident
+
+    def expire(self, host, now):
+        done = [key for key, inc in self.open.items() if key[0] == host and now - inc.last_seen > self.window]
+        return [self.open.pop(key) for key in done]
+
+    def close_all(self):
+        done, self.open = list(self.open.values()), {}
+        return done
+
+# -- sinks: send(batch) delivers a list of notifications or raises ---------------------
+
+class FileSink:
+    """Appends notifications as JSON lines."""
+    name = "file"
+
+    def __init__(self, path=ALERT_FILE):
+        self.path = path
+
+    def send(self, batch):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(n, separators=(",", ":")) + "\n" for n in batch))
+
+    def close(self):
+        pass
+
+class WebhookSink:
+    """POSTs {"alerts": [...]} as JSON over one keep-alive connection; non-2xx raises."""
+    name = "webhook"
+
+    def __init__(self, url=ALERT_WEBHOOK_URL, timeout=5.0):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host, self.port = parts.hostname, parts.port or (443 if self.https else 80)
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self._conn = None
+
+    def send(self, batch):
+        if self._conn is None:
+            conn = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._conn = conn(self.host, self.port, timeout=self.timeout)
+        try:
+            self._conn.request("POST", self.path, body=json.dumps({"alerts": batch}).encode(),
+                               headers={"Content-Type": "application/json"})
+            response = self._conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if not 200 <= response.status < 300:
+            raise OSError(f"webhook answered HTTP {response.status}")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class SyslogSink:
+    """
+    One RFC 3164 datagram per notification (facility local0, severity warning), to
+    "host:port" over UDP or to a local socket path such as /dev/log.
+    """
+    name = "syslog"
+    PRIORITY = 16 * 8 + 4
+
+    def __init__(self, address=ALERT_SYSLOG_ADDRESS):
+        if address.startswith("/"):
+            self.address = address
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        else:
+            host, _, port = address.rpartition(":")
+            self.address = (host or "127.0.0.1", int(port or 514))
+            self._sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_DGRAM)
+        self.hostname = socket.gethostname()
+
+    def send(self, batch):
+        stamp = datetime.now().strftime("%b %d %H:%M:%S")
+        for n in batch:
+            body = json.dumps(n, separators=(",", ":"))
+            message = f"<{self.PRIORITY}>{stamp} {self.hostname} wifi-guardian: {body}"
+            self._sock.sendto(message.encode()[:8192], self.address)
+
+    def close(self):
+        self._sock.close()
+
+def default_sinks():
+    """Sinks configured by ALERT_FILE, ALERT_WEBHOOK_URL and ALERT_SYSLOG_ADDRESS."""
+    sinks = []
+    if ALERT_FILE:
+        sinks.append(FileSink(ALERT_FILE))
+    if ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink(ALERT_WEBHOOK_URL))
+    if ALERT_SYSLOG_ADDRESS:
+        sinks.append(SyslogSink(ALERT_SYSLOG_ADDRESS))
+    return sinks
+
+class SinkWorker:
+    """
+    Delivers to one sink from its own bounded queue on its own thread, in batches of
+    up to batch_size (waiting at most batch_seconds to fill one). A failed batch is
+    retried with exponential backoff up to `retries` more times, then counted as
+    failed. offer() never blocks: when the queue is full the notification is dropped
+    and counted, so a slow or dead receiver costs the producer nothing.
+    """
+
+    def __init__(self, sink, queue_size=ALERT_QUEUE_SIZE, batch_size=ALERT_BATCH_SIZE,
+                 batch_seconds=ALERT_BATCH_SECONDS, retries=ALERT_RETRIES, max_backoff=ALERT_MAX_BACKOFF):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.stats = {"queued": 0, "delivered": 0, "batches": 0, "dropped": 0, "failed": 0, "retries": 0,
+                      "last_error": None}
+        self._stop_event = threading.Event()
+        self._deadline = None
+        self._thread = threading.Thread(target=self._run, name=f"alert-{sink.name}", daemon=True)
+        self._thread.start()
+
+    def offer(self, notification):
+        try:
+            self.queue.put_nowait(notification)
+            self.stats["queued"] += 1
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def _take_batch(self):
+        try:
+            batch = [self.queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_seconds
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _deliver(self, batch):
+        backoff = 0.5
+        for attempt in range(self.retries + 1):
+            try:
+                with timed(f"alert_{self.sink.name}", rows=len(batch)):
+                    self.sink.send(batch)
+                self.stats["delivered"] += len(batch)
+                self.stats["batches"] += 1
+                return True
+            except Exception as exc:
+                self.stats["last_error"] = repr(exc)
+                if attempt == self.retries or self._past_deadline():
+                    break  # out of attempts, or out of shutdown time: don't hang on a dead receiver
+                self.stats["retries"] += 1
+                # while stopping the wait returns at once: retries go back to back until the deadline
+                self._stop_event.wait(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self.max_backoff)
+        self.stats["failed"] += len(batch)
+        return False
+
+    def _run(self):
+        while not self._stop_event.is_set() or not (self.queue.empty() or self._past_deadline()):
+            batch = self._take_batch()
+            if batch:
+                self._deliver(batch)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _past_deadline(self):
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    @property
+    def pending(self):
+        return self.queue.qsize()
+
+    def drain(self, timeout=5.0):
+        """
+        Wait at most `timeout` seconds until every queued notification has been
+        delivered or given up on; the worker keeps running. True if it got there.
+        """
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """Deliver what is queued, spending at most `timeout` seconds, then stop."""
+        self._deadline = time.monotonic() + timeout
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self.sink.close()
+
+class AlertPipeline:
+    """
+    Turns the detector's labels into incident notifications and fans them out to
+    sinks without ever blocking the caller.
+
+    write(df, host) takes a scored frame as the collector (this machine, under its
+    hostname) and aggregator (per remote host) produce it; it is a collector sink
+    (write/flush). Anomalous rows (anomaly == -1) are deduplicated
+    and coalesced per host/interface by an IncidentTracker, and only two
+    notifications per incident reach the sinks: "incident_opened" on its first
+    anomaly and "incident_resolved" (with event count, duration, bytes and lowest
+    score) once the host's samples have moved `window` seconds past its last one.
+    A storm of anomalies on one interface is therefore one incident, and each
+    sink's bounded queue only sees a trickle.
+    """
+
+    def __init__(self, sinks=None, window=ALERT_WINDOW, **worker_options):
+        self.tracker = IncidentTracker(window)
+        self.local_host = socket.gethostname()
+        sinks = default_sinks() if sinks is None else sinks
+        self.workers = [SinkWorker(sink, **worker_options) for sink in sinks]
+        self.recent = []  # last resolved incidents, newest first
+        self.stats = {"rows": 0, "events": 0, "incidents": 0, "resolved": 0}
+        self._lock = threading.Lock()
+
+    def _publish(self, kind, incident):
+        notification = {"type": kind, "incident": incident.as_dict()}
+        for worker in self.workers:
+            worker.offer(notification)
+
+    def _resolve(self, incidents):
+        for incident in incidents:
+            self._publish("incident_resolved", incident)
+            self.recent.insert(0, incident)
+        del self.recent[50:]
+        self.stats["resolved"] += len(incidents)
+
+    def write(self, df, host=None):
+        """Feed one scored frame (timestamp, interface, anomaly, anomaly_score, bytes_*)."""
+        if df is None or df.empty or "anomaly" not in df:
+            return
+        host = host or self.local_host
+        ts = df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        flagged = np.flatnonzero(df["anomaly"].to_numpy(dtype=np.float64) == -1)
+        with self._lock:
+            self.stats["rows"] += len(df)
+            self.stats["events"] += len(flagged)
+            if len(flagged):
+                ifaces = df["interface"].astype(str).to_numpy()[flagged]
+                scores = df["anomaly_score"].to_numpy(dtype=np.float64)[flagged] if "anomaly_score" in df \
+                    else np.full(len(flagged), np.nan)
+                sent = df["bytes_sent"].to_numpy()[flagged]
+                recv = df["bytes_recv"].to_numpy()[flagged]
+                for iface, t, score, s, r in zip(ifaces.tolist(), ts[flagged].tolist(), scores.tolist(),
+                                                 sent.tolist(), recv.tolist()):
+                    opened, resolved = self.tracker.observe(host, iface, t, score, s, r)
+                    if resolved is not None:
+                        self._resolve([resolved])
+                    if opened is not None:
+                        self.stats["incidents"] += 1
+                        self._publish("incident_opened", opened)
+            self._resolve(self.tracker.expire(host, int(ts.max())))
+
+    def open_incidents(self, host=None):
+        with self._lock:
+            return [inc.as_dict() for inc in self.tracker.open.values() if host is None or inc.host == host]
+
+    def summary(self):
+        """Counters for the pipeline and each sink."""
+        with self._lock:
+            out = dict(self.stats, duplicates=self.tracker.duplicates, open=len(self.tracker.open))
+        out["sinks"] = {w.sink.name: dict(w.stats, pending=w.pending) for w in self.workers}
+        return out
+
+    def flush(self, timeout=5.0):
+        """
+        Resolve every open incident and wait (at most `timeout` seconds in all) for
+        the sinks to deliver what is queued. The workers keep running, so sharing
+        callers (the collector and the aggregator) can flush without stopping
+        delivery for each other. True if every queue drained.
+        """
+        with self._lock:
+            self._resolve(self.tracker.close_all())
+        deadline = time.monotonic() + timeout
+        return all([worker.drain(deadline - time.monotonic()) for worker in self.workers])
+
+    def close(self, timeout=5.0):
+        """
+        Resolve every open incident, deliver what is queued and stop the workers;
+        only for whoever owns the process (a CLI's shutdown), as the pipeline is shared.
+        """
+        with self._lock:
+            self._resolve(self.tracker.close_all())
+        for worker in self.workers:
+            worker.stop(timeout)
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_alert_pipeline():
+    """The process-wide pipeline over the configured sinks (None if ALERTS_ENABLED is off)."""
+    global _pipeline
+    if not ALERTS_ENABLED:
+        return None
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = AlertPipeline()
+        return _pipeline
+
+# -- load testing ----------------------------------------------------------------------
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        server = self.server
+        if server.delay:
+            time.sleep(server.delay)
+        if random.random() < server.fail_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+        try:
+            alerts = json.loads(body)["alerts"]
+        except (ValueError, KeyError, TypeError):
+            self.send_response(400)
+            self.end_headers()
+            return
+        with server.lock:
+            server.received += len(alerts)
+            server.requests += 1
+            for alert in alerts:
+                server.ids.add((alert["type"], alert["incident"]["id"]))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(host="127.0.0.1", port=9300, delay=0.0, fail_rate=0.0):
+    """
+    Local webhook receiver for testing: counts POSTed alerts (and distinct ones, as
+    retries may redeliver), optionally answering slowly or with 503s.
+    """
+    server = ThreadingHTTPServer((host, port), _StubHandler)
+    server.delay, server.fail_rate = delay, fail_rate
+    server.lock = threading.Lock()
+    server.received = server.requests = 0
+    server.ids = set()
+    threading.Thread(target=server.serve_forever, name="alert-stub", daemon=True).start()
+    return server
+
+def storm(pipeline, events, ifaces=50, per_write=1_000, gap_every=200, window=ALERT_WINDOW):
+    """
+    Push `events` anomalous rows across `ifaces` interfaces, per_write rows per
+    write() call, one second of sample time per row per interface, with a silence
+    longer than the window every `gap_every` rows per interface so incidents also
+    open and resolve. Returns events/s accepted by write().
+    """
+    names = np.array([f"wlan{i}" for i in range(ifaces)])
+    step = np.int64(1_000_000_000)
+    base = np.int64(pd.Timestamp("2024-01-01").value)
+    started = time.perf_counter()
+    for lo in range(0, events, per_write):
+        n = np.arange(lo, min(events, lo + per_write))
+        tick = n // ifaces
+        ts = base + tick * step + (tick // gap_every) * np.int64((window + 1) * 1e9)
+        df = pd.DataFrame({
+            "timestamp": ts.astype("datetime64[ns]"), "interface": names[n % ifaces],
+            "anomaly": -1, "anomaly_score": -0.1, "bytes_sent": 1_000_000, "bytes_recv": 50_000,
+        })
+        pipeline.write(df)
+    return events / (time.perf_counter() - started)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Wi-Fi Guardian alert pipeline: local webhook stub and load test.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stub = sub.add_parser("stub", help="run a local webhook receiver that counts alerts")
+    stub.add_argument("--port", type=int, default=9300)
+    stub.add_argument("--delay", type=float, default=0.0, help="seconds before answering each POST")
+    stub.add_argument("--fail-rate", type=float, default=0.0, help="share of POSTs answered with 503")
+    load = sub.add_parser("storm", help="push a synthetic alert storm through the pipeline")
+    load.add_argument("--events", type=int, default=100_000)
+    load.add_argument("--ifaces", type=int, default=50)
+    load.add_argument("--webhook", default=None, help="webhook URL (default: a local stub on --port)")
+    load.add_argument("--port", type=int, default=9300)
+    load.add_argument("--delay", type=float, default=0.0, help="local stub: seconds before answering")
+    load.add_argument("--fail-rate", type=float, default=0.0, help="local stub: share of 503 answers")
+    load.add_argument("--file", default=None, help="also write alerts to this JSON-lines file")
+    args = parser.parse_args(argv)
+
+    if args.command == "stub":
+        server = start_stub(port=args.port, delay=args.delay, fail_rate=args.fail_rate)
+        print(f"webhook stub on http://127.0.0.1:{args.port}/alerts", flush=True)
+        try:
+            while True:
+                time.sleep(5)
+                print(f"requests={server.requests} alerts={server.received} distinct={len(server.ids)}",
+                      flush=True)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    server = None
+    url = args.webhook
+    if url is None:
+        server = start_stub(port=args.port, delay=args.delay, fail_rate=args.fail_rate)
+        url = f"http://127.0.0.1:{args.port}/alerts"
+    sinks = [WebhookSink(url)] + ([FileSink(args.file)] if args.file else [])
+    pipeline = AlertPipeline(sinks)
+    rate = storm(pipeline, args.events, ifaces=args.ifaces)
+    drain_started = time.perf_counter()
+    pipeline.close()
+    s = pipeline.summary()
+    print(f"events={s['events']:,} accepted at {rate:,.0f} events/s -> incidents={s['incidents']:,} "
+          f"resolved={s['resolved']:,}; drained in {time.perf_counter() - drain_started:.2f}s")
+    for name, w in s["sinks"].items():
+        print(f"  {name}: delivered={w['delivered']:,} batches={w['batches']:,} dropped={w['dropped']:,} "
+              f"failed={w['failed']:,} retries={w['retries']:,}"
+              + (f" error={w['last_error']}" if w["last_error"] else ""))
+    if server is not None:
+        print(f"  stub: requests={server.requests:,} alerts={server.received:,} distinct={len(server.ids):,}")
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+import threading
+import weakref
+from collections import OrderedDict
+from functools import reduce
+import numpy as np
+import pandas as pd
+
+from utils.anomaly import stored_or_detect, BATCH_DETECTOR_PARAMS
+from utils.chart_utils import data_version
+from utils.constants import ANALYSIS_CACHE_SIZE, ANALYSIS_FRAME_CACHE_SIZE, ANALYSIS_BLOCK_ROWS
+
+DESCRIBE_ROWS = ["count", "unique", "top", "freq", "mean", "std", "min", "25%", "50%", "75%", "max"]
+QUARTILES = [25, 50, 75]
+
+_MISSING = object()
+
+class AnalysisCache:
+    """
+    Process-wide LRU of analysis results (anomaly labels, describe tables, protocol
+    counts, groupbys) shared by every page and the report builder. Keys carry the
+    data version a result was computed from, so a rerun or page switch with no new
+    samples is a lookup, and results for old versions age out.
+    """
+
+    def __init__(self, max_size=ANALYSIS_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._items.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, else compute() (None results are cached too)."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return self.put(key, compute())
+
+analysis_cache = AnalysisCache()
+frame_cache = AnalysisCache(ANALYSIS_FRAME_CACHE_SIZE)  # whole frames are large: keep very few
+
+def live_version(store):
+    """Version key of a HistoryStore's current contents (matches live frames' df.attrs)."""
+    return ("live", id(store), store.version)
+
+def live_frame(store):
+    """
+    The store's full frame at its current version, materialised once and shared by
+    every page. Callers must treat it as read-only.
+    """
+    with store.lock:
+        version = live_version(store)
+
+        def build():
+            df = store.to_frame()
+            df.attrs["version"] = version
+            return df
+        return frame_cache.get_or_compute(version, build)
+
+class BlockAggregate:
+    """
+    A mergeable aggregate over a HistoryStore, kept as one partial result per block
+    of `block` sequence numbers. An append computes only the new rows (folded into
+    the newest block); rows evicted from the ring drop whole blocks, recomputing just
+    the block that straddles the oldest retained row; rows rewritten by
+    HistoryStore.set refresh only the blocks they fall in. value() combines at most
+    capacity / block partials and is memoised per store version.
+
+    partial(store, lo, hi) aggregates retained positions lo:hi; combine(parts)
+    merges a list of partials into one.
+    """
+
+    def __init__(self, store, columns, partial, combine, block=ANALYSIS_BLOCK_ROWS):
+        self._store = weakref.ref(store)
+        self.columns = set(columns)
+        self.partial = partial
+        self.combine = combine
+        self.block = block
+        self.rows_computed = 0
+        self._blocks = []  # [first seq, end seq, partial]
+        self._rewrites = store.rewrites
+        self._version = None
+        self._value = None
+
+    @property
+    def store(self):
+        return self._store()
+
+    def _compute(self, store, first, lo, hi):
+        self.rows_computed += hi - lo
+        return self.partial(store, lo - first, hi - first)
+
+    def value(self):
+        store = self.store
+        if store is None:
+            return None
+        with store.lock:
+            if store.version == self._version:
+                return self._value
+            total = store.total
+            first = total - len(store)
+            rewrites = store.rewrites_since(self._rewrites)
+            self._rewrites = store.rewrites
+            blocks = [] if rewrites is None else [b for b in self._blocks if b[1] > first]
+
+            stale = set()
+            if blocks and blocks[0][0] < first:
+                blocks[0][0] = first
+                stale.add(0)
+            for col, lo, hi in rewrites or ():
+                if col in self.columns:
+                    stale.update(i for i, b in enumerate(blocks) if b[0] <= hi and b[1] > lo)
+            for i in stale:
+                blocks[i][2] = self._compute(store, first, blocks[i][0], blocks[i][1])
+
+            end = blocks[-1][1] if blocks else first
+            while end < total:
+                stop = min((end // self.block + 1) * self.block, total)
+                part = self._compute(store, first, end, stop)
+                if blocks and end % self.block:
+                    blocks[-1] = [blocks[-1][0], stop, self.combine([blocks[-1][2], part])]
+                else:
+                    blocks.append([end, stop, part])
+                end = stop
+
+            self._blocks = blocks
+            self._value = self.combine([b[2] for b in blocks]) if blocks else None
+            self._version = store.version
+            return self._value
+
+def block_aggregate(name, store, columns, partial, combine):
+    """The shared BlockAggregate `name` for store, created on first use."""
+    key = ("aggregate", name, id(store))
+    agg = analysis_cache.get(key)
+    if agg is None or agg.store is not store:
+        agg = analysis_cache.put(key, BlockAggregate(store, columns, partial, combine))
+    return agg
+
+# -- partials -------------------------------------------------------------------
+
+def _as_float(store, column, lo=None, hi=None):
+    values = store.view(column)[lo:hi]
+    if values.dtype.kind == "M":
+        out = values.view(np.int64).astype(np.float64)
+        out[np.isnat(values)] = np.nan
+        return out
+    return values.astype(np.float64)
+
+def _moments(x):
+    """Per-column count, mean, sum of squared deviations, min and max, ignoring NaN."""
+    valid = ~np.isnan(x)
+    n = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, x, 0.0).sum(axis=0) / n
+    return {
+        "n": n,
+        "mean": mean,
+        "m2": np.where(valid, (x - mean) ** 2, 0.0).sum(axis=0),
+        "min": np.where(valid, x, np.inf).min(axis=0),
+        "max": np.where(valid, x, -np.inf).max(axis=0),
+    }
+
+def _merge_moments(a, b):
+    """Chan et al.'s pairwise update of _moments results."""
+    n = a["n"] + b["n"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = b["mean"] - a["mean"]
+        share = b["n"] / n
+        mean = np.where(a["n"] == 0, b["mean"], np.where(b["n"] == 0, a["mean"], a["mean"] + delta * share))
+        m2 = a["m2"] + b["m2"] + np.where((a["n"] > 0) & (b["n"] > 0), delta ** 2 * a["n"] * share, 0.0)
+    return {"n": n, "mean": mean, "m2": m2,
+            "min": np.minimum(a["min"], b["min"]), "max": np.maximum(a["max"], b["max"])}
+
+def _add_counts(parts):
+    out = np.zeros(max(len(p) for p in parts), dtype=np.int64)
+    for p in parts:
+        out[:len(p)] += p
+    return out
+
+def _split_columns(store):
+    numeric = [c for c, dtype in store.schema.items() if dtype != "category"]
+    categorical = [c for c, dtype in store.schema.items() if dtype == "category"]
+    return numeric, categorical
+
+def _describe_aggregate(store):
+    numeric, categorical = _split_columns(store)
+
+    def partial(store, lo, hi):
+        x = np.column_stack([_as_float(store, col, lo, hi) for col in numeric])
+        return _moments(x), {col: np.bincount(store.view(col)[lo:hi]) for col in categorical}
+
+    def combine(parts):
+        return (reduce(_merge_moments, (p[0] for p in parts)),
+                {col: _add_counts([p[1][col] for p in parts]) for col in categorical})
+
+    return block_aggregate("describe", store, store.columns, partial, combine)
+
+def _quartiles(values):
+    if values.dtype.kind == "f":
+        values = values[~np.isnan(values)]
+    elif values.dtype.kind == "M":
+        values = values[~np.isnat(values)].view(np.int64)
+    if not len(values):
+        return [np.nan] * len(QUARTILES)
+    return list(np.percentile(values, QUARTILES))
+
+def describe_history(store):
+    """
+    store.to_frame().describe(include="all") without materialising the frame. Counts,
+    means, deviations, extremes and category frequencies come from the incremental
+    block aggregate; quartiles (not mergeable) are read from the zero-copy views.
+    """
+    numeric, categorical = _split_columns(store)
+    with store.lock:
+        value = _describe_aggregate(store).value()
+        if value is None:
+            return pd.DataFrame(index=DESCRIBE_ROWS, columns=store.columns)
+        moments, counts = value
+        quartiles = {col: _quartiles(store.view(col)) for col in numeric}
+        categories = {col: store.categories(col) for col in categorical}
+
+    out = {}
+    for i, col in enumerate(numeric):
+        n = int(moments["n"][i])
+        stats = [moments["mean"][i], moments["min"][i]] + quartiles[col] + [moments["max"][i]]
+        if n == 0:
+            stats = [np.nan] * len(stats)
+        if store.schema[col] == "datetime64[ns]":
+            stats = [pd.NaT if np.isnan(v) else pd.Timestamp(int(round(v))) for v in stats]
+            std = np.nan
+        else:
+            std = np.sqrt(moments["m2"][i] / (n - 1)) if n > 1 else np.nan
+        mean, low, q1, q2, q3, high = stats
+        out[col] = {"count": float(n), "mean": mean, "std": std, "min": low,
+                    "25%": q1, "50%": q2, "75%": q3, "max": high}
+    for col in categorical:
+        seen = counts[col]
+        top = int(seen.argmax())
+        out[col] = {"count": float(seen.sum()), "unique": int((seen > 0).sum()),
+                    "top": categories[col][top], "freq": int(seen[top])}
+    return pd.DataFrame(out, index=DESCRIBE_ROWS)[store.columns]
+
+def grouped_history(store, by, columns, how):
+    """
+    store.to_frame().groupby(list(by))[columns].agg(how) for a decomposable `how`
+    ("sum", "max" or "min"), kept per block so appends only aggregate the new rows.
+    """
+    by, columns = tuple(by), list(columns)
+
+    def partial(store, lo, hi):
+        values = pd.DataFrame({col: store.view(col)[lo:hi] for col in columns})
+        return values.groupby([store.view(col)[lo:hi] for col in by]).agg(how)
+
+    def combine(parts):
+        return pd.concat(parts).groupby(level=list(range(len(by)))).agg(how)
+
+    with store.lock:
+        value = block_aggregate(("grouped", by, tuple(columns), how), store, by + tuple(columns),
+                                partial, combine).value()
+        categories = {col: np.asarray(store.categories(col), dtype=object) for col in by}
+    if value is None:
+        return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_arrays([[]] * len(by), names=by))
+    levels = [categories[col][value.index.get_level_values(i).to_numpy()] for i, col in enumerate(by)]
+    index = pd.MultiIndex.from_arrays(levels, names=by) if len(by) > 1 else pd.Index(levels[0], name=by[0])
+    return value.set_axis(index, axis=0)
+
+# -- shared entry points -----------------------------------------------------------
+
+def _is_live(df, store):
+    return store is not None and data_version(df) == live_version(store)
+
+def describe(df, store=None):
+    """
+    df.describe(include="all"), shared by data version. Pass the live store df was
+    read from (see live_frame) to have it maintained incrementally.
+    """
+    if _is_live(df, store):
+        compute = lambda: describe_history(store)
+    else:
+        compute = lambda: df.describe(include="all")
+    return analysis_cache.get_or_compute(("describe", data_version(df)), compute)
+
+def anomaly_labels(df):
+    """stored_or_detect(df), shared by data version and batch-detector settings."""
+    key = ("anomaly_labels", data_version(df), tuple(sorted(BATCH_DETECTOR_PARAMS.items())))
+    return analysis_cache.get_or_compute(key, lambda: stored_or_detect(df))
+
+def grouped(store, by, columns, how):
+    """grouped_history for the store's current version, shared across pages."""
+    key = ("grouped", tuple(by), tuple(columns), how, live_version(store))
+    return analysis_cache.get_or_compute(key, lambda: grouped_history(store, by, columns, how))
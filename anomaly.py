@@ -1,10 +1,36 @@
+import threading
+import time
+from collections import deque
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import IsolationForest
+from utils.constants import LIVE_DETECTORS, BATCH_DETECTORS, DETECTOR_PREFILTER_RATIO
+from utils.detectors import DetectorEngine
+from utils.metrics import instrument, timed
 
+# per-interface rates and z-scores (utils.features) plus protocol counters read
+# from procfs (utils.protocol_stats)
+DETECTOR_FEATURES = [
+    "sent_rate", "recv_rate", "sent_rate_z", "recv_rate_z", "send_recv_ratio",
+    "tcp_segs", "udp_dgrams", "icmp_msgs", "tcp_retrans", "proto_errors",
+]
+
+# one-off fits on frames without stored labels (detect_anomalies); part of the
+# analysis cache key, so changing them invalidates cached labels
+BATCH_DETECTOR_PARAMS = {"contamination": 0.05, "random_state": 42, "detectors": BATCH_DETECTORS}
+
+def detector_params(contamination, random_state, window):
+    """Per-detector constructor parameters (utils.detectors) for the shared settings."""
+    return {
+        "isolation_forest": {"contamination": contamination, "random_state": random_state, "window": window},
+        "half_space_trees": {"contamination": contamination, "random_state": random_state},
+    }
+
+@instrument("detect_anomalies", rows=lambda result, df, *a, **k: len(df))
 def detect_anomalies(df):
     """
     Expects df with numeric 'bytes_sent' and 'bytes_recv' columns (per-interval delta).
-    Returns a copy of df with 'anomaly' column (1 normal, -1 anomaly) or None if insufficient data.
+    Returns a copy of df with 'anomaly' (1 normal, -1 anomaly) and 'anomaly_score'
+    (negative is anomalous) columns, or None if insufficient data.
     """
     if df is None or len(df) < 10:
         return None
@@ -13,12 +39,237 @@ def detect_anomalies(df):
     df["bytes_sent"] = pd.to_numeric(df["bytes_sent"], errors="coerce").fillna(0)
     df["bytes_recv"] = pd.to_numeric(df["bytes_recv"], errors="coerce").fillna(0)
 
-    # IsolationForest is sensitive to scale; combine features as-is (small app)
-    clf = IsolationForest(contamination=0.05, random_state=42)
-    try:
-        preds = clf.fit_predict(df[["bytes_sent", "bytes_recv"]])
-    except Exception:
-        # if something fails (e.g., constant columns), return None
+    # constant columns and failing detectors are handled per detector (utils.detectors)
+    X = df[["bytes_sent", "bytes_recv"]].to_numpy(dtype=np.float64)
+    params = detector_params(BATCH_DETECTOR_PARAMS["contamination"], BATCH_DETECTOR_PARAMS["random_state"],
+                             len(X))
+    engine = DetectorEngine(BATCH_DETECTOR_PARAMS["detectors"], params)
+    result = engine.partial_fit(X).score(X)
+    if result is None:
         return None
-    df["anomaly"] = preds
+    df["anomaly"] = result["labels"]
+    df["anomaly_score"] = 1.0 - result["scores"]
     return df
+
+def stored_or_detect(df):
+    """
+    Reuse the labels the streaming detector already wrote into history
+    ('anomaly' column); only falls back to a one-off fit when none exist.
+    Returns the same shape as detect_anomalies.
+    """
+    if df is None or len(df) < 10:
+        return None
+    if "anomaly" in df.columns:
+        labelled = df[df["anomaly"].notna()]
+        if len(labelled) >= 10:
+            out = labelled[["bytes_sent", "bytes_recv", "anomaly"]].copy()
+            out["anomaly"] = out["anomaly"].astype(int)
+            return out
+    return detect_anomalies(df[["bytes_sent", "bytes_recv"]])
+
+# protocol counters are per-interval counts; the detector sees them per second so
+# they stay comparable when an interface's sampling interval changes (utils.scheduler)
+COUNT_FEATURES = {"tcp_segs", "udp_dgrams", "icmp_msgs", "tcp_retrans", "proto_errors"}
+
+def to_feature_matrix(df, features=DETECTOR_FEATURES):
+    """
+    Numeric float64 matrix of the detector features (missing/invalid -> 0), with
+    COUNT_FEATURES divided by interval_s when the frame has it.
+    """
+    seconds = None
+    if "interval_s" in df:
+        seconds = pd.to_numeric(df["interval_s"], errors="coerce").to_numpy(dtype=np.float64)
+        seconds = np.where(seconds > 0, seconds, 1.0)
+    columns = []
+    for col in features:
+        values = pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+        columns.append(values / seconds if seconds is not None and col in COUNT_FEATURES else values)
+    return np.column_stack(columns)
+
+class StreamingDetector:
+    """
+    Long-lived DetectorEngine (utils.detectors) over the detector features: fitted
+    once, then only new rows are scored.
+
+    update(X) appends X to a bounded training window and scores just those rows.
+    Streaming detectors (robust_z, ewma, half_space_trees) then learn the rows
+    incrementally; batch ones (isolation_forest) are refit on the window every
+    `retrain_every` rows, or sooner when the recent mean drifts more than
+    `drift_threshold` standard deviations from the training window. Refits run on a
+    background thread; the current models keep serving until the new ones are
+    swapped in. A background refit that raises leaves them serving, with the error
+    kept in `fit_error` until a later refit succeeds.
+
+    Scores follow IsolationForest.decision_function: 1 - the engine's combined
+    normalised score, so negative is anomalous.
+    """
+
+    def __init__(self, contamination=0.05, min_samples=10, window=2000,
+                 retrain_every=200, drift_window=50, drift_threshold=3.0,
+                 random_state=42, background=True, detectors=LIVE_DETECTORS,
+                 prefilter_ratio=DETECTOR_PREFILTER_RATIO):
+        self.contamination = contamination
+        self.min_samples = min_samples
+        self.retrain_every = retrain_every
+        self.drift_window = drift_window
+        self.drift_threshold = drift_threshold
+        self.random_state = random_state
+        self.background = background
+        self.engine = DetectorEngine(detectors, detector_params(contamination, random_state, window),
+                                     prefilter_ratio=prefilter_ratio)
+        self._window = deque(maxlen=window)
+        self._train_mean = None
+        self._train_std = None
+        self._rows_since_fit = 0
+        self._lock = threading.Lock()
+        self._worker = None
+        self.fit_error = None
+        self.last_detail = None
+        self.timings = {
+            "fits": 0, "last_fit_seconds": 0.0, "last_fit_rows": 0,
+            "scores": 0, "last_score_seconds": 0.0, "last_score_rows": 0,
+            "total_score_seconds": 0.0, "total_scored_rows": 0,
+        }
+
+    @property
+    def fitted(self):
+        return self._train_mean is not None
+
+    @property
+    def retraining(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def _batch_detectors(self):
+        return [name for name, d in self.engine.detectors.items() if not d.streaming]
+
+    def _streaming_detectors(self):
+        return [name for name, d in self.engine.detectors.items() if d.streaming]
+
+    def _fit(self, X, first=False):
+        start = time.perf_counter()
+        with timed("detector_fit", rows=len(X)):
+            if first:
+                self.engine.partial_fit(X, self._streaming_detectors())
+            for name in self._batch_detectors():
+                self.engine.refit(name, X)
+        std = X.std(axis=0)
+        std[std == 0] = 1.0
+        with self._lock:
+            self._train_mean = X.mean(axis=0)
+            self._train_std = std
+            self.timings["fits"] += 1
+            self.timings["last_fit_seconds"] = time.perf_counter() - start
+            self.timings["last_fit_rows"] = len(X)
+
+    def export_state(self):
+        """
+        Fitted detectors, drift scaling (training mean/std), training window and
+        parameters, for utils.model_store; None before the first fit.
+        """
+        with self._lock:
+            if self._train_mean is None:
+                return None
+            return {
+                "engine": self.engine,
+                "mean": self._train_mean.copy(),
+                "std": self._train_std.copy(),
+                "window": np.asarray(self._window, dtype=np.float64),
+                "params": {
+                    "detectors": list(self.engine.detectors), "prefilter_ratio": self.engine.prefilter_ratio,
+                    "contamination": self.contamination, "min_samples": self.min_samples,
+                    "window": self._window.maxlen, "retrain_every": self.retrain_every,
+                    "drift_window": self.drift_window, "drift_threshold": self.drift_threshold,
+                    "random_state": self.random_state,
+                },
+            }
+
+    def restore_state(self, state):
+        """
+        Serve previously exported detectors right away; retraining resumes from their
+        window. Raises ValueError if they are not the detectors this one runs.
+        """
+        engine = state["engine"]
+        if list(engine.detectors) != list(self.engine.detectors):
+            raise ValueError(
+                f"model has detectors {list(engine.detectors)}, expected {list(self.engine.detectors)}")
+        with self._lock:
+            self.engine = engine
+            self._train_mean = np.asarray(state["mean"], dtype=np.float64)
+            self._train_std = np.asarray(state["std"], dtype=np.float64)
+            self._window.clear()
+            self._window.extend(np.asarray(state["window"], dtype=np.float64))
+            self._rows_since_fit = 0
+
+    def _schedule_fit(self):
+        if self.retraining:
+            return
+        X = np.asarray(self._window, dtype=np.float64)
+        self._rows_since_fit = 0
+        if not self.background:
+            self._fit(X)
+            return
+        self._worker = threading.Thread(target=self._background_fit, args=(X,), daemon=True)
+        self._worker.start()
+
+    def _background_fit(self, X):
+        try:
+            self._fit(X)
+        except Exception as exc:  # nothing would see it on this thread; keep it for display
+            self.fit_error = repr(exc)
+        else:
+            self.fit_error = None
+
+    def drifted(self):
+        """True when the mean of the most recent rows left the training distribution."""
+        if self._train_mean is None or len(self._window) < self.drift_window:
+            return False
+        recent = np.asarray(list(self._window)[-self.drift_window:], dtype=np.float64)
+        # compare the recent mean against its standard error under the training spread
+        z = np.abs(recent.mean(axis=0) - self._train_mean) / (self._train_std / np.sqrt(self.drift_window))
+        return bool((z > self.drift_threshold).any())
+
+    def score(self, X):
+        """
+        Returns (labels, scores) for X using the current detectors, or None if not fitted.
+        labels follow IsolationForest (1 normal, -1 anomaly); lower scores are more anomalous.
+        Per-detector scores of the last call are in last_detail (see DetectorEngine.score).
+        """
+        if not self.fitted or len(X) == 0:
+            return None
+        start = time.perf_counter()
+        with timed("detector_score", rows=len(X)):
+            result = self.engine.score(X)
+        if result is None:
+            return None
+        elapsed = time.perf_counter() - start
+        self.last_detail = result
+        self.timings["scores"] += 1
+        self.timings["last_score_seconds"] = elapsed
+        self.timings["last_score_rows"] = len(X)
+        self.timings["total_score_seconds"] += elapsed
+        self.timings["total_scored_rows"] += len(X)
+        return result["labels"], 1.0 - result["scores"]
+
+    def update(self, X):
+        """Feed newly collected rows; returns score(X) (None until the first fit)."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        self._window.extend(X)
+        self._rows_since_fit += len(X)
+
+        if not self.fitted:
+            # the first fit is small and synchronous so scoring can start right away
+            if len(self._window) < self.min_samples:
+                return None
+            self._fit(np.asarray(self._window, dtype=np.float64), first=True)
+            self._rows_since_fit = 0
+            return self.score(X)
+
+        if self._rows_since_fit >= self.retrain_every or (
+                self._rows_since_fit >= self.drift_window and self.drifted()):
+            self._schedule_fit()
+        result = self.score(X)
+        # score first, then learn: a row is judged against what came before it
+        self.engine.partial_fit(X, self._streaming_detectors())
+        return result
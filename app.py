@@ -1,22 +1,24 @@
+import time
 import streamlit as st
-from utils.ui_utils import load_css, show_quote
-from utils.constants import PLOTLY_CONFIG
+from utils.ui_utils import load_css, show_quote, diagnostics_panel, host_selector
+from utils.metrics import start_metrics_server, registry
+from utils.constants import PLOTLY_CONFIG, AGGREGATOR_ENABLED
+
+run_started = time.perf_counter()
 
 # Initialize page
 st.set_page_config(page_title="WiFi Guardian 🛡", page_icon="📶", layout="wide")
 load_css()
+# local Prometheus endpoint, started once per process
+start_metrics_server()
 
 # Initialize session state defaults
 if "current_step" not in st.session_state:
     st.session_state.current_step = 1
 if "history" not in st.session_state:
-    import pandas as pd
-    st.session_state.history = pd.DataFrame(
-        columns=[
-            "timestamp", "interface", "ip_address", "location",
-            "bytes_sent", "bytes_recv", "cum_bytes_sent", "cum_bytes_recv", "protocol"
-        ]
-    )
+    # all sessions share the background collector's store
+    from utils.collector import get_collector
+    st.session_state.history = get_collector().store
 if "pdf_report" not in st.session_state:
     st.session_state.pdf_report = None
 if "prev_counters" not in st.session_state:
@@ -26,6 +28,9 @@ if "prev_counters" not in st.session_state:
 with st.sidebar:
     st.title("🔍 Navigation")
     st.markdown("---")
+    if AGGREGATOR_ENABLED:
+        # remote hosts pushing through utils.agent
+        host_selector()
     if st.button("📤 1. Real-time Monitor"):
         st.session_state.current_step = 1
     if st.button("📊 2. Data Visualization", disabled=st.session_state.history.empty):
@@ -34,6 +39,8 @@ with st.sidebar:
         st.session_state.current_step = 3
     if st.button("📥 4. Download Report", disabled=st.session_state.history.empty):
         st.session_state.current_step = 4
+    st.markdown("---")
+    diagnostics_panel()
 
 # Page dispatching (import delayed to avoid heavy imports when not needed)
 if st.session_state.current_step == 1:
@@ -48,3 +55,8 @@ elif st.session_state.current_step == 3:
 elif st.session_state.current_step == 4:
     from modules.download import download
     download()
+
+# time to first render, once per session (shown against FIRST_RENDER_BUDGET in Diagnostics)
+if "first_render_seconds" not in st.session_state:
+    st.session_state.first_render_seconds = time.perf_counter() - run_started
+    registry.record("first_render", st.session_state.first_render_seconds)
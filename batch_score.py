@@ -0,0 +1,192 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.anomaly import BATCH_DETECTOR_PARAMS, DETECTOR_FEATURES, detector_params, to_feature_matrix
+from utils.detectors import DetectorEngine
+
+# detect_anomalies semantics: the BATCH_DETECTOR_PARAMS engine on the byte deltas, fitted
+# on a sample so the whole file can be scored in chunks. Exports that carry every
+# detector feature (e.g. with the rolling features) are scored on those instead.
+BYTE_FEATURES = ["bytes_sent", "bytes_recv"]
+PASSTHROUGH = ["timestamp", "interface", "ip_address"]
+
+def iter_chunks(path, chunk_rows, columns=None):
+    """Yield DataFrames of at most chunk_rows rows from a CSV or Parquet file."""
+    if path.endswith(".parquet"):
+        pf = pq.ParquetFile(path)
+        if columns is not None:
+            columns = [c for c in columns if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        usecols = (lambda c: c in columns) if columns is not None else None
+        # passthrough columns are kept verbatim as text: with NA parsing a chunk whose
+        # ip_address is all "N/A" would come out float64 and change the output schema
+        # (numeric columns are still inferred; to_feature_matrix coerces any text in them)
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=usecols,
+                               dtype={col: str for col in PASSTHROUGH}, keep_default_na=False)
+
+def default_features(path):
+    """DETECTOR_FEATURES if the file has every one of them, else the byte deltas."""
+    if path.endswith(".parquet"):
+        columns = pq.ParquetFile(path).schema_arrow.names
+    else:
+        columns = pd.read_csv(path, nrows=0).columns
+    return DETECTOR_FEATURES if set(DETECTOR_FEATURES) <= set(columns) else BYTE_FEATURES
+
+def feature_columns(features):
+    # interval_s turns the protocol counters into per-second rates (to_feature_matrix)
+    return list(dict.fromkeys([*features, "interval_s"]))
+
+def build_engine(sample, contamination=BATCH_DETECTOR_PARAMS["contamination"],
+                 random_state=BATCH_DETECTOR_PARAMS["random_state"]):
+    """The detector engine detect_anomalies builds (BATCH_DETECTOR_PARAMS), fitted on sample."""
+    engine = DetectorEngine(BATCH_DETECTOR_PARAMS["detectors"],
+                            detector_params(contamination, random_state, len(sample)))
+    return engine.partial_fit(sample)
+
+def reservoir_sample(path, features, sample_rows, chunk_rows, seed=42):
+    """
+    Uniform sample of sample_rows feature rows from the whole file in one pass
+    (vectorised reservoir sampling), so training sees every part of the capture
+    without loading it.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir = np.empty((sample_rows, len(features)), dtype=np.float64)
+    seen = 0
+    for chunk in iter_chunks(path, chunk_rows, columns=feature_columns(features)):
+        X = to_feature_matrix(chunk, features)
+        n = len(X)
+        fill = min(n, max(0, sample_rows - seen))
+        reservoir[seen:seen + fill] = X[:fill]
+        if fill < n:
+            # row at global position i replaces slot j ~ U[0, i] when j < sample_rows
+            positions = np.arange(seen + fill, seen + n)
+            slots = (rng.random(len(positions)) * (positions + 1)).astype(np.int64)
+            keep = slots < sample_rows
+            reservoir[slots[keep]] = X[fill:][keep]
+        seen += n
+    return reservoir[:min(seen, sample_rows)], seen
+
+_engine = None
+
+def _init_worker(engine):
+    global _engine
+    _engine = engine
+
+def _score_chunk(args):
+    offset, X = args
+    result = _engine.score(X)
+    # same labels and score scale as detect_anomalies: negative is anomalous
+    return offset, result["labels"].astype(np.int8), 1.0 - result["scores"]
+
+def score_file(path, output, features=None, jobs=None, chunk_rows=200_000, sample_rows=100_000,
+               contamination=BATCH_DETECTOR_PARAMS["contamination"],
+               random_state=BATCH_DETECTOR_PARAMS["random_state"], log=print):
+    """
+    Fit the batch detector engine on a reservoir sample of path, then score every row
+    in chunks on a process pool and stream (row, passthrough columns, anomaly,
+    anomaly_score) to output as Parquet. features defaults to default_features(path).
+    At most 2 * jobs chunks are in flight, so memory is bounded by chunk size, not
+    file size. Returns a summary dict with rows/sec.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    features = list(features or default_features(path))
+    started = time.perf_counter()
+    sample, total_rows = reservoir_sample(path, features, sample_rows, chunk_rows, seed=random_state)
+    if len(sample) < 10:
+        raise ValueError(f"need at least 10 rows to fit a detector, got {len(sample)}")
+    engine = build_engine(sample, contamination, random_state)
+    fit_seconds = time.perf_counter() - started
+    log(f"fitted {', '.join(engine.detectors)} on {len(sample):,} sampled rows of {total_rows:,} "
+        f"({', '.join(features)}) in {fit_seconds:.2f}s")
+
+    writer = None
+    rows = anomalies = 0
+    score_started = time.perf_counter()
+    pending = deque()
+
+    def drain():
+        nonlocal writer, rows, anomalies
+        chunk, future = pending.popleft()
+        offset, labels, scores = future.result()
+        out = pd.DataFrame({"row": np.arange(offset, offset + len(labels), dtype=np.int64)})
+        for col in PASSTHROUGH:
+            if col in chunk.columns:
+                out[col] = chunk[col].to_numpy()
+        out["anomaly"] = labels
+        out["anomaly_score"] = scores
+        table = pa.Table.from_pandas(out, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(output, table.schema)
+        writer.write_table(table)
+        rows += len(labels)
+        anomalies += int((labels == -1).sum())
+
+    columns = list(dict.fromkeys([*PASSTHROUGH, *feature_columns(features)]))
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(engine,)) as pool:
+            offset = 0
+            for chunk in iter_chunks(path, chunk_rows, columns=columns):
+                X = to_feature_matrix(chunk, features)
+                pending.append((chunk[[col for col in PASSTHROUGH if col in chunk.columns]],
+                                pool.submit(_score_chunk, (offset, X))))
+                offset += len(chunk)
+                if len(pending) >= 2 * jobs:
+                    drain()
+            while pending:
+                drain()
+    finally:
+        if writer is not None:
+            writer.close()
+
+    score_seconds = time.perf_counter() - score_started
+    summary = {
+        "rows": rows,
+        "anomalies": anomalies,
+        "jobs": jobs,
+        "fit_seconds": fit_seconds,
+        "score_seconds": score_seconds,
+        "total_seconds": time.perf_counter() - started,
+        "rows_per_sec": rows / score_seconds if score_seconds else float("inf"),
+    }
+    log(
+        f"scored {rows:,} rows ({anomalies:,} anomalies) in {summary['total_seconds']:.2f}s "
+        f"-> {summary['rows_per_sec']:,.0f} rows/sec with {jobs} job(s)"
+    )
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Score exported traffic samples (CSV or Parquet) for anomalies.")
+    parser.add_argument("input", help="CSV or .parquet file with bytes_sent / bytes_recv columns")
+    parser.add_argument("output", help="Parquet file to write anomaly flags and scores to")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-rows", type=int, default=200_000, help="rows per chunk")
+    parser.add_argument("--sample-rows", type=int, default=100_000, help="rows sampled for fitting")
+    parser.add_argument("--features", nargs="+", default=None,
+                        help="numeric columns to score on (default: the detector features if the file has "
+                             "them all, else bytes_sent / bytes_recv)")
+    parser.add_argument("--contamination", type=float, default=BATCH_DETECTOR_PARAMS["contamination"])
+    args = parser.parse_args(argv)
+    try:
+        score_file(
+            args.input, args.output, features=args.features, jobs=args.jobs,
+            chunk_rows=args.chunk_rows, sample_rows=args.sample_rows,
+            contamination=args.contamination,
+        )
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
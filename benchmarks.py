@@ -0,0 +1,313 @@
+import argparse
+import gc
+import json
+import os
+import atexit
+import platform
+import subprocess
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from utils.synthetic import generate_history, FakeCounters, write_pcap
+from utils.network_utils import sample_interfaces
+from utils.protocol_stats import ProtocolSampler, PROTOCOL_COLUMNS
+from utils.anomaly import detect_anomalies, StreamingDetector, to_feature_matrix
+from utils.detectors import DETECTORS, DetectorEngine
+from utils.history_store import HistoryStore
+from utils.features import FeatureEngine, compute_features
+from utils.chart_utils import traffic_timeseries, traffic_3d
+from utils.pdf_utils import build_report
+from utils.pcap_ingest import CaptureIngest
+from utils.analysis_cache import describe_history, grouped_history
+from utils.model_store import save_detector
+from utils.constants import FIRST_RENDER_BUDGET
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+IFACES = 4
+
+def bench_sampling(df):
+    """get_multi_iface_stats' work (sample_interfaces) fed by a fake psutil source."""
+    fake = FakeCounters(df)
+    prev = {}
+    sampler = ProtocolSampler(procfs_root=os.devnull)  # no procfs: measure our own overhead
+    addrs = fake.net_if_addrs()
+    for _ in range(fake.ticks):
+        sample_interfaces(fake.ifaces, prev, net_io=fake.net_io_counters(), addrs=addrs,
+                          protocol_sampler=sampler)
+
+def bench_features(df):
+    """Streaming feature engine fed one tick (IFACES rows) at a time."""
+    engine = FeatureEngine()
+    for start in range(0, len(df), IFACES):
+        engine.update(df.iloc[start:start + IFACES])
+
+def bench_detect_anomalies(df):
+    detect_anomalies(df[["bytes_sent", "bytes_recv"]])
+
+def bench_streaming_detector(df):
+    """Incremental path: first fit plus ~1000 update() calls covering every row."""
+    detector = StreamingDetector(background=False)
+    X = to_feature_matrix(df)
+    step = max(IFACES, len(X) // 1000)
+    for start in range(0, len(X), step):
+        detector.update(X[start:start + step])
+
+def bench_detectors(df):
+    """Every registered detector in one engine, learning and scoring ~1000 batches (pre-filter on)."""
+    engine = DetectorEngine(list(DETECTORS))
+    X = to_feature_matrix(df)
+    step = max(IFACES, len(X) // 1000)
+    for start in range(0, len(X), step):
+        engine.score(X[start:start + step])
+        engine.partial_fit(X[start:start + step])
+
+def bench_history_append(df):
+    """Per-tick append of IFACES rows into a store sized for the whole run."""
+    store = HistoryStore(capacity=len(df))
+    columns = {col: df[col].to_numpy() for col in store.columns if col in df.columns}
+    for start in range(0, len(df), IFACES):
+        store.append({col: values[start:start + IFACES] for col, values in columns.items()})
+
+def bench_figures(df):
+    traffic_timeseries(df)
+    traffic_3d(df)
+
+def bench_generate_pdf(df):
+    df = df.copy()
+    df.attrs["version"] = ("bench", time.perf_counter_ns())  # never served from the report cache
+    build_report(df)
+
+def bench_pcap_ingest(path):
+    """Decode and aggregate a synthetic capture with one packet per history row."""
+    for _ in CaptureIngest().iter_history(path):
+        pass
+
+def _pcap_fixture(df):
+    fd, path = tempfile.mkstemp(suffix=".pcap")
+    os.close(fd)
+    atexit.register(os.remove, path)
+    return write_pcap(path, len(df), seed=len(df))
+
+# setup that must not be timed: prepare(df) builds the benchmark's argument
+bench_pcap_ingest.prepare = _pcap_fixture
+
+ANALYSIS_TICKS = 100
+
+def bench_analysis(fixture):
+    """Incremental describe and protocol groupby refreshed after each of ANALYSIS_TICKS appends."""
+    store, ticks = fixture
+    for tick in ticks:
+        store.append(tick)
+        describe_history(store)
+        grouped_history(store, ["interface"], PROTOCOL_COLUMNS, "sum")
+
+def _analysis_fixture(df):
+    """A store holding all but the last ANALYSIS_TICKS ticks, with its aggregates already built."""
+    store = HistoryStore(capacity=len(df))
+    split = max(0, len(df) - ANALYSIS_TICKS * IFACES)
+    store.append(df.iloc[:split])
+    describe_history(store)
+    grouped_history(store, ["interface"], PROTOCOL_COLUMNS, "sum")
+    return store, [df.iloc[start:start + IFACES] for start in range(split, len(df), IFACES)]
+
+bench_analysis.prepare = _analysis_fixture
+
+# runs in a fresh interpreter: import the first page, restore the saved model, score one sample
+COLD_START = '''
+import sys, time
+started = time.perf_counter()
+import modules.realtime
+# only imports this repo controls: streamlit itself pulls in plotly
+if "sklearn" in sys.modules:
+    sys.exit("the real-time page imports sklearn at import time")
+import numpy as np
+from utils.anomaly import StreamingDetector, DETECTOR_FEATURES
+from utils.model_store import load_detector
+detector = StreamingDetector(background=False)
+load_detector(detector, directory=sys.argv[1])
+assert detector.score(np.zeros((1, len(DETECTOR_FEATURES)))) is not None
+'''
+
+def bench_cold_start(model_dir):
+    """Fresh process to first scored sample: page import plus model restore."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-c", COLD_START, model_dir], cwd=root,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        lines = proc.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"exit status {proc.returncode}")
+
+def _cold_start_fixture(df):
+    model_dir = tempfile.mkdtemp(prefix="wifi-guardian-model-")
+    atexit.register(shutil.rmtree, model_dir, True)
+    detector = StreamingDetector(background=False)
+    detector.update(to_feature_matrix(df.iloc[-2_000:]))
+    save_detector(detector, directory=model_dir)
+    return model_dir
+
+bench_cold_start.prepare = _cold_start_fixture
+
+PATHS = {
+    "sampling": bench_sampling,
+    "features": bench_features,
+    "detect_anomalies": bench_detect_anomalies,
+    "streaming_detector": bench_streaming_detector,
+    "detectors": bench_detectors,
+    "history_append": bench_history_append,
+    "figures": bench_figures,
+    "generate_pdf": bench_generate_pdf,
+    "pcap_ingest": bench_pcap_ingest,
+    "analysis": bench_analysis,
+    "cold_start": bench_cold_start,
+}
+
+# absolute limits in seconds, checked on every run (not just against a baseline)
+BUDGETS = {"cold_start": FIRST_RENDER_BUDGET}
+
+def detection_recall(df):
+    """Share of injected burst rows flagged by each detector."""
+    bursts = df["is_burst"].to_numpy()
+    out = {}
+    labelled = detect_anomalies(df[["bytes_sent", "bytes_recv"]])
+    if labelled is not None and bursts.any():
+        out["detect_anomalies"] = float((labelled["anomaly"].to_numpy()[bursts] == -1).mean())
+    detector = StreamingDetector(background=False)
+    X = to_feature_matrix(df)
+    labels = np.zeros(len(X))
+    step = max(IFACES, len(X) // 1000)
+    for start in range(0, len(X), step):
+        result = detector.update(X[start:start + step])
+        if result is not None:
+            labels[start:start + step] = result[0]
+    if bursts.any():
+        out["streaming_detector"] = float((labels[bursts] == -1).mean())
+        # each registered detector on its own, fitted on the first half and scoring the rest
+        half = len(X) // 2
+        for name in DETECTORS:
+            engine = DetectorEngine([name]).partial_fit(X[:half])
+            result = engine.score(X[half:])
+            if result is not None and bursts[half:].any():
+                out[f"detector_{name}"] = float((result["labels"][bursts[half:]] == -1).mean())
+    return out
+
+def measure(fn, df, memory=True):
+    prepare = getattr(fn, "prepare", None)
+    arg = prepare(df) if prepare else df
+    gc.collect()
+    started = time.perf_counter()
+    fn(arg)
+    result = {"seconds": time.perf_counter() - started}
+    if memory:
+        # separate run: tracemalloc slows allocation-heavy code and would skew the timing.
+        # Prepared arguments may be consumed by the timed run (bench_analysis appends to
+        # its store), so the memory run gets a fresh one
+        arg = prepare(df) if prepare else df
+        gc.collect()
+        tracemalloc.start()
+        fn(arg)
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+def run(sizes=DEFAULT_SIZES, paths=None, memory=True, log=print):
+    paths = paths or list(PATHS)
+    results = {path: {} for path in paths}
+    recall = {}
+    for size in sizes:
+        df = generate_history(size, ifaces=IFACES, seed=size)
+        df = df.join(compute_features(df))
+        for path in paths:
+            try:
+                result = results[path][str(size)] = measure(PATHS[path], df, memory=memory)
+            except Exception as e:
+                # one broken path is reported as its own row; the rest of the suite still runs
+                results[path][str(size)] = {"error": f"{type(e).__name__}: {e}"}
+                log(f"{path:>20} {size:>9,} rows  FAILED {results[path][str(size)]['error']}")
+                continue
+            log(f"{path:>20} {size:>9,} rows  {result['seconds']:9.3f}s"
+                + f"  {size / max(result['seconds'], 1e-9):12,.0f} rows/s"
+                + (f"  {result['peak_mb']:8.1f} MB" if memory else ""))
+        for detector, value in detection_recall(df).items():
+            recall.setdefault(detector, {})[str(size)] = value
+            log(f"{'recall ' + detector:>20} {size:>9,} rows  {value:9.3f}")
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "time": time.time()},
+        "results": results,
+        "recall": recall,
+    }
+
+def compare(current, baseline, threshold=0.25, recall_tolerance=0.05):
+    """
+    Regressions of current vs baseline: any tracked (path, size) more than
+    `threshold` slower, or any detector's burst recall more than `recall_tolerance` lower.
+    """
+    problems = []
+    for path, sizes in current["results"].items():
+        for size, result in sizes.items():
+            base = baseline.get("results", {}).get(path, {}).get(size)
+            if base and "seconds" in base and "seconds" in result \
+                    and result["seconds"] > base["seconds"] * (1 + threshold):
+                problems.append(
+                    f"{path} @ {size} rows: {result['seconds']:.3f}s vs baseline {base['seconds']:.3f}s"
+                )
+    for detector, sizes in current["recall"].items():
+        for size, value in sizes.items():
+            base = baseline.get("recall", {}).get(detector, {}).get(size)
+            if base is not None and value < base - recall_tolerance:
+                problems.append(f"recall {detector} @ {size} rows: {value:.3f} vs baseline {base:.3f}")
+    return problems
+
+def over_budget(current, budgets=BUDGETS):
+    """Tracked (path, size) results slower than their absolute budget."""
+    return [
+        f"{path} @ {size} rows: {result['seconds']:.3f}s exceeds budget {budgets[path]:g}s"
+        for path, sizes in current["results"].items() if path in budgets
+        for size, result in sizes.items() if "seconds" in result and result["seconds"] > budgets[path]
+    ]
+
+def failures(current):
+    """Tracked (path, size) results that raised instead of finishing."""
+    return [
+        f"{path} @ {size} rows: {result['error']}"
+        for path, sizes in current["results"].items()
+        for size, result in sizes.items() if "error" in result
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Wi-Fi Guardian refresh-cycle paths on synthetic traffic.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--paths", nargs="+", choices=list(PATHS), default=None)
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak-memory pass")
+    parser.add_argument("--save", metavar="JSON", help="write results as a baseline file")
+    parser.add_argument("--compare", metavar="JSON", help="fail on regressions against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--recall-tolerance", type=float, default=0.05, help="allowed absolute recall drop")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.paths, memory=not args.no_memory)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    budget_problems = over_budget(current)
+    for problem in budget_problems:
+        print(f"OVER BUDGET: {problem}", file=sys.stderr)
+    failed = failures(current)
+    for problem in failed:
+        print(f"FAILED: {problem}", file=sys.stderr)
+    budget_problems += failed
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(current, baseline, args.threshold, args.recall_tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}", file=sys.stderr)
+        return 1 if problems or budget_problems else 0
+    return 1 if budget_problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from utils.metrics import instrument
+from utils.constants import CHART_POINTS_2D, CHART_POINTS_3D, FIGURE_CACHE_SIZE
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling. x, y are float arrays sorted by x;
+    returns the indices of the (at most) `threshold` points that keep the shape of
+    the series. Spikes survive, which matters for anomaly charts.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)  # threshold - 2 inner buckets
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else x[-1]
+        avg_y = y[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else y[-1]
+        # triangle area between the last kept point, each candidate and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax()) if hi > lo else lo
+        selected[i + 1] = a
+    return selected
+
+def timestamps_to_seconds(ts):
+    """Vectorised datetime -> epoch seconds (replaces a per-row .timestamp() apply)."""
+    return pd.to_datetime(ts).to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+
+def voxel_subsample(points, budget, bins=48, seed=42):
+    """
+    Indices of at most `budget` rows of an (n, d) array: one point per occupied cell of
+    a bins^d grid (so sparse outliers are kept), then a random cut if still too many.
+    """
+    n = len(points)
+    if n <= budget:
+        return np.arange(n)
+    lo = points.min(axis=0)
+    span = np.where(points.max(axis=0) > lo, points.max(axis=0) - lo, 1.0)
+    cells = np.minimum(((points - lo) / span * bins).astype(np.int64), bins - 1)
+    keys = np.ravel_multi_index(cells.T, (bins,) * points.shape[1])
+    _, first = np.unique(keys, return_index=True)
+    if len(first) > budget:
+        first = np.random.default_rng(seed).choice(first, size=budget, replace=False)
+    return np.sort(first)
+
+class FigureCache:
+    """Small LRU of built figures keyed by (chart, data version, options)."""
+
+    def __init__(self, max_size=FIGURE_CACHE_SIZE):
+        self.max_size = max_size
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            fig = self._figures.get(key)
+            if fig is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return fig
+        fig = build()
+        with self._lock:
+            self.misses += 1
+            self._figures[key] = fig
+            while len(self._figures) > self.max_size:
+                self._figures.popitem(last=False)
+        return fig
+
+figure_cache = FigureCache()
+
+def data_version(df):
+    """Cache key for a frame: the producer's version in df.attrs, else a cheap fingerprint."""
+    version = df.attrs.get("version")
+    if version is not None:
+        return version
+    last = df["timestamp"].iloc[-1] if len(df) else None
+    return ("frame", len(df), str(last))
+
+@instrument("figure_2d", rows=lambda fig, df, *a, **k: len(df))
+def traffic_timeseries(df, y="bytes_sent", title="Bytes Sent (per-interval) Over Time",
+                       points=CHART_POINTS_2D, template="plotly_dark"):
+    """WebGL line+marker chart of y over time, one LTTB-downsampled trace per interface."""
+    import plotly.graph_objects as go  # deferred: heavy, and only needed once a chart is drawn
+    fig = go.Figure()
+    for iface, part in df.groupby("interface", observed=True, sort=True):
+        part = part.sort_values("timestamp", kind="stable")
+        x = timestamps_to_seconds(part["timestamp"])
+        yv = part[y].to_numpy(dtype=np.float64)
+        keep = lttb(x, yv, points)
+        fig.add_trace(go.Scattergl(
+            x=part["timestamp"].to_numpy()[keep], y=yv[keep], name=str(iface),
+            mode="lines+markers", marker=dict(size=4),
+        ))
+    fig.update_layout(
+        title=title, template=template,
+        xaxis=dict(title="Time", showgrid=True),
+        yaxis=dict(title=y.replace("_", " ").title(), showgrid=True),
+        legend=dict(title="Interface", orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+    )
+    return fig
+
+@instrument("figure_3d", rows=lambda fig, df, *a, **k: len(df))
+def traffic_3d(df, title="3D Network Traffic (per-interval)", points=CHART_POINTS_3D, template="plotly_dark"):
+    """3D scatter of sent/recv/time, voxel-subsampled to a point budget."""
+    import plotly.graph_objects as go
+    t = timestamps_to_seconds(df["timestamp"])
+    sent = df["bytes_sent"].to_numpy(dtype=np.float64)
+    recv = df["bytes_recv"].to_numpy(dtype=np.float64)
+    keep = voxel_subsample(np.column_stack([sent, recv, t]), points)
+    ifaces = df["interface"].astype(str).to_numpy()[keep]
+    sent, recv, t = sent[keep], recv[keep], t[keep]
+    fig = go.Figure()
+    for iface in np.unique(ifaces):
+        mask = ifaces == iface
+        fig.add_trace(go.Scatter3d(
+            x=sent[mask], y=recv[mask], z=t[mask], name=str(iface),
+            mode="markers", marker=dict(size=3),
+        ))
+    fig.update_layout(
+        title=title, template=template,
+        scene=dict(xaxis_title="Bytes Sent", yaxis_title="Bytes Received", zaxis_title="Time"),
+        legend=dict(title="Interface"),
+    )
+    return fig
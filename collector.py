@@ -0,0 +1,270 @@
+import argparse
+import threading
+import time
+import numpy as np
+import pandas as pd
+import psutil
+
+from utils.network_utils import sample_interfaces, fill_pending_locations, AddressMap
+from utils.anomaly import StreamingDetector, DETECTOR_FEATURES, to_feature_matrix
+from utils.history_store import HistoryStore
+from utils.features import FeatureEngine
+from utils.heavy_hitters import HeavyHitterTracker, ProcNetPeers
+from utils.protocol_stats import ProtocolSampler
+from utils.scheduler import AdaptiveScheduler
+from utils.metrics import timed
+from utils.constants import (
+    COLLECTOR_INTERVAL, PARQUET_ENABLED, ADAPTIVE_SAMPLING, SAMPLE_MIN_INTERVAL, SAMPLE_IDLE_INTERVAL,
+    PEER_ATTRIBUTE_SECONDS, MODEL_PERSIST, MODEL_SAVE_SECONDS,
+)
+
+def score_backlog(store, detector):
+    """Score rows stored before the detector's first fit, once it exists."""
+    if not detector.fitted:
+        return
+    unscored = np.flatnonzero(np.isnan(store.view("anomaly")))
+    if not len(unscored):
+        return
+    rows = pd.DataFrame({col: store.view(col)[unscored] for col in DETECTOR_FEATURES + ["interval_s"]})
+    result = detector.score(to_feature_matrix(rows))
+    if result is not None:
+        seqs = store.seqs()[unscored]
+        store.set("anomaly", seqs, result[0])
+        store.set("anomaly_score", seqs, result[1])
+
+class Collector(threading.Thread):
+    """
+    Single process-wide sampler, independent of Streamlit reruns.
+
+    Each tick it reads psutil.net_io_counters(pernic=True) once for every interface
+    that is due (utils.scheduler: `interval` seconds by default, faster while an
+    interface bursts, slower while it idles), turns it into per-interface deltas,
+    derives rolling rate features (utils.features), scores the new rows with a
+    shared StreamingDetector and appends them to a shared HistoryStore. Dashboards
+    only read the store, so sampling and detection cost does not grow with the
+    number of open sessions, and it keeps running with no browser attached.
+    """
+
+    def __init__(self, store=None, interval=COLLECTOR_INTERVAL, ifaces=None, detector=None, sinks=None,
+                 scheduler=None, persist_model=MODEL_PERSIST):
+        super().__init__(name="wifi-guardian-collector", daemon=True)
+        self.store = store if store is not None else HistoryStore()
+        self.interval = float(interval)
+        self.ifaces = ifaces  # None -> every interface psutil reports
+        self.detector = detector if detector is not None else StreamingDetector()
+        self.sinks = list(sinks or [])  # objects with write(df) / flush(), e.g. ParquetStore, AlertPipeline
+        self.features = FeatureEngine()
+        self.peers = ProcNetPeers()
+        self.heavy_hitters = HeavyHitterTracker(metrics=("connections",))
+        if scheduler is None:
+            scheduler = AdaptiveScheduler(self.interval) if ADAPTIVE_SAMPLING \
+                else AdaptiveScheduler(self.interval, self.interval, self.interval)
+        self.scheduler = scheduler
+        self.addresses = AddressMap()
+        self.prev_counters = {}
+        self.protocol_sampler = ProtocolSampler()
+        self._peers_at = 0.0
+        self.persist_model = persist_model
+        self.model_info = None  # metadata of the restored/last saved model, or {"error": ...}
+        self._saved_fits = 0
+        self._saved_at = 0.0
+        self.samples = 0
+        self.last_sample_seconds = 0.0
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def sample_once(self):
+        with timed("collector_tick") as span:
+            span.rows = self._sample()
+        return span.rows
+
+    def _sample(self):
+        start = time.perf_counter()
+        net_io = psutil.net_io_counters(pernic=True)
+        now = time.monotonic()
+        due = self.scheduler.due(self.ifaces or list(net_io.keys()), now)
+        rows = []
+        if due:
+            addrs = self.addresses.get(net_io, now)
+            rows = sample_interfaces(due, self.prev_counters, net_io=net_io, addrs=addrs,
+                                     protocol_sampler=self.protocol_sampler, mono=now)
+        if rows:
+            df = pd.DataFrame(rows)
+            df = df.join(self.features.update(df))
+            result = self.detector.update(to_feature_matrix(df))
+            if result is not None:
+                df["anomaly"], df["anomaly_score"] = result
+            self.store.append(df)
+            for row in df.to_dict("records"):
+                self.scheduler.observe(row["interface"], row, now)
+            self._score_backlog()
+            self._track_peers()
+            for sink in self.sinks:
+                sink.write(df)
+        fill_pending_locations(self.store)
+        self._maybe_save_model()
+        self.samples += 1
+        self.last_sample_seconds = time.perf_counter() - start
+        return len(rows)
+
+    def restore_model(self):
+        """Load the persisted detector and feature state (utils.model_store), if usable."""
+        if not self.persist_model:
+            return None
+        from utils.model_store import load_detector
+        try:
+            self.model_info = load_detector(self.detector, self.features)
+        except FileNotFoundError:
+            self.model_info = None
+        except Exception as exc:  # unusable artifact: refit from live samples as if there were none
+            self.model_info = {"error": repr(exc)}
+        self._saved_fits = self.detector.timings["fits"]
+        return self.model_info
+
+    def save_model(self):
+        """Persist the current detector and feature state; no-op before the first fit."""
+        if not self.persist_model:
+            return None
+        from utils.model_store import save_detector
+        self._saved_fits = self.detector.timings["fits"]
+        self._saved_at = time.monotonic()
+        with timed("model_save"):
+            meta = save_detector(self.detector, self.features)
+        if meta is not None:
+            self.model_info = meta
+        return meta
+
+    def _maybe_save_model(self):
+        # after a (re)fit, at most every MODEL_SAVE_SECONDS; runs on this thread so the
+        # feature state isn't changing while it is pickled
+        if self.detector.timings["fits"] != self._saved_fits \
+                and time.monotonic() - self._saved_at >= MODEL_SAVE_SECONDS:
+            self.save_model()
+
+    def _score_backlog(self):
+        score_backlog(self.store, self.detector)
+
+    def _track_peers(self):
+        # the socket tables name peers but carry no byte counters, so peers are ranked by
+        # connected sockets, summed over reads; fast-sampled ticks read them about once a second
+        now = time.monotonic()
+        if now - self._peers_at < PEER_ATTRIBUTE_SECONDS:
+            return
+        self._peers_at = now
+        connected = self.peers.connections()
+        if connected is not None:
+            hi, lo, sockets = connected
+            self.heavy_hitters.add(time.time(), hi, lo, connections=sockets)
+
+    def run(self):
+        # the scheduler works on the monotonic clock, so the cadence doesn't drift with
+        # sample cost, and after falling behind (e.g. a suspend) due interfaces are
+        # sampled once rather than once per missed tick
+        self.restore_model()
+        while not self._stop_event.is_set():
+            try:
+                self.sample_once()
+                self.last_error = None
+            except Exception as exc:  # keep sampling through transient psutil/model errors
+                self.last_error = repr(exc)
+            self._stop_event.wait(max(0.0, self.scheduler.next_due(time.monotonic()) - time.monotonic()))
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        for sink in self.sinks:
+            sink.flush()
+        try:
+            self.save_model()
+        except OSError as exc:
+            self.last_error = repr(exc)
+
+def default_sinks(persist=True, alerts=True):
+    """The Parquet store (PARQUET_ENABLED) and the alert pipeline (ALERTS_ENABLED)."""
+    sinks = []
+    if persist and PARQUET_ENABLED:
+        from utils.timeseries_store import get_parquet_store
+        sinks.append(get_parquet_store())
+    if alerts:
+        from utils.alerts import get_alert_pipeline
+        pipeline = get_alert_pipeline()
+        if pipeline is not None:
+            sinks.append(pipeline)
+    return sinks
+
+_collector = None
+_collector_lock = threading.Lock()
+
+def get_collector(interval=COLLECTOR_INTERVAL):
+    """Start (once per process) and return the shared collector."""
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = Collector(interval=interval, sinks=default_sinks())
+            _collector.start()
+        return _collector
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Wi-Fi Guardian traffic collector without the UI.")
+    parser.add_argument("--interval", type=float, default=COLLECTOR_INTERVAL,
+                        help="seconds between samples (sub-second allowed)")
+    parser.add_argument("--min-interval", type=float, default=SAMPLE_MIN_INTERVAL,
+                        help="seconds between samples while bursting")
+    parser.add_argument("--idle-interval", type=float, default=SAMPLE_IDLE_INTERVAL,
+                        help="longest interval for an idle interface")
+    parser.add_argument("--fixed", action="store_true",
+                        help="sample every interface every --interval seconds")
+    parser.add_argument("--ifaces", nargs="*", default=None, help="interfaces to sample (default: all)")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--no-persist", action="store_true", help="don't write samples to the Parquet store")
+    parser.add_argument("--no-model", action="store_true", help="don't load or save the detector model")
+    parser.add_argument("--no-alerts", action="store_true",
+                        help="don't dispatch anomaly incidents to alert sinks")
+    parser.add_argument("--metrics", action="store_true", help="serve Prometheus /metrics while running")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between status lines")
+    args = parser.parse_args(argv)
+
+    from utils.alerts import AlertPipeline
+    if args.metrics:
+        from utils.metrics import start_metrics_server
+        start_metrics_server()
+    sinks = default_sinks(persist=not args.no_persist, alerts=not args.no_alerts)
+    scheduler = AdaptiveScheduler(args.interval, args.interval, args.interval) if args.fixed \
+        else AdaptiveScheduler(args.interval, args.min_interval, args.idle_interval)
+    collector = Collector(interval=args.interval, ifaces=args.ifaces, sinks=sinks, scheduler=scheduler,
+                          persist_model=not args.no_model)
+    collector.start()
+    deadline = None if args.duration is None else time.monotonic() + args.duration
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            # the last status line is printed at the deadline, not up to report_every past it
+            time.sleep(args.report_every if deadline is None
+                       else max(0.0, min(args.report_every, deadline - time.monotonic())))
+            anomalies = int((collector.store.view("anomaly") == -1).sum())
+            rates = " ".join(
+                f"{iface}:{r['state']}@{r['samples_per_s']:.1f}/s"
+                for iface, r in sorted(collector.scheduler.rates().items()) if r["samples_per_s"]
+            )
+            alerts = next((sink.summary() for sink in sinks if isinstance(sink, AlertPipeline)), None)
+            delivery = "" if alerts is None else " ".join(
+                f"{name}:{w['delivered']}/{w['dropped']}/{w['failed']}"
+                for name, w in alerts["sinks"].items())
+            print(
+                f"samples={collector.samples} rows={len(collector.store)} anomalies={anomalies} "
+                f"last_sample_ms={collector.last_sample_seconds * 1000:.2f} {rates}"
+                + (f" incidents={alerts['incidents']} open={alerts['open']} {delivery}" if alerts else "")
+                + (f" error={collector.last_error}" if collector.last_error else ""),
+                flush=True,
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop(timeout=5)
+        # this process owns the shared pipeline: stop its sink workers once flushed
+        for sink in sinks:
+            if isinstance(sink, AlertPipeline):
+                sink.close()
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,124 @@ PLOTLY_CONFIG = {
     "displaylogo": False,
     "modeBarButtonsToRemove": ["sendDataToCloud"]
 }
+
+# IP geolocation service ("{ip}" is replaced with the address being looked up)
+GEO_PROVIDER_URL = "https://ipinfo.io/{ip}/json"
+GEO_CACHE_SIZE = 1024
+GEO_CACHE_TTL = 6 * 3600        # seconds a resolved location stays valid
+GEO_NEGATIVE_TTL = 300          # seconds an "Unknown" result is cached before retrying
+GEO_CACHE_FILE = ".geo_cache.json"
+GEO_WORKERS = 4
+GEO_PLACEHOLDER = "Resolving..."
+
+# rows kept in the in-memory traffic history (fixed memory, see utils.history_store)
+HISTORY_CAPACITY = 50_000
+
+# background collector (utils.collector): seconds between psutil samples, may be sub-second
+COLLECTOR_INTERVAL = 1.0
+
+# persistent Parquet history (utils.timeseries_store)
+PARQUET_ENABLED = True
+PARQUET_DIR = "data"
+PARQUET_BATCH_ROWS = 5_000       # flush the write buffer at this many rows...
+PARQUET_FLUSH_SECONDS = 60       # ...or after this many seconds
+PARQUET_ROW_GROUP_ROWS = 100_000
+PARQUET_COMPACT_FILES = 10       # small files per day partition before compaction
+
+# procfs root for protocol counters (point at a fixture directory to test the parser)
+PROCFS_ROOT = "/proc"
+
+# chart rendering (utils.chart_utils): point budgets and cached figures
+CHART_POINTS_2D = 2_000   # per interface, LTTB
+CHART_POINTS_3D = 5_000   # total, voxel + random subsample
+FIGURE_CACHE_SIZE = 16
+
+# PDF reports (utils.pdf_utils)
+REPORT_CACHE_SIZE = 32     # cached reports, chart images and statistics tables
+REPORT_TABLE_ROWS = 40     # rows per anomaly table chunk
+
+# hot-path instrumentation (utils.metrics); /metrics is served on localhost only
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# rolling per-interface traffic features (utils.features)
+FEATURE_WINDOW = 30        # samples per interface for mean/std/min/max
+FEATURE_EWMA_ALPHA = 0.2
+
+# multi-host mode: agents (utils.agent) push batches to a central aggregator (utils.aggregator)
+AGGREGATOR_ENABLED = False          # also run the aggregator inside the dashboard process
+AGGREGATOR_HOST = "127.0.0.1"
+AGGREGATOR_PORT = 9200              # HTTP, POST /ingest
+AGGREGATOR_UDP_PORT = 9201
+AGGREGATOR_WORKERS = 4              # hosts are sharded over this many ingest workers
+AGGREGATOR_QUEUE_BATCHES = 1_000    # per worker; when full, HTTP pushes get 503 (backpressure)
+AGGREGATOR_HOST_CAPACITY = 20_000   # history rows kept per remote host
+AGENT_BATCH_ROWS = 500
+AGENT_FLUSH_SECONDS = 1.0
+AGENT_BUFFER_ROWS = 100_000         # local buffer while the aggregator is unreachable; oldest dropped
+AGENT_MAX_BACKOFF = 30.0
+UDP_MAX_DATAGRAM = 60_000
+
+# offline capture ingestion (utils.pcap_ingest)
+PCAP_INTERVAL = 1.0                # seconds per history row
+PCAP_CHUNK_PACKETS = 250_000       # packets decoded per batch; bounds working memory
+PCAP_MAX_FLOWS = 100_000           # flow table size before the smallest flows are evicted
+PCAP_LOCAL_NETS = [                # addresses counted as "this side" (bytes_sent when source)
+    "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "169.254.0.0/16", "127.0.0.0/8",
+    "100.64.0.0/10", "fc00::/7", "fe80::/10", "::1/128",
+]
+
+# heavy-hitter tracking of remote peers (utils.heavy_hitters); memory is fixed:
+# HH_SNAPSHOTS x metrics x (HH_TOP_K counters + HH_CM_DEPTH x HH_CM_WIDTH floats); the live
+# collector tracks one metric (connections), capture replays two (bytes sent / received)
+HH_TOP_K = 200             # Space-Saving counters per snapshot: counts off by <= total / HH_TOP_K
+HH_CM_WIDTH = 1024         # Count-Min: overestimate <= e / width * total (~0.27%)...
+HH_CM_DEPTH = 4            # ...with probability >= 1 - e^-depth (~98%)
+HH_INTERVAL = 60           # seconds per mergeable snapshot
+HH_SNAPSHOTS = 60          # snapshots kept (one hour at 60 s)
+
+# shared analysis results across pages and reports (utils.analysis_cache)
+ANALYSIS_CACHE_SIZE = 64       # memoised results and incremental aggregates
+ANALYSIS_FRAME_CACHE_SIZE = 2  # materialised live frames (large: keep very few)
+ANALYSIS_BLOCK_ROWS = 1024     # rows per partial aggregate; appends only touch the newest block
+
+# adaptive per-interface sampling (utils.scheduler); COLLECTOR_INTERVAL is the base interval
+ADAPTIVE_SAMPLING = True
+SAMPLE_MIN_INTERVAL = 0.1      # seconds between samples while an interface bursts
+SAMPLE_IDLE_INTERVAL = 10.0    # longest interval, reached by doubling while idle
+SAMPLE_IDLE_RATE = 512         # bytes/s (sent + recv) under which an interface is idle
+SAMPLE_BURST_Z = 3.0           # |rate z-score| that counts as a burst
+SAMPLE_BURST_CV = 1.0          # rolling std / mean of a rate that counts as a burst
+ADDRESS_REFRESH_SECONDS = 60   # interface addresses are re-read at least this often
+PEER_ATTRIBUTE_SECONDS = 1.0   # socket-table reads for peer connection counts, at most once per this
+
+# persisted detector artifacts (utils.model_store), reloaded when the collector starts
+MODEL_PERSIST = True
+MODEL_DIR = "models"
+MODEL_NAME = "detector"
+MODEL_SAVE_SECONDS = 300       # save after a refit, at most this often (and on shutdown)
+
+# measured from the start of the first script run of a session to the end of its first page
+FIRST_RENDER_BUDGET = 2.0      # seconds
+
+# pluggable detectors (utils.detectors); names are keys of utils.detectors.DETECTORS
+LIVE_DETECTORS = ("robust_z", "ewma", "isolation_forest")   # the collector's StreamingDetector
+BATCH_DETECTORS = ("robust_z", "isolation_forest")          # one-off fits (detect_anomalies)
+DETECTOR_PREFILTER_RATIO = 0.8  # rows under 80% of every cheap detector's threshold skip the costly ones
+DETECTOR_COMBINE = "mean"       # how the costly detectors' normalised scores are combined ("mean" or "max")
+DETECTOR_WORKERS = 4            # threads scoring detectors side by side
+IFOREST_N_JOBS = 1              # cores per IsolationForest fit (-1: all)
+
+# alert dispatch (utils.alerts): anomalies are coalesced into incidents per host and
+# interface, then delivered to each sink from its own bounded queue
+ALERTS_ENABLED = True
+ALERT_WINDOW = 60.0            # seconds without an anomaly (in sample time) before an incident is resolved
+ALERT_QUEUE_SIZE = 10_000      # notifications waiting per sink; beyond this new ones are dropped and counted
+ALERT_BATCH_SIZE = 100         # notifications per delivery
+ALERT_BATCH_SECONDS = 1.0      # longest wait to fill a batch
+ALERT_RETRIES = 5              # further attempts per batch, with exponential backoff...
+ALERT_MAX_BACKOFF = 30.0       # ...capped at this many seconds
+ALERT_FILE = "alerts.jsonl"    # JSON lines; None to disable
+ALERT_WEBHOOK_URL = None       # e.g. "http://127.0.0.1:9300/alerts" (JSON POST)
+ALERT_SYSLOG_ADDRESS = None    # "host:514" (UDP) or a local socket such as "/dev/log"
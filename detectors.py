@@ -0,0 +1,401 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from utils.metrics import timed
+from utils.constants import (
+    DETECTOR_WORKERS, DETECTOR_PREFILTER_RATIO, DETECTOR_COMBINE, IFOREST_N_JOBS, LIVE_DETECTORS,
+)
+
+# Every detector offers:
+# - partial_fit(X): learn from rows (streaming detectors update incrementally; batch
+#   ones buffer and refit, and also offer fit(X) for a fresh fit);
+# - score_samples(X): outlyingness per row, higher is more anomalous, with
+#   `threshold` as the anomaly cut-off;
+# - name, cheap (scored first, as a pre-filter), streaming and fitted.
+
+SCALE_FLOOR = 1.0  # like utils.features.Z_STD_FLOOR: keeps scores finite on constant columns
+
+def signed_log(X):
+    """sign(x) * log1p(|x|): tames heavy-tailed byte rates before tree-based models."""
+    return np.sign(X) * np.log1p(np.abs(X))
+
+class RobustZDetector:
+    """
+    Modified z-score (Iglewicz & Hoaglin): |x - median| / (1.4826 * MAD) per feature
+    over the last `window` rows, max across features. 3.5 is their outlier cut-off.
+    MAD is floored at SCALE_FLOOR, so a constant column scores 0 until it moves.
+    """
+    name = "robust_z"
+    cheap = True
+    streaming = True
+
+    def __init__(self, window=500, threshold=3.5, min_samples=10):
+        self.window = deque(maxlen=window)
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self._stats = None
+
+    @property
+    def fitted(self):
+        return len(self.window) >= self.min_samples
+
+    def partial_fit(self, X):
+        self.window.extend(X)
+        self._stats = None
+        return self
+
+    def _statistics(self):
+        if self._stats is None:
+            W = np.asarray(self.window, dtype=np.float64)
+            median = np.median(W, axis=0)
+            mad = np.median(np.abs(W - median), axis=0)
+            self._stats = median, np.maximum(1.4826 * mad, SCALE_FLOOR)
+        return self._stats
+
+    def score_samples(self, X):
+        median, scale = self._statistics()
+        return (np.abs(X - median) / scale).max(axis=1)
+
+class EwmaChartDetector:
+    """
+    EWMA control chart per feature: distance from the exponentially weighted mean in
+    units of the exponentially weighted standard deviation (floored at SCALE_FLOOR),
+    max across features; flags beyond `threshold` sigma. O(features) per row.
+    """
+    name = "ewma"
+    cheap = True
+    streaming = True
+
+    def __init__(self, alpha=0.1, threshold=3.0, min_samples=10):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.mean = None
+        self.var = None
+        self.count = 0
+
+    @property
+    def fitted(self):
+        return self.count >= self.min_samples
+
+    def partial_fit(self, X):
+        for x in np.asarray(X, dtype=np.float64):
+            if self.mean is None:
+                self.mean, self.var = x.copy(), np.zeros_like(x)
+            else:
+                diff = x - self.mean
+                step = self.alpha * diff
+                self.mean = self.mean + step
+                self.var = (1 - self.alpha) * (self.var + diff * step)
+            self.count += 1
+        return self
+
+    def score_samples(self, X):
+        return (np.abs(X - self.mean) / np.maximum(np.sqrt(self.var), SCALE_FLOOR)).max(axis=1)
+
+class HalfSpaceTreesDetector:
+    """
+    Half-Space Trees (Tan, Ting & Liu, 2011) on signed-log features: `trees` random
+    complete binary trees of `depth` that halve a work space fixed from the first
+    rows. Each node counts how many rows of the latest window of `window` rows fell
+    in it; when a window completes its counts become the reference mass profile. A
+    row landing in low-mass regions scores high. Constant memory, O(trees * depth)
+    per row. The threshold is the (1 - contamination) quantile of the last
+    window's own scores.
+    """
+    name = "half_space_trees"
+    cheap = False
+    streaming = True
+
+    def __init__(self, trees=25, depth=10, window=250, contamination=0.05, random_state=42):
+        self.trees = trees
+        self.depth = depth
+        self.window = window
+        self.size_limit = max(1, window // 10)
+        self.contamination = contamination
+        self.rng = np.random.default_rng(random_state)
+        self.threshold = None
+        self._dims = self._splits = None
+        self._reference = None
+        self._latest = None
+        self._in_window = 0
+        self._recent = deque(maxlen=window)
+
+    @property
+    def fitted(self):
+        return self._reference is not None
+
+    def _build(self, Z):
+        lo, hi = Z.min(axis=0), Z.max(axis=0)
+        internal = 2 ** self.depth - 1
+        self._dims = np.empty((self.trees, internal), dtype=np.int64)
+        self._splits = np.empty((self.trees, internal))
+        for t in range(self.trees):
+            pivot = self.rng.uniform(lo, hi)
+            reach = np.maximum(2 * np.maximum(pivot - lo, hi - pivot), SCALE_FLOOR)
+            mins, maxs = (pivot - reach)[None, :], (pivot + reach)[None, :]
+            for level in range(self.depth):
+                first = 2 ** level - 1
+                dims = self.rng.integers(0, Z.shape[1], size=2 ** level)
+                rows = np.arange(2 ** level)
+                split = (mins[rows, dims] + maxs[rows, dims]) / 2
+                self._dims[t, first:first + 2 ** level] = dims
+                self._splits[t, first:first + 2 ** level] = split
+                left_max, right_min = maxs.copy(), mins.copy()
+                left_max[rows, dims] = split
+                right_min[rows, dims] = split
+                # children of node i are 2i+1 (left) and 2i+2 (right): interleave
+                mins = np.stack([mins, right_min], axis=1).reshape(-1, Z.shape[1])
+                maxs = np.stack([left_max, maxs], axis=1).reshape(-1, Z.shape[1])
+        nodes = 2 ** (self.depth + 1) - 1
+        self._latest = np.zeros((self.trees, nodes), dtype=np.int64)
+
+    def _paths(self, Z):
+        """Node index per (level, tree, row), root to leaf."""
+        node = np.zeros((self.trees, len(Z)), dtype=np.int64)
+        paths = [node]
+        cols = np.arange(len(Z))[None, :]
+        for _ in range(self.depth):
+            dims = np.take_along_axis(self._dims, node, axis=1)
+            right = Z[cols, dims] > np.take_along_axis(self._splits, node, axis=1)
+            node = 2 * node + 1 + right
+            paths.append(node)
+        return paths
+
+    def _mass_scores(self, Z):
+        nodes = self._latest.shape[1]
+        flat = np.arange(self.trees)[:, None] * nodes
+        reference = self._reference.ravel()
+        score = np.zeros(len(Z))
+        done = np.zeros((self.trees, len(Z)), dtype=bool)
+        for level, node in enumerate(self._paths(Z)):
+            mass = reference[flat + node]
+            stop = ~done & ((mass <= self.size_limit) | (level == self.depth))
+            score += (np.where(stop, mass, 0) * 2.0 ** level).sum(axis=0)
+            done |= stop
+        # higher mass = more normal; as an outlyingness score that is >= 0
+        return np.log2(self.trees * self.window * 2.0 ** self.depth + 1) - np.log2(score + 1)
+
+    def partial_fit(self, X):
+        Z = signed_log(np.asarray(X, dtype=np.float64))
+        if self._dims is None:
+            self._build(Z)
+        nodes = self._latest.shape[1]
+        while len(Z):
+            chunk, Z = Z[:self.window - self._in_window], Z[self.window - self._in_window:]
+            flat = (np.arange(self.trees)[:, None] * nodes + np.stack(self._paths(chunk))).ravel()
+            self._latest += np.bincount(flat, minlength=self.trees * nodes).reshape(self.trees, nodes)
+            self._recent.extend(chunk)
+            self._in_window += len(chunk)
+            if self._in_window == self.window:
+                self._reference, self._latest = self._latest, np.zeros_like(self._latest)
+                self._in_window = 0
+                scores = self._mass_scores(np.asarray(self._recent))
+                self.threshold = max(float(np.quantile(scores, 1 - self.contamination)), 1e-9)
+        return self
+
+    def score_samples(self, X):
+        return self._mass_scores(signed_log(np.asarray(X, dtype=np.float64)))
+
+class IsolationForestDetector:
+    """
+    scikit-learn IsolationForest on signed-log features, trees built on `n_jobs`
+    cores. It has no incremental mode, so partial_fit keeps the last `window` rows
+    and refits on them once min_samples have arrived and then every `refit_every`
+    rows (never, if None: StreamingDetector schedules its own refits). Constant
+    columns are dropped before fitting; if every column is constant, every row
+    scores 0 (normal) until one moves. Scores are -score_samples, so higher is
+    more anomalous, with the threshold at sklearn's contamination offset.
+    """
+    name = "isolation_forest"
+    cheap = False
+    streaming = False
+
+    def __init__(self, contamination=0.05, n_estimators=100, n_jobs=IFOREST_N_JOBS, random_state=42,
+                 window=2000, min_samples=10, refit_every=None):
+        self.contamination = contamination
+        self.n_estimators = n_estimators
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.window = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.refit_every = refit_every
+        self.threshold = 1.0
+        self.model = None
+        self.columns = None
+        self._rows_since_fit = 0
+
+    @property
+    def fitted(self):
+        return self.columns is not None
+
+    def fit(self, X):
+        from sklearn.ensemble import IsolationForest  # deferred: slow to import
+        Z = signed_log(np.asarray(X, dtype=np.float64))
+        columns = np.flatnonzero(Z.max(axis=0) > Z.min(axis=0))
+        model = None
+        if len(columns):
+            model = IsolationForest(contamination=self.contamination, n_estimators=self.n_estimators,
+                                    n_jobs=self.n_jobs, random_state=self.random_state)
+            model.fit(Z[:, columns])
+        self.model, self.columns = model, columns
+        self.threshold = -model.offset_ if model is not None else 1.0
+        self._rows_since_fit = 0
+        return self
+
+    def partial_fit(self, X):
+        self.window.extend(np.asarray(X, dtype=np.float64))
+        self._rows_since_fit += len(X)
+        if (not self.fitted and len(self.window) >= self.min_samples) or \
+                (self.fitted and self.refit_every and self._rows_since_fit >= self.refit_every):
+            self.fit(np.asarray(self.window))
+        return self
+
+    def score_samples(self, X):
+        if self.model is None:
+            return np.zeros(len(X))
+        return -self.model.score_samples(signed_log(np.asarray(X, dtype=np.float64))[:, self.columns])
+
+# name -> class; DetectorEngine and StreamingDetector build detectors from these names
+DETECTORS = {
+    cls.name: cls
+    for cls in (RobustZDetector, EwmaChartDetector, HalfSpaceTreesDetector, IsolationForestDetector)
+}
+
+def make_detector(name, **params):
+    try:
+        return DETECTORS[name](**params)
+    except KeyError:
+        raise ValueError(f"unknown detector {name!r} (have: {', '.join(DETECTORS)})") from None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    """Thread pool shared by every engine (NumPy and scikit-learn release the GIL)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(DETECTOR_WORKERS, thread_name_prefix="detector")
+        return _pool
+
+class DetectorEngine:
+    """
+    Several registered detectors side by side.
+
+    Each detector's score is normalised by its own threshold, so 1.0 means "at the
+    threshold" for all of them. score() runs the cheap detectors (robust_z, ewma)
+    concurrently first; only rows where one of them reaches `prefilter_ratio` of its
+    threshold go on to the expensive ones (isolation_forest, half_space_trees),
+    which then decide, combined by `combine` ("mean" or "max"). Rows they never see
+    keep the cheap score, which is below prefilter_ratio and so normal. With no
+    expensive detector ready, the cheap ones decide. prefilter_ratio=0 sends every
+    row to every detector.
+
+    A detector that raises is left out of that call, with the error kept in
+    `errors`; the others still answer. Per-detector fit/score latency is kept in
+    `timings` and recorded as detector_<name>_fit / detector_<name> metrics.
+    """
+
+    def __init__(self, detectors=LIVE_DETECTORS, params=None, prefilter_ratio=DETECTOR_PREFILTER_RATIO,
+                 combine=DETECTOR_COMBINE):
+        self.params = params or {}
+        self.detectors = {name: make_detector(name, **self.params.get(name, {})) for name in detectors}
+        self.prefilter_ratio = prefilter_ratio
+        self.combine = combine
+        self.errors = {}
+        self.timings = {name: {"fit_seconds": 0.0, "score_calls": 0, "score_rows": 0, "score_seconds": 0.0,
+                               "last_score_seconds": 0.0} for name in self.detectors}
+        self.escalated_rows = 0
+        self.scored_rows = 0
+
+    @property
+    def fitted(self):
+        return any(d.fitted for d in self.detectors.values())
+
+    def _run(self, names, method, X):
+        def call(name):
+            start = time.perf_counter()
+            stage = f"detector_{name}" if method == "score_samples" else f"detector_{name}_fit"
+            with timed(stage, rows=len(X)):
+                out = getattr(self.detectors[name], method)(X)
+            elapsed = time.perf_counter() - start
+            t = self.timings[name]
+            if method == "score_samples":
+                t["score_calls"] += 1
+                t["score_rows"] += len(X)
+                t["score_seconds"] += elapsed
+                t["last_score_seconds"] = elapsed
+            else:
+                t["fit_seconds"] += elapsed
+            return out
+
+        futures = {name: _executor().submit(call, name) for name in names} if len(names) > 1 else {}
+        results = {}
+        for name in names:
+            try:
+                results[name] = futures[name].result() if futures else call(name)
+                self.errors.pop(name, None)
+            except Exception as exc:  # one broken detector must not silence the others
+                self.errors[name] = repr(exc)
+        return results
+
+    def partial_fit(self, X, names=None):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        self._run(list(names if names is not None else self.detectors), "partial_fit", X)
+        return self
+
+    def refit(self, name, X):
+        """
+        Fit a fresh `name` detector on X and swap it in; the old one keeps serving
+        until then, so this can run off the scoring thread.
+        """
+        detector = make_detector(name, **self.params.get(name, {}))
+        start = time.perf_counter()
+        with timed(f"detector_{name}_fit", rows=len(X)):
+            detector.fit(np.asarray(X, dtype=np.float64))
+        self.timings[name]["fit_seconds"] += time.perf_counter() - start
+        self.detectors[name] = detector
+        self.errors.pop(name, None)
+
+    def score(self, X):
+        """
+        {"labels": 1/-1, "scores": combined normalised score (>= 1 is anomalous),
+        "detectors": {name: normalised scores, NaN where not run}, "escalated": mask},
+        or None while no detector is fitted.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        ready = [name for name, d in self.detectors.items() if d.fitted]
+        if not ready or not len(X):
+            return None
+        cheap = [name for name in ready if self.detectors[name].cheap]
+        costly = [name for name in ready if not self.detectors[name].cheap]
+
+        per = {name: raw / max(self.detectors[name].threshold, 1e-12)
+               for name, raw in self._run(cheap, "score_samples", X).items()}
+        gate = np.max([per[name] for name in per], axis=0) if per else np.zeros(len(X))
+        escalate = gate >= self.prefilter_ratio if per else np.ones(len(X), dtype=bool)
+        rows = np.flatnonzero(escalate)
+        decided = np.zeros(len(X), dtype=bool)
+        combined = gate.copy()
+        if costly and len(rows):
+            results = self._run(costly, "score_samples", X[rows])
+            for name, raw in results.items():
+                full = np.full(len(X), np.nan)
+                full[rows] = raw / max(self.detectors[name].threshold, 1e-12)
+                per[name] = full
+            if results:
+                stacked = np.vstack([per[name][rows] for name in results])
+                combined[rows] = stacked.max(axis=0) if self.combine == "max" else stacked.mean(axis=0)
+                decided[rows] = True
+        self.scored_rows += len(X)
+        self.escalated_rows += int(decided.sum())
+        return {
+            "labels": np.where(combined >= 1.0, -1, 1),
+            "scores": combined,
+            "detectors": per,
+            "escalated": decided,
+        }
@@ -1,13 +1,34 @@
 import streamlit as st
-from utils.pdf_utils import generate_pdf
-import base64
+from streamlit_autorefresh import st_autorefresh
+from utils.pdf_utils import start_report_job
+from utils.metrics import instrument
 
+@instrument("page.download")
 def download():
     st.title("📥 Download PDF Report")
     if st.button("Generate Report"):
-        generate_pdf()
-        st.success("Report generated!")
-        if st.session_state.pdf_report:
-            b64 = base64.b64encode(st.session_state.pdf_report).decode()
-            href = f'<a href="data:application/octet-stream;base64,{b64}" download="wifi_report.pdf">Download PDF</a>'
-            st.markdown(href, unsafe_allow_html=True)
+        # built on a background thread; unchanged data is served from the report cache
+        start_report_job()
+
+    job = st.session_state.get("report_job")
+    if job is None:
+        return
+
+    if not job.done:
+        st.progress(job.progress, text=job.message)
+        # poll for progress while the job runs
+        st_autorefresh(interval=1000, key="report_progress")
+        return
+
+    if job.error:
+        st.error(f"Report generation failed: {job.error}")
+        return
+
+    st.session_state.pdf_report = job.result
+    st.success(f"Report generated in {job.elapsed:.1f}s!")
+    st.download_button(
+        "Download PDF",
+        data=job.result,
+        file_name="wifi_report.pdf",
+        mime="application/pdf",
+    )
@@ -0,0 +1,168 @@
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+from utils.constants import FEATURE_WINDOW, FEATURE_EWMA_ALPHA
+
+RATE_METRICS = {"sent_rate": "bytes_sent", "recv_rate": "bytes_recv"}
+STATS = ["mean", "std", "ewma", "min", "max", "z"]
+FEATURE_COLUMNS = (
+    list(RATE_METRICS)
+    + [f"{metric}_{stat}" for metric in RATE_METRICS for stat in STATS]
+    + ["send_recv_ratio"]
+)
+Z_STD_FLOOR = 1.0  # bytes/s; keeps z finite on a perfectly idle link
+
+def to_rate(delta, interval):
+    """Bytes per second over the measured interval (0 when no interval yet)."""
+    return delta / interval if interval > 0 else 0.0
+
+class RollingStat:
+    """
+    O(1)-per-sample rolling statistics over the last `window` values of one series:
+    windowed Welford mean/variance, EWMA, and min/max via monotonic deques.
+    """
+    __slots__ = ("window", "alpha", "values", "mean", "m2", "ewma", "mins", "maxs", "count")
+
+    def __init__(self, window=FEATURE_WINDOW, alpha=FEATURE_EWMA_ALPHA):
+        self.window = window
+        self.alpha = alpha
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = None
+        self.mins = deque()  # (index, value), values increasing
+        self.maxs = deque()  # (index, value), values decreasing
+        self.count = 0
+
+    def push(self, x):
+        """Add x; returns (mean, std, ewma, min, max, z) where z uses the stats before x."""
+        n = len(self.values)
+        if n:
+            prev_std = math.sqrt(max(self.m2, 0.0) / n)
+            z = (x - self.mean) / max(prev_std, Z_STD_FLOOR)
+        else:
+            z = 0.0
+
+        if n < self.window:
+            self.values.append(x)
+            n += 1
+            delta = x - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (x - self.mean)
+        else:
+            # replace the oldest value: combined remove+add Welford step
+            old = self.values.popleft()
+            self.values.append(x)
+            old_mean = self.mean
+            self.mean += (x - old) / n
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+
+        self.ewma = x if self.ewma is None else self.alpha * x + (1 - self.alpha) * self.ewma
+
+        i = self.count
+        self.count += 1
+        while self.mins and self.mins[-1][1] >= x:
+            self.mins.pop()
+        self.mins.append((i, x))
+        while self.maxs and self.maxs[-1][1] <= x:
+            self.maxs.pop()
+        self.maxs.append((i, x))
+        oldest = self.count - self.window
+        if self.mins[0][0] < oldest:
+            self.mins.popleft()
+        if self.maxs[0][0] < oldest:
+            self.maxs.popleft()
+
+        std = math.sqrt(max(self.m2, 0.0) / n)
+        return self.mean, std, self.ewma, self.mins[0][1], self.maxs[0][1], z
+
+class FeatureEngine:
+    """
+    Streaming feature stage between sampling and the detector. Keeps one set of
+    RollingStat per interface and turns each sample's deltas into rates (using the
+    measured interval_s) plus rolling mean/std/EWMA/min/max, a z-score against the
+    interface's own recent window and the send/recv ratio. Every update is O(1) per
+    row regardless of history length.
+    """
+
+    def __init__(self, window=FEATURE_WINDOW, alpha=FEATURE_EWMA_ALPHA):
+        self.window = window
+        self.alpha = alpha
+        self._state = {}
+
+    def _stats_for(self, iface):
+        state = self._state.get(iface)
+        if state is None:
+            state = self._state[iface] = {m: RollingStat(self.window, self.alpha) for m in RATE_METRICS}
+        return state
+
+    def export_state(self):
+        """Per-interface rolling state, picklable (see utils.model_store)."""
+        return {"window": self.window, "alpha": self.alpha, "state": dict(self._state)}
+
+    def restore_state(self, state):
+        """Resume from export_state(); ignored if the window or alpha changed since."""
+        if state and state["window"] == self.window and state["alpha"] == self.alpha:
+            self._state = dict(state["state"])
+
+    def metadata(self):
+        """{iface: samples seen plus current rolling mean/std per rate}, JSON-friendly."""
+        out = {}
+        for iface, stats in self._state.items():
+            meta = {"samples": max(stat.count for stat in stats.values())}
+            for metric, stat in stats.items():
+                n = len(stat.values)
+                meta[f"{metric}_mean"] = stat.mean
+                meta[f"{metric}_std"] = math.sqrt(max(stat.m2, 0.0) / n) if n else 0.0
+            out[iface] = meta
+        return out
+
+    def update(self, df):
+        """Features for the new rows in df (in row order), as a DataFrame aligned with df."""
+        out = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float64)
+        intervals = df["interval_s"].to_numpy(dtype=np.float64) if "interval_s" in df else np.zeros(len(df))
+        ifaces = df["interface"].astype(str).to_numpy()
+        sources = {m: df[col].to_numpy(dtype=np.float64) for m, col in RATE_METRICS.items()}
+        for i in range(len(df)):
+            state = self._stats_for(ifaces[i])
+            row = []
+            rates = {}
+            for metric, values in sources.items():
+                rates[metric] = to_rate(values[i], intervals[i])
+                row.append(rates[metric])
+            for metric in RATE_METRICS:
+                row.extend(state[metric].push(rates[metric]))
+            row.append(rates["sent_rate"] / (rates["recv_rate"] + 1.0))
+            out[i] = row
+        return pd.DataFrame(out, columns=FEATURE_COLUMNS, index=df.index)
+
+def compute_features(df, window=FEATURE_WINDOW, alpha=FEATURE_EWMA_ALPHA):
+    """
+    Vectorised equivalent of feeding df (in row order) through a fresh FeatureEngine,
+    for backfills and offline analysis. Matches the streaming path up to floating-point
+    rounding.
+    """
+    out = pd.DataFrame(index=df.index)
+    interval = df["interval_s"].to_numpy(dtype=np.float64) if "interval_s" in df else np.zeros(len(df))
+    safe = np.where(interval > 0, interval, 1.0)
+    for metric, col in RATE_METRICS.items():
+        out[metric] = np.where(interval > 0, df[col].to_numpy(dtype=np.float64) / safe, 0.0)
+    groups = df["interface"].astype(str)
+    for metric in RATE_METRICS:
+        by_iface = out[metric].groupby(groups, sort=False)
+        rolling = by_iface.rolling(window, min_periods=1)
+        mean = rolling.mean().reset_index(level=0, drop=True).reindex(out.index)
+        std = rolling.std(ddof=0).reset_index(level=0, drop=True).reindex(out.index).fillna(0.0)
+        out[f"{metric}_mean"] = mean
+        out[f"{metric}_std"] = std
+        out[f"{metric}_ewma"] = by_iface.transform(lambda s: s.ewm(alpha=alpha, adjust=False).mean())
+        out[f"{metric}_min"] = rolling.min().reset_index(level=0, drop=True).reindex(out.index)
+        out[f"{metric}_max"] = rolling.max().reset_index(level=0, drop=True).reindex(out.index)
+        prev_mean = mean.groupby(groups, sort=False).shift(1)
+        prev_std = std.groupby(groups, sort=False).shift(1)
+        z = (out[metric] - prev_mean) / np.maximum(prev_std, Z_STD_FLOOR)
+        out[f"{metric}_z"] = z.fillna(0.0)
+    out["send_recv_ratio"] = out["sent_rate"] / (out["recv_rate"] + 1.0)
+    return out[FEATURE_COLUMNS]
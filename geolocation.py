@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import timed
+from utils.constants import (
+    GEO_PROVIDER_URL, GEO_CACHE_SIZE, GEO_CACHE_TTL, GEO_NEGATIVE_TTL,
+    GEO_CACHE_FILE, GEO_WORKERS, GEO_PLACEHOLDER
+)
+
+UNKNOWN = "Unknown"
+
+class GeoCache:
+    """
+    Bounded LRU cache of ip -> location with per-entry expiry.
+    "Unknown" results are kept for a shorter time (negative caching) so a failing
+    provider is not hammered on every refresh. Optionally persisted as JSON.
+    """
+
+    def __init__(self, max_size=GEO_CACHE_SIZE, ttl=GEO_CACHE_TTL,
+                 negative_ttl=GEO_NEGATIVE_TTL, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+        self._entries = OrderedDict()  # ip -> (location, expires_at wall-clock)
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    def get(self, ip):
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry is None:
+                return None
+            location, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[ip]
+                return None
+            self._entries.move_to_end(ip)
+            return location
+
+    def put(self, ip, location):
+        ttl = self.negative_ttl if location == UNKNOWN else self.ttl
+        with self._lock:
+            self._entries[ip] = (location, time.time() + ttl)
+            self._entries.move_to_end(ip)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def load(self):
+        # a missing or corrupt cache file just means a cold cache
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            for ip, (location, expires_at) in raw.items():
+                if expires_at > now:
+                    self._entries[ip] = (location, expires_at)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = dict(self._entries)
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+def format_location(data):
+    city = data.get("city", "")
+    region = data.get("region", "")
+    country = data.get("country", "")
+    loc_str = ", ".join(filter(None, [city, region, country]))
+    return loc_str if loc_str else UNKNOWN
+
+class GeoService:
+    """
+    Non-blocking geolocation lookups.
+    lookup() answers from the cache or returns a placeholder immediately and resolves
+    the address on a small thread pool sharing one pooled HTTP session.
+    """
+
+    def __init__(self, provider_url=GEO_PROVIDER_URL, cache=None, workers=GEO_WORKERS,
+                 timeout=2, session=None):
+        self.provider_url = provider_url
+        self.cache = cache if cache is not None else GeoCache()
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geo")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.requests_made = 0
+
+    def fetch(self, ip):
+        """Blocking provider call; used by the worker threads."""
+        with self._lock:
+            self.requests_made += 1
+        try:
+            with timed("geolocation_http"):
+                response = self.session.get(self.provider_url.format(ip=ip), timeout=self.timeout)
+            if response.status_code == 200:
+                return format_location(response.json())
+        except (requests.RequestException, ValueError):
+            return UNKNOWN
+        return UNKNOWN
+
+    def _resolve(self, ip):
+        try:
+            self.cache.put(ip, self.fetch(ip))
+            self.cache.save()
+        finally:
+            with self._lock:
+                self._pending.discard(ip)
+
+    def lookup(self, ip):
+        """Returns the cached location, or GEO_PLACEHOLDER while a lookup is in flight."""
+        location = self.cache.get(ip)
+        if location is not None:
+            return location
+        with self._lock:
+            if ip not in self._pending:
+                self._pending.add(ip)
+                self._executor.submit(self._resolve, ip)
+        return GEO_PLACEHOLDER
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout=None):
+        """Block until all in-flight lookups finish (mainly for scripts/tests)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_geo_service():
+    """Process-wide service so every session/rerun shares one cache and pool."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = GeoService(cache=GeoCache(path=GEO_CACHE_FILE))
+        return _service
+
+def set_geo_service(service):
+    """Swap the process-wide service (e.g. one pointed at a local stub provider)."""
+    global _service
+    with _service_lock:
+        _service = service
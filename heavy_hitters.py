@@ -0,0 +1,334 @@
+import ipaddress
+import math
+import os
+import sys
+import threading
+from collections import Counter, deque
+import numpy as np
+import pandas as pd
+
+from utils.constants import (
+    HH_TOP_K, HH_CM_WIDTH, HH_CM_DEPTH, HH_INTERVAL, HH_SNAPSHOTS, PROCFS_ROOT,
+)
+
+BYTE_METRICS = ("bytes_sent", "bytes_recv")
+MASK64 = (1 << 64) - 1
+V4_MAPPED = 0xFFFF << 32
+
+# Peers are keyed by their address as one 128-bit int (IPv4 mapped into ::ffff:0:0/96,
+# the same layout utils.pcap_ingest decodes into (hi, lo) uint64 halves).
+
+def split_keys(keys):
+    """128-bit int keys -> (hi, lo) uint64 arrays."""
+    return (np.array([k >> 64 for k in keys], dtype=np.uint64),
+            np.array([k & MASK64 for k in keys], dtype=np.uint64))
+
+def peer_label(key):
+    addr = ipaddress.IPv6Address(key)
+    return str(addr.ipv4_mapped or addr)
+
+def _mix(x):
+    """splitmix64 finaliser on a uint64 array (wrapping arithmetic)."""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+class CountMinSketch:
+    """
+    depth x width weighted counters. estimate(x) never underestimates, and
+    overestimates by at most e / width * total with probability >= 1 - e^-depth.
+    Sketches with the same shape and seed merge by adding their tables.
+    """
+
+    def __init__(self, width=HH_CM_WIDTH, depth=HH_CM_DEPTH, seed=0):
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.float64)
+        self.total = 0.0
+        self._salts = np.random.default_rng(seed).integers(1, 2**63, size=depth, dtype=np.uint64)
+
+    def _index(self, hi, lo):
+        with np.errstate(over="ignore"):
+            base = _mix(hi ^ _mix(lo))
+            width = np.uint64(self.width)
+            return np.stack([(_mix(base ^ salt) % width).astype(np.int64) for salt in self._salts])
+
+    def add(self, hi, lo, weights):
+        idx = self._index(hi, lo)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(idx[row], weights=weights, minlength=self.width)
+        self.total += float(np.sum(weights))
+
+    def estimate(self, hi, lo):
+        idx = self._index(hi, lo)
+        return self.table[np.arange(self.depth)[:, None], idx].min(axis=0)
+
+    @property
+    def error_bound(self):
+        return math.e / self.width * self.total
+
+    def merge(self, other):
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("Count-Min sketches must share width, depth and seed to merge")
+        out = CountMinSketch(self.width, self.depth, self.seed)
+        out.table = self.table + other.table
+        out.total = self.total + other.total
+        return out
+
+class SpaceSaving:
+    """
+    Weighted Space-Saving summary with at most k counters.
+
+    For every tracked key, count - error <= true weight <= count. An untracked key's
+    true weight is at most min_count, and min_count <= total / k, so every key
+    heavier than total / k is tracked. Batches are folded in as exact summaries and
+    merges combine two summaries the same way (a key missing from one side enters
+    at that side's minimum), which keeps all of these bounds.
+    """
+
+    def __init__(self, k=HH_TOP_K):
+        self.k = k
+        self.counts = pd.Series(dtype=np.float64)
+        self.errors = pd.Series(dtype=np.float64)
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def min_count(self):
+        return float(self.counts.min()) if len(self.counts) >= self.k else 0.0
+
+    def _fold(self, counts, errors, floor):
+        own_floor = self.min_count
+        index = self.counts.index.union(counts.index)
+        total = (self.counts.reindex(index).fillna(own_floor) + counts.reindex(index).fillna(floor))
+        error = (self.errors.reindex(index).fillna(own_floor) + errors.reindex(index).fillna(floor))
+        keep = total.nlargest(self.k).index
+        self.counts, self.errors = total.loc[keep], error.loc[keep]
+
+    def update(self, keys, weights):
+        """Fold in a batch of distinct keys with their summed weights."""
+        batch = pd.Series(np.asarray(weights, dtype=np.float64), index=pd.Index(keys, dtype=object))
+        self._fold(batch, pd.Series(0.0, index=batch.index), 0.0)
+        self.total += float(batch.sum())
+
+    def merge(self, other):
+        out = SpaceSaving(max(self.k, other.k))
+        out.counts, out.errors, out.total = self.counts, self.errors, self.total
+        out._fold(other.counts, other.errors, other.min_count)
+        out.total += other.total
+        return out
+
+class PeerSketch:
+    """Space-Saving top-k plus a Count-Min sketch over the same weighted peer stream."""
+
+    def __init__(self, k=HH_TOP_K, width=HH_CM_WIDTH, depth=HH_CM_DEPTH, seed=0):
+        self.top_k = SpaceSaving(k)
+        self.cm = CountMinSketch(width, depth, seed)
+
+    @property
+    def total(self):
+        return self.cm.total
+
+    def add(self, hi, lo, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        live = weights > 0
+        if not live.any():
+            return
+        hi, lo, weights = hi[live], lo[live], weights[live]
+        frame = pd.DataFrame({"hi": hi, "lo": lo, "w": weights})
+        grouped = frame.groupby(["hi", "lo"], sort=False)["w"].sum()
+        keys = [(int(h) << 64) | int(l) for h, l in grouped.index]
+        self.top_k.update(keys, grouped.to_numpy())
+        self.cm.add(hi, lo, weights)
+
+    def merge(self, other):
+        out = PeerSketch.__new__(PeerSketch)
+        out.top_k = self.top_k.merge(other.top_k)
+        out.cm = self.cm.merge(other.cm)
+        return out
+
+    def top(self, n=10):
+        """
+        The n heaviest peers: `estimate` is the tighter of the two upper bounds
+        (Space-Saving count, Count-Min estimate), `lower` a guaranteed lower bound.
+        """
+        counts = self.top_k.counts.nlargest(n)
+        if counts.empty:
+            return pd.DataFrame(columns=["peer", "estimate", "lower"])
+        keys = list(counts.index)
+        hi, lo = split_keys(keys)
+        estimate = np.minimum(counts.to_numpy(), self.cm.estimate(hi, lo))
+        lower = np.maximum(counts.to_numpy() - self.top_k.errors.loc[keys].to_numpy(), 0.0)
+        return pd.DataFrame({"peer": [peer_label(k) for k in keys], "estimate": estimate, "lower": lower})
+
+class HeavyHitterTracker:
+    """
+    Top remote peers by a set of weighted metrics, in fixed memory: bytes sent to
+    and received from them for packet captures, connected sockets for the live
+    socket tables (see ProcNetPeers).
+
+    Traffic is added to the PeerSketches of its `interval`-second snapshot;
+    the last `keep` snapshots are retained and query() merges the ones in the
+    requested window. Snapshots are mergeable, so trackers from several collectors
+    (or a capture replay) can be combined with merge_snapshots().
+    """
+
+    def __init__(self, interval=HH_INTERVAL, keep=HH_SNAPSHOTS, k=HH_TOP_K,
+                 width=HH_CM_WIDTH, depth=HH_CM_DEPTH, metrics=BYTE_METRICS):
+        self.interval = float(interval)
+        self.metrics = tuple(metrics)
+        self.k, self.width, self.depth = k, width, depth
+        self.version = 0
+        self._snapshots = deque(maxlen=keep)  # (start seconds, {metric: PeerSketch})
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _new_sketches(self):
+        return {metric: PeerSketch(self.k, self.width, self.depth) for metric in self.metrics}
+
+    def _snapshot(self, start):
+        for snap_start, sketches in reversed(self._snapshots):
+            if snap_start == start:
+                return sketches
+        if not self._snapshots or start > self._snapshots[-1][0]:
+            sketches = self._new_sketches()
+            self._snapshots.append((start, sketches))
+            return sketches
+        # late data for an interval no longer (or never) held: fold into the nearest one
+        return min(self._snapshots, key=lambda snap: abs(snap[0] - start))[1]
+
+    def add(self, ts, hi, lo, **weights):
+        """
+        Add traffic for peers (hi, lo) at epoch-second timestamp(s) ts, with
+        per-entry weights by metric name (e.g. bytes_sent=..., bytes_recv=...).
+        """
+        unknown = set(weights) - set(self.metrics)
+        if unknown:
+            raise ValueError(f"metrics not tracked: {sorted(unknown)}")
+        hi, lo = np.asarray(hi, dtype=np.uint64), np.asarray(lo, dtype=np.uint64)
+        slots = np.floor(np.broadcast_to(np.asarray(ts, dtype=np.float64), hi.shape) / self.interval)
+        weights = {metric: np.broadcast_to(np.asarray(w, dtype=np.float64), hi.shape)
+                   for metric, w in weights.items()}
+        with self._lock:
+            for slot in np.unique(slots):
+                mask = slots == slot
+                sketches = self._snapshot(slot * self.interval)
+                for metric, w in weights.items():
+                    sketches[metric].add(hi[mask], lo[mask], w[mask])
+            self.version += 1
+            self._cache.clear()
+
+    def snapshots(self, since=None):
+        """[(start, {metric: PeerSketch})] for snapshots overlapping [since, now]."""
+        with self._lock:
+            return [(start, sketches) for start, sketches in self._snapshots
+                    if since is None or start + self.interval > since]
+
+    def merged(self, metric="bytes_sent", since=None):
+        merged = None
+        for _, sketches in self.snapshots(since):
+            merged = sketches[metric] if merged is None else merged.merge(sketches[metric])
+        return merged
+
+    def query(self, metric="bytes_sent", n=10, since=None):
+        """
+        Top n peers for metric since epoch seconds `since` (None: everything kept).
+        attrs carry the bounds: every estimate is within `error_bound` of the true
+        total (Space-Saving guarantee), and `total` is the metric's whole window.
+        """
+        key = (metric, n, None if since is None else math.floor(since / self.interval))
+        with self._lock:
+            cached = self._cache.get(key)
+            version = self.version
+        if cached is not None:
+            return cached
+        merged = self.merged(metric, since)
+        if merged is None:
+            out = pd.DataFrame(columns=["peer", "estimate", "lower"])
+            out.attrs.update(total=0.0, error_bound=0.0, cm_error_bound=0.0)
+        else:
+            out = merged.top(n)
+            out.attrs.update(total=merged.total, error_bound=merged.top_k.min_count,
+                             cm_error_bound=merged.cm.error_bound)
+        out.attrs["version"] = ("peers", id(self), version, key)
+        with self._lock:
+            if self.version == version:
+                self._cache[key] = out
+        return out
+
+def merge_snapshots(*trackers, metric="bytes_sent", since=None):
+    """One PeerSketch merging every snapshot of several trackers (same sketch shape)."""
+    merged = None
+    for tracker in trackers:
+        sketch = tracker.merged(metric, since)
+        if sketch is not None:
+            merged = sketch if merged is None else merged.merge(sketch)
+    return merged
+
+# -- live source: socket tables --------------------------------------------------
+
+PROC_NET_TABLES = ("tcp", "tcp6", "udp", "udp6")
+TCP_ESTABLISHED = b"01"
+LOOPBACK = [ipaddress.ip_network("127.0.0.0/8"), ipaddress.ip_network("::1/128")]
+
+def _proc_addr(hex_addr):
+    """Address field of /proc/net/{tcp,udp}[6]: 32-bit words printed in host byte order."""
+    raw = b"".join(int(hex_addr[i:i + 8], 16).to_bytes(4, sys.byteorder) for i in range(0, len(hex_addr), 8))
+    value = int.from_bytes(raw, "big")
+    return value if len(raw) == 16 else (V4_MAPPED | value if value else 0)
+
+def parse_proc_net(raw, tcp=True):
+    """
+    Connected sockets in one /proc/net table as (peer key, tx_queue, rx_queue);
+    listening/unconnected sockets and loopback peers are skipped.
+    """
+    out = []
+    for line in raw.split(b"\n")[1:]:
+        fields = line.split()
+        if len(fields) < 5 or (tcp and fields[3] != TCP_ESTABLISHED):
+            continue
+        addr_hex, _, port = fields[2].partition(b":")
+        key = _proc_addr(addr_hex)
+        if not key or port == b"0000":
+            continue
+        addr = ipaddress.IPv6Address(key)
+        if any((addr.ipv4_mapped or addr) in net for net in LOOPBACK):
+            continue
+        tx, _, rx = fields[4].partition(b":")
+        out.append((key, int(tx, 16), int(rx, 16)))
+    return out
+
+class ProcNetPeers:
+    """
+    Remote peers of this host's connected TCP/UDP sockets, from /proc/net.
+
+    The kernel's socket tables have no per-socket byte counters, so the live view
+    ranks peers by connected sockets: connections() gives each peer's socket count
+    at one read, and the collector sums those reads over time. Only packet captures
+    (utils.pcap_ingest) give per-peer bytes.
+    """
+
+    def __init__(self, procfs_root=PROCFS_ROOT):
+        self.procfs_root = procfs_root
+
+    def read(self):
+        sockets = []
+        for table in PROC_NET_TABLES:
+            try:
+                with open(os.path.join(self.procfs_root, "net", table), "rb") as f:
+                    sockets += parse_proc_net(f.read(), tcp=table.startswith("tcp"))
+            except OSError:
+                continue  # table missing (no IPv6, not Linux)
+        return sockets
+
+    def connections(self):
+        """(hi, lo, sockets) arrays with each connected peer's socket count, or None."""
+        counts = Counter(key for key, _, _ in self.read())
+        if not counts:
+            return None
+        hi, lo = split_keys(list(counts))
+        return hi, lo, np.array(list(counts.values()), dtype=np.float64)
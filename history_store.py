@@ -0,0 +1,274 @@
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+from utils.constants import HISTORY_CAPACITY
+from utils.protocol_stats import PROTOCOL_COLUMNS
+from utils.features import FEATURE_COLUMNS
+from utils.metrics import instrument
+
+# column -> dtype; "category" columns are dictionary-encoded as int32 codes
+HISTORY_SCHEMA = {
+    "timestamp": "datetime64[ns]",
+    "interface": "category",
+    "ip_address": "category",
+    "location": "category",
+    "bytes_sent": "int64",
+    "bytes_recv": "int64",
+    "cum_bytes_sent": "int64",
+    "cum_bytes_recv": "int64",
+    "interval_s": "float64",
+    **{col: "int64" for col in PROTOCOL_COLUMNS},
+    "protocol": "category",
+    **{col: "float64" for col in FEATURE_COLUMNS},
+    "anomaly": "float64",        # 1 normal, -1 anomaly, NaN not scored yet
+    "anomaly_score": "float64",
+}
+
+def _missing(dtype):
+    if dtype == "datetime64[ns]":
+        return np.datetime64("NaT")
+    if dtype == "float64":
+        return np.nan
+    return 0
+
+class HistoryStore:
+    """
+    Fixed-capacity columnar ring buffer for traffic samples.
+
+    Every column is a preallocated NumPy array of 2 * capacity slots and each row is
+    written twice (slot i and slot i + capacity). That keeps the most recent N rows
+    contiguous for any N <= capacity, so "last N" and time-range windows are plain
+    array slices (views, no copy) and appends are O(1) per row. Memory is fixed at
+    construction no matter how many rows are appended.
+
+    Rows are addressed by a monotonically increasing sequence number (`seq`); the
+    store retains seq in [total - len, total).
+    """
+
+    def __init__(self, capacity=HISTORY_CAPACITY, schema=None):
+        self.capacity = int(capacity)
+        self.schema = dict(schema or HISTORY_SCHEMA)
+        self._data = {}
+        self._categories = {}
+        self._codes = {}
+        for col, dtype in self.schema.items():
+            if dtype == "category":
+                self._data[col] = np.zeros(2 * self.capacity, dtype=np.int32)
+                self._categories[col] = []
+                self._codes[col] = {}
+            else:
+                self._data[col] = np.full(2 * self.capacity, _missing(dtype), dtype=dtype)
+        self.total = 0
+        self.version = 0  # bumped on every append/set so readers can cache by it
+        self.rewrites = 0  # bumped on every set or recode; see rewrites_since
+        self._rewrite_log = deque(maxlen=256)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def empty(self):
+        return self.total == 0
+
+    @property
+    def columns(self):
+        return list(self.schema)
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def nbytes(self):
+        return sum(arr.nbytes for arr in self._data.values())
+
+    # -- encoding -------------------------------------------------------------
+
+    def encode(self, column, values):
+        """Map values to int32 codes, growing the column's dictionary as needed."""
+        if len(self._categories[column]) >= 2 * self.capacity:
+            self._compact(column)
+        codes = self._codes[column]
+        categories = self._categories[column]
+        out = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            value = "N/A" if value is None else str(value)
+            code = codes.get(value)
+            if code is None:
+                code = len(categories)
+                codes[value] = code
+                categories.append(value)
+            out[i] = code
+        return out
+
+    def _compact(self, column):
+        """
+        Drop categories no retained row uses and renumber the rest, so a column with
+        ever-new values (addresses, locations) keeps at most about 2 * capacity
+        entries. Logged as a rewrite of the column's retained rows, since every code
+        may have changed.
+        """
+        arr = self._data[column]
+        used = np.unique(self.view(column))
+        remap = np.zeros(len(self._categories[column]), dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        arr[:] = remap[arr]  # slots never written hold code 0, which stays in range
+        self._categories[column] = [self._categories[column][code] for code in used]
+        self._codes[column] = {value: code for code, value in enumerate(self._categories[column])}
+        if len(self):
+            self._log_rewrite(column, self.total - len(self), self.total - 1)
+
+    def code_of(self, column, value):
+        """Code for value in a categorical column, or None if it never occurred."""
+        return self._codes[column].get(value)
+
+    def categories(self, column):
+        return list(self._categories[column])
+
+    def decode(self, column, codes):
+        return pd.Categorical.from_codes(codes, categories=self._categories[column])
+
+    # -- writes ---------------------------------------------------------------
+
+    def _slots(self, seqs):
+        return seqs % self.capacity
+
+    @instrument("history_append", rows=lambda seqs, *a, **k: len(seqs))
+    def append(self, rows):
+        """
+        Append a DataFrame (or dict of equal-length columns). Columns missing from
+        rows are filled with the column's missing value. Returns the new rows' seqs.
+        """
+        if isinstance(rows, pd.DataFrame):
+            n = len(rows)
+            get = lambda col: rows[col].to_numpy() if col in rows.columns else None
+        else:
+            n = len(next(iter(rows.values()))) if rows else 0
+            get = lambda col: np.asarray(rows[col]) if col in rows else None
+        if n == 0:
+            return np.arange(self.total, self.total, dtype=np.int64)
+
+        with self._lock:
+            seqs = np.arange(self.total, self.total + n, dtype=np.int64)
+            keep = slice(max(0, n - self.capacity), n)  # only the newest `capacity` rows survive
+            slots = self._slots(seqs[keep])
+            for col, dtype in self.schema.items():
+                values = get(col)
+                if values is None:
+                    fill = "N/A" if dtype == "category" else _missing(dtype)
+                    values = np.full(n, fill, dtype=object if dtype == "category" else dtype)
+                values = values[keep]
+                if dtype == "category":
+                    values = self.encode(col, values)
+                elif dtype == "datetime64[ns]":
+                    values = pd.to_datetime(values).to_numpy(dtype="datetime64[ns]")
+                else:
+                    values = np.asarray(pd.to_numeric(values, errors="coerce"), dtype=np.float64)
+                    if dtype == "int64":
+                        values = np.nan_to_num(values).astype(np.int64)
+                self._write(col, slots, values)
+            self.total += n
+            self.version += 1
+            return seqs
+
+    def _write(self, column, slots, values):
+        arr = self._data[column]
+        arr[slots] = values
+        arr[slots + self.capacity] = values
+
+    def set(self, column, seqs, values):
+        """Overwrite column for retained rows (e.g. late geolocation or anomaly labels)."""
+        seqs = np.asarray(seqs, dtype=np.int64)
+        values = np.asarray(values)
+        if values.ndim == 0:
+            dtype = object if values.dtype.kind == "U" else values.dtype
+            values = np.full(len(seqs), values.item(), dtype=dtype)
+        with self._lock:
+            retained = seqs >= self.total - len(self)
+            seqs, values = seqs[retained], values[retained]
+            if self.schema[column] == "category":
+                values = self.encode(column, values)
+            self._write(column, self._slots(seqs), values)
+            self.version += 1
+            if len(seqs):
+                self._log_rewrite(column, int(seqs.min()), int(seqs.max()))
+
+    def _log_rewrite(self, column, first, last):
+        self.rewrites += 1
+        self._rewrite_log.append((self.rewrites, column, first, last))
+
+    def rewrites_since(self, rewrites):
+        """
+        (column, first seq, last seq) for every set() or dictionary compaction after
+        the given `rewrites` count, so incremental readers can refresh just the rows
+        that changed. None when the log no longer reaches back that far.
+        """
+        with self._lock:
+            if rewrites < self.rewrites - len(self._rewrite_log):
+                return None
+            return [(col, lo, hi) for n, col, lo, hi in self._rewrite_log if n > rewrites]
+
+    # -- reads ----------------------------------------------------------------
+
+    def _bounds(self, n=None):
+        size = len(self)
+        n = size if n is None else max(0, min(int(n), size))
+        end = (self.total - 1) % self.capacity + self.capacity + 1 if self.total else self.capacity
+        return end - n, end
+
+    def view(self, column, n=None):
+        """Zero-copy view of the last n rows of column (codes for categoricals)."""
+        start, end = self._bounds(n)
+        return self._data[column][start:end]
+
+    def seqs(self, n=None):
+        n = len(self) if n is None else max(0, min(int(n), len(self)))
+        return np.arange(self.total - n, self.total, dtype=np.int64)
+
+    def time_window(self, start=None, end=None, n=None):
+        """(lo, hi) positions within the last n rows covering start <= timestamp <= end,
+        found by binary search (samples are appended in time order)."""
+        ts = self.view("timestamp", n)
+        bound = lambda t, side: int(np.searchsorted(ts, np.datetime64(pd.Timestamp(t)), side=side))
+        lo = 0 if start is None else bound(start, "left")
+        hi = len(ts) if end is None else bound(end, "right")
+        return lo, hi
+
+    def range_view(self, column, start=None, end=None):
+        """Zero-copy view of column for rows with start <= timestamp <= end."""
+        lo, hi = self.time_window(start, end)
+        return self.view(column)[lo:hi]
+
+    def to_frame(self, n=None, columns=None, start=None, end=None, positions=None):
+        """
+        Materialise a pandas DataFrame for the last n rows, a time range, or explicit
+        positions into the retained window. Categoricals come back as pandas
+        Categoricals built from the stored codes (no string copies).
+        """
+        columns = columns or self.columns
+        with self._lock:
+            if start is not None or end is not None:
+                lo, hi = self.time_window(start, end, n)
+                window = slice(lo, hi)
+            else:
+                window = slice(None)
+            data = {}
+            for col in columns:
+                arr = self.view(col, n)[window] if positions is None else self.view(col)[positions]
+                if self.schema[col] == "category":
+                    data[col] = self.decode(col, arr.copy())
+                else:
+                    data[col] = arr.copy()
+            index = self.seqs(n)[window] if positions is None else self.seqs()[positions]
+        return pd.DataFrame(data, index=pd.Index(index, name="seq"), copy=False)
+
+    def tail(self, n):
+        return self.to_frame(n)
+
+    def value_counts(self, column, n=None, positions=None):
+        """Counts per category of a categorical column without decoding strings."""
+        codes = self.view(column, n) if positions is None else self.view(column)[positions]
+        counts = np.bincount(codes, minlength=len(self._categories[column]))
+        counts = pd.Series(counts, index=self._categories[column])
+        return counts[counts > 0].sort_values(ascending=False)
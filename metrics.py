@@ -0,0 +1,197 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.constants import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+# latency histogram bucket upper bounds, seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class StageStats:
+    __slots__ = ("counts", "sum", "count", "rows", "errors", "max", "last")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.rows = 0
+        self.errors = 0
+        self.max = 0.0
+        self.last = 0.0
+
+    def quantile(self, q):
+        """Approximate quantile by linear interpolation inside the histogram bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            # never report beyond what was actually observed
+            upper = min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+            lower = min(lower, upper)
+            if seen + n >= target and n:
+                return lower + (upper - lower) * (target - seen) / n
+            seen += n
+            lower = upper
+        return self.max
+
+class Registry:
+    """
+    Process-wide latency histograms, call counts, error counts and rows processed
+    per stage. Recording is a dict lookup plus a bisect under one lock; when
+    disabled, timed()/instrument() skip even that.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, rows=0, error=False):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats()
+            stats.counts[bisect_left(BUCKETS, seconds)] += 1
+            stats.sum += seconds
+            stats.count += 1
+            stats.rows += rows
+            stats.errors += int(error)
+            stats.last = seconds
+            if seconds > stats.max:
+                stats.max = seconds
+
+    def snapshot(self):
+        """One summary dict per stage, for the diagnostics panel."""
+        with self._lock:
+            return [
+                {
+                    "stage": stage, "calls": s.count, "errors": s.errors, "rows": s.rows,
+                    "last_ms": s.last * 1000, "mean_ms": s.sum / s.count * 1000 if s.count else 0.0,
+                    "p50_ms": s.quantile(0.5) * 1000, "p95_ms": s.quantile(0.95) * 1000,
+                    "max_ms": s.max * 1000,
+                }
+                for stage, s in sorted(self._stages.items())
+            ]
+
+    def prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            "# HELP wifi_guardian_stage_seconds Time spent per pipeline stage.",
+            "# TYPE wifi_guardian_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for stage, s in stages:
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), s.counts):
+                    cumulative += n
+                    lines.append(
+                        f'wifi_guardian_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'wifi_guardian_stage_seconds_sum{{stage="{stage}"}} {s.sum}')
+                lines.append(f'wifi_guardian_stage_seconds_count{{stage="{stage}"}} {s.count}')
+            lines += [
+                "# HELP wifi_guardian_stage_rows_total Rows processed per pipeline stage.",
+                "# TYPE wifi_guardian_stage_rows_total counter",
+            ]
+            lines += [f'wifi_guardian_stage_rows_total{{stage="{stage}"}} {s.rows}' for stage, s in stages]
+            lines += [
+                "# HELP wifi_guardian_stage_errors_total Calls that raised, per pipeline stage.",
+                "# TYPE wifi_guardian_stage_errors_total counter",
+            ]
+            lines += [f'wifi_guardian_stage_errors_total{{stage="{stage}"}} {s.errors}'
+                      for stage, s in stages]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+registry = Registry()
+
+class _Span:
+    __slots__ = ("stage", "rows", "_start")
+
+    def __init__(self, stage, rows):
+        self.stage = stage
+        self.rows = rows
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.record(self.stage, time.perf_counter() - self._start, self.rows or 0, exc_type is not None)
+        return False
+
+class _NullSpan:
+    __slots__ = ("rows",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+def timed(stage, rows=0):
+    """
+    Context manager timing one stage. Set span.rows inside the block when the row
+    count is only known later:  with timed("detector_score") as span: ...; span.rows = n
+    """
+    if not registry.enabled:
+        return _NullSpan()
+    return _Span(stage, rows)
+
+def instrument(stage, rows=None):
+    """
+    Decorator form of timed(). rows, if given, is called as rows(result, *args, **kwargs)
+    to get the number of rows the call processed.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            with _Span(stage, 0) as span:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    try:
+                        span.rows = int(rows(result, *args, **kwargs))
+                    except (TypeError, ValueError):
+                        pass
+                return result
+        return wrapper
+    return decorate
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the app's stderr
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics on a daemon thread (once per process). Returns the server or None."""
+    global _server
+    with _server_lock:
+        if _server is None and registry.enabled:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                return None  # port taken, e.g. by another app instance
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-http").start()
+        return _server
@@ -0,0 +1,128 @@
+import json
+import os
+import pickle
+import time
+import uuid
+from datetime import datetime
+import numpy as np
+
+from utils.anomaly import DETECTOR_FEATURES
+from utils.constants import MODEL_DIR, MODEL_NAME
+
+# bump when the payload layout or the meaning of the features changes; older
+# artifacts are then ignored and the detector refits from live samples
+ARTIFACT_FORMAT = 2
+
+def artifact_paths(name=MODEL_NAME, directory=MODEL_DIR):
+    """(metadata JSON, pickled payload) paths for an artifact name."""
+    base = os.path.join(directory, name)
+    return base + ".json", base + ".pkl"
+
+def _atomic_write(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _minor(version):
+    return ".".join(version.split(".")[:2])
+
+def training_summary(window, features=DETECTOR_FEATURES):
+    """Per-feature rows/mean/std/min/quartiles/max of a training window, JSON-friendly."""
+    window = np.asarray(window, dtype=np.float64)
+    if not len(window):
+        return {"rows": 0, "features": {}}
+    quartiles = np.percentile(window, [25, 50, 75], axis=0)
+    return {
+        "rows": len(window),
+        "features": {
+            name: {
+                "mean": float(window[:, i].mean()), "std": float(window[:, i].std()),
+                "min": float(window[:, i].min()), "25%": float(quartiles[0, i]),
+                "50%": float(quartiles[1, i]), "75%": float(quartiles[2, i]),
+                "max": float(window[:, i].max()),
+            }
+            for i, name in enumerate(features)
+        },
+    }
+
+def save_detector(detector, features=None, name=MODEL_NAME, directory=MODEL_DIR):
+    """
+    Write a fitted StreamingDetector, and optionally its FeatureEngine's per-interface
+    state, as a versioned artifact:
+    - <name>.json: format, library versions, parameters, training-window summary and
+      per-interface metadata; readable without unpickling anything;
+    - <name>.pkl: the detector engine, its drift scaling, the training window and
+      the feature state.
+    Each file is replaced atomically and both carry the same id, so a reader never
+    pairs halves of different saves. Returns the metadata, or None if unfitted.
+    """
+    state = detector.export_state()
+    if state is None:
+        return None
+    import sklearn
+    artifact_id = uuid.uuid4().hex
+    meta = {
+        "format": ARTIFACT_FORMAT,
+        "id": artifact_id,
+        "saved_at": datetime.now().isoformat(timespec="seconds"),
+        "sklearn": sklearn.__version__,
+        "numpy": np.__version__,
+        "features": list(DETECTOR_FEATURES),
+        "params": state["params"],
+        "training": training_summary(state["window"]),
+        "interfaces": features.metadata() if features is not None else {},
+    }
+    payload = {
+        "format": ARTIFACT_FORMAT,
+        "id": artifact_id,
+        "detector": state,
+        "feature_state": features.export_state() if features is not None else None,
+    }
+    os.makedirs(directory, exist_ok=True)
+    json_path, pkl_path = artifact_paths(name, directory)
+    _atomic_write(pkl_path, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+    _atomic_write(json_path, json.dumps(meta, indent=2).encode())
+    return meta
+
+def read_metadata(name=MODEL_NAME, directory=MODEL_DIR):
+    """The artifact's JSON metadata; raises OSError if missing, ValueError if unusable."""
+    json_path, _ = artifact_paths(name, directory)
+    with open(json_path, "rb") as f:
+        try:
+            meta = json.load(f)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"corrupt model metadata: {exc}") from exc
+    if meta.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"model artifact format {meta.get('format')} (expected {ARTIFACT_FORMAT})")
+    if meta.get("features") != list(DETECTOR_FEATURES):
+        raise ValueError("model was trained on different features")
+    import sklearn
+    if _minor(meta.get("sklearn", "")) != _minor(sklearn.__version__):
+        # pickled estimators are only supported by the scikit-learn release that wrote them
+        raise ValueError(
+            f"model saved with scikit-learn {meta.get('sklearn')}, running {sklearn.__version__}")
+    return meta
+
+def load_detector(detector, features=None, name=MODEL_NAME, directory=MODEL_DIR):
+    """
+    Restore a saved artifact into detector (and features) so scoring starts on the
+    first sample. Returns the metadata plus "load_seconds". Raises OSError when
+    there is no artifact and ValueError when it can't be used (other format, other
+    features, other scikit-learn release, mismatched or corrupt files). Only load
+    artifacts this app wrote: the payload is a pickle.
+    """
+    started = time.perf_counter()
+    meta = read_metadata(name, directory)
+    _, pkl_path = artifact_paths(name, directory)
+    with open(pkl_path, "rb") as f:
+        try:
+            payload = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as exc:
+            raise ValueError(f"corrupt model payload: {exc!r}") from exc
+    if not isinstance(payload, dict) or payload.get("id") != meta["id"]:
+        raise ValueError("model payload does not match its metadata (interrupted save?)")
+    detector.restore_state(payload["detector"])
+    if features is not None:
+        features.restore_state(payload.get("feature_state"))
+    return dict(meta, load_seconds=time.perf_counter() - started)
@@ -1,11 +1,15 @@
 import psutil
 import socket
 import ipaddress
-import random
+import time
 from datetime import datetime
-import requests
+import numpy as np
 import pandas as pd
 import streamlit as st
+from utils.geolocation import get_geo_service
+from utils.protocol_stats import ProtocolSampler, PROTOCOL_COLUMNS
+from utils.constants import GEO_PLACEHOLDER, ADDRESS_REFRESH_SECONDS
+from utils.metrics import instrument
 
 def is_private_ip(ip):
     try:
@@ -14,41 +18,87 @@ def is_private_ip(ip):
         return False
 
 def get_ip_geolocation(ip):
+    """
+    Never blocks: returns a cached location, or GEO_PLACEHOLDER while the lookup
+    runs in the background (see utils.geolocation).
+    """
     if not ip or ip == "127.0.0.1":
         return "Localhost"
     if is_private_ip(ip):
         return "Private Network"
-    try:
-        # keep timeout short so UI doesn't hang
-        response = requests.get(f"https://ipinfo.io/{ip}/json", timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            city = data.get("city", "")
-            region = data.get("region", "")
-            country = data.get("country", "")
-            loc_str = ", ".join(filter(None, [city, region, country]))
-            return loc_str if loc_str else "Unknown"
-    except requests.RequestException:
-        return "Unknown"
-    return "Unknown"
-
-def extract_protocol_stats():
-    # Placeholder for protocol extraction - keep simple for now
-    protocols = ["TCP", "UDP", "ICMP", "OTHER"]
-    return random.choice(protocols)
+    return get_geo_service().lookup(ip)
 
-def get_multi_iface_stats(selected_ifaces):
+def fill_pending_locations(store):
+    """Replace placeholder locations in a HistoryStore once their lookup has resolved."""
+    with store.lock:  # codes are renumbered when a dictionary is compacted
+        placeholder = store.code_of("location", GEO_PLACEHOLDER)
+        if placeholder is None:
+            return
+        pending = np.flatnonzero(store.view("location") == placeholder)
+        if len(pending):
+            service = get_geo_service()
+            ips = store.decode("ip_address", store.view("ip_address")[pending])
+            store.set("location", store.seqs()[pending], [service.lookup(ip) for ip in ips])
+
+class AddressMap:
     """
-    Returns a DataFrame with per-interval (delta) bytes_sent / bytes_recv.
-    Uses st.session_state.prev_counters to compute deltas between calls.
+    psutil.net_if_addrs(), re-read only when it may have changed: an interface
+    appeared or disappeared, an interface's counters went backwards (it was
+    restarted), or `max_age` seconds passed (catches a DHCP renewal on a stable
+    link). Sampling then costs one net_io_counters() call per tick.
     """
-    if "prev_counters" not in st.session_state:
-        st.session_state.prev_counters = {}
 
-    net_io = psutil.net_io_counters(pernic=True)
-    addrs = psutil.net_if_addrs()
+    def __init__(self, max_age=ADDRESS_REFRESH_SECONDS, net_if_addrs=None):
+        self.max_age = max_age
+        self._net_if_addrs = net_if_addrs or psutil.net_if_addrs
+        self._addrs = None
+        self._counters = {}
+        self._read_at = 0.0
+        self.refreshes = 0
+
+    def get(self, net_io, mono=None):
+        """Addresses for this tick; mono is the monotonic time of the net_io read."""
+        now = time.monotonic() if mono is None else mono
+        restarted = any(
+            stats.bytes_sent < self._counters[iface][0] or stats.bytes_recv < self._counters[iface][1]
+            for iface, stats in net_io.items() if iface in self._counters
+        )
+        if self._addrs is None or restarted or net_io.keys() != self._counters.keys() \
+                or now - self._read_at > self.max_age:
+            self._addrs = self._net_if_addrs()
+            self._read_at = now
+            self.refreshes += 1
+        self._counters = {iface: (stats.bytes_sent, stats.bytes_recv) for iface, stats in net_io.items()}
+        return self._addrs
+
+def extract_protocol_stats(selected_ifaces, sampler=None):
+    """
+    Per-interface protocol counters for this interval (see utils.protocol_stats).
+    Pass the caller's ProtocolSampler so deltas are taken against its previous read.
+    """
+    if sampler is None:
+        sampler = ProtocolSampler()
+    return sampler.sample(selected_ifaces)
+
+@instrument("sampling", rows=lambda rows, *a, **k: len(rows))
+def sample_interfaces(selected_ifaces, prev_counters, net_io=None, addrs=None, protocol_sampler=None,
+                      now=None, mono=None):
+    """
+    Returns a list of row dicts with per-interval (delta) bytes_sent / bytes_recv for
+    selected_ifaces. prev_counters is the caller's state dict (iface -> last snapshot)
+    and is updated in place. interval_s is measured on the monotonic clock so
+    wall-clock jumps don't distort it. net_io / addrs may be passed in to share one
+    psutil call between several consumers. protocol_sampler keeps the procfs protocol
+    counters between calls (one read per call covers every interface).
+    """
+    if net_io is None:
+        net_io = psutil.net_io_counters(pernic=True)
+    if addrs is None:
+        addrs = psutil.net_if_addrs()
     data = []
-    now = datetime.now()
+    now = datetime.now() if now is None else now
+    mono = time.monotonic() if mono is None else mono
+    protocol_stats = extract_protocol_stats(selected_ifaces, protocol_sampler)
 
     for iface in selected_ifaces:
         stats = net_io.get(iface)
@@ -60,14 +110,14 @@ def get_multi_iface_stats(selected_ifaces):
                 break
 
         location = get_ip_geolocation(ip) if ip else "Unknown"
-        protocol = extract_protocol_stats()
+        protocol = protocol_stats.get(iface, {})
 
         # If stats is None, skip (interface may be down or nonexistent this moment)
         if not stats:
             continue
 
         # Compute deltas vs previous snapshot (prev counters are cumulative since boot)
-        prev = st.session_state.prev_counters.get(iface)
+        prev = prev_counters.get(iface)
         if prev:
             delta_sent = stats.bytes_sent - prev.get("bytes_sent", stats.bytes_sent)
             delta_recv = stats.bytes_recv - prev.get("bytes_recv", stats.bytes_recv)
@@ -76,16 +126,19 @@ def get_multi_iface_stats(selected_ifaces):
                 delta_sent = 0
             if delta_recv < 0:
                 delta_recv = 0
+            interval = mono - prev.get("mono", mono)
         else:
             # first reading: cannot compute delta, set to 0 to avoid misleading spikes
             delta_sent = 0
             delta_recv = 0
+            interval = 0.0
 
         # Save current cumulative counters for next iteration
-        st.session_state.prev_counters[iface] = {
+        prev_counters[iface] = {
             "bytes_sent": stats.bytes_sent,
             "bytes_recv": stats.bytes_recv,
-            "timestamp": now
+            "timestamp": now,
+            "mono": mono
         }
 
         data.append({
@@ -98,7 +151,26 @@ def get_multi_iface_stats(selected_ifaces):
             "bytes_recv": int(delta_recv),
             "cum_bytes_sent": int(stats.bytes_sent),
             "cum_bytes_recv": int(stats.bytes_recv),
-            "protocol": protocol
+            "interval_s": float(interval),
+            **{col: int(protocol.get(col, 0)) for col in PROTOCOL_COLUMNS},
+            "protocol": protocol.get("protocol", "N/A")
         })
 
-    return pd.DataFrame(data)
+    return data
+
+@instrument("get_multi_iface_stats", rows=lambda df, *a, **k: len(df))
+def get_multi_iface_stats(selected_ifaces):
+    """
+    Returns a DataFrame with per-interval (delta) bytes_sent / bytes_recv.
+    Uses st.session_state.prev_counters to compute deltas between calls.
+    The dashboard itself reads from the shared collector (utils.collector); this is
+    kept for scripts and one-off sampling.
+    """
+    if "prev_counters" not in st.session_state:
+        st.session_state.prev_counters = {}
+    if "protocol_sampler" not in st.session_state:
+        st.session_state.protocol_sampler = ProtocolSampler()
+    return pd.DataFrame(sample_interfaces(
+        selected_ifaces, st.session_state.prev_counters,
+        protocol_sampler=st.session_state.protocol_sampler
+    ))
@@ -0,0 +1,542 @@
+import argparse
+import ipaddress
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from utils.history_store import HistoryStore
+from utils.features import FeatureEngine
+from utils.anomaly import StreamingDetector, to_feature_matrix
+from utils.collector import score_backlog
+from utils.heavy_hitters import HeavyHitterTracker
+from utils.metrics import timed
+from utils.constants import (
+    HISTORY_CAPACITY, PCAP_INTERVAL, PCAP_CHUNK_PACKETS, PCAP_MAX_FLOWS, PCAP_LOCAL_NETS,
+)
+
+LINKTYPE_NULL, LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL = 0, 1, 101, 113
+LINKTYPE_IPV4, LINKTYPE_IPV6 = 228, 229
+# bytes before the IP header, for link types without an ethertype to follow
+LINK_HEADER = {LINKTYPE_NULL: 4, LINKTYPE_RAW: 0, LINKTYPE_LINUX_SLL: 16, LINKTYPE_IPV4: 0, LINKTYPE_IPV6: 0}
+
+PCAP_MAGIC = {0xA1B2C3D4: 1_000, 0xA1B23C4D: 1}  # -> ns per timestamp fraction unit
+PCAPNG_SHB, PCAPNG_IDB, PCAPNG_SPB, PCAPNG_EPB = 0x0A0D0D0A, 1, 3, 6
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+
+COUNT_COLUMNS = [
+    "bytes_sent", "bytes_recv", "tx_packets", "rx_packets", "tcp_segs", "udp_dgrams", "icmp_msgs",
+]
+BUCKET_KEYS = ["bucket", "iface", "ip_hi", "ip_lo"]
+FLOW_KEYS = ["proto", "src_hi", "src_lo", "dst_hi", "dst_lo", "sport", "dport"]
+PROTOCOL_NAMES = {1: "ICMP", 6: "TCP", 17: "UDP", 58: "ICMPv6"}
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+class CaptureReader:
+    """
+    Memory-mapped pcap / pcapng reader. chunks() walks the record headers with
+    struct (the only per-packet Python work: records are variable-length) and
+    yields arrays of offsets into the mapping; packet bytes are never copied.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.interfaces = []  # {"name", "linktype", "mul", "div"}: ticks * mul // div = ns
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"{path}: empty capture")
+        self.buf = np.frombuffer(self._mm, dtype=np.uint8)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        self._stem = stem
+        if len(self._mm) >= 12 and struct.unpack_from("<I", self._mm, 0)[0] == PCAPNG_SHB:
+            self.format = "pcapng"
+            return
+        for endian in "<>":
+            magic = struct.unpack_from(endian + "I", self._mm, 0)[0] if len(self._mm) >= 24 else None
+            if magic in PCAP_MAGIC:
+                self.format = "pcap"
+                self._endian = endian
+                linktype = struct.unpack_from(endian + "I", self._mm, 20)[0] & 0x0FFFFFFF
+                self.interfaces.append(
+                    {"name": stem, "linktype": linktype, "mul": PCAP_MAGIC[magic], "div": 1})
+                return
+        self.close()
+        raise ValueError(f"{path}: not a pcap or pcapng file")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.buf = None  # release the buffer export before unmapping
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    @property
+    def size(self):
+        return len(self._mm)
+
+    def chunks(self, chunk_packets=PCAP_CHUNK_PACKETS):
+        """Yield dicts of int64 arrays (offset, caplen, origlen, ts_ns, iface) per chunk."""
+        walk = self._walk_pcapng if self.format == "pcapng" else self._walk_pcap
+        records = []
+        for record in walk():
+            records.append(record)
+            if len(records) >= chunk_packets:
+                yield self._arrays(records)
+                records = []
+        if records:
+            yield self._arrays(records)
+
+    @staticmethod
+    def _arrays(records):
+        table = np.array(records, dtype=np.int64).reshape(-1, 5)
+        names = ("offset", "caplen", "origlen", "ts_ns", "iface")
+        return {name: table[:, i].copy() for i, name in enumerate(names)}
+
+    def _walk_pcap(self):
+        mm, end, pos = self._mm, len(self._mm), 24
+        unpack = struct.Struct(self._endian + "IIII").unpack_from
+        tick = self.interfaces[0]["mul"]
+        while pos + 16 <= end:
+            sec, frac, caplen, origlen = unpack(mm, pos)
+            if pos + 16 + caplen > end:
+                break  # truncated last record (capture still being written)
+            yield pos + 16, caplen, origlen, sec * 1_000_000_000 + frac * tick, 0
+            pos += 16 + caplen
+
+    def _walk_pcapng(self):
+        mm, end, pos = self._mm, len(self._mm), 0
+        endian, base, last_ts = "<", 0, 0
+        while pos + 12 <= end:
+            if struct.unpack_from("<I", mm, pos)[0] == PCAPNG_SHB:
+                # each section carries its own byte order and interface list
+                bom = struct.unpack_from("<I", mm, pos + 8)[0]
+                endian = "<" if bom == PCAPNG_BYTE_ORDER else ">"
+                base = len(self.interfaces)
+            btype, blen = struct.unpack_from(endian + "II", mm, pos)
+            if blen < 12 or pos + blen > end:
+                break  # corrupt or truncated tail
+            if btype == PCAPNG_EPB:
+                iface, hi, lo, caplen, origlen = struct.unpack_from(endian + "IIIII", mm, pos + 8)
+                info = self.interfaces[base + iface]
+                last_ts = ((hi << 32) | lo) * info["mul"] // info["div"]
+                yield pos + 28, min(caplen, blen - 32), origlen, last_ts, base + iface
+            elif btype == PCAPNG_SPB:
+                origlen = struct.unpack_from(endian + "I", mm, pos + 8)[0]
+                yield pos + 12, min(origlen, blen - 16), origlen, last_ts, base  # no timestamp of its own
+            elif btype == PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + "H", mm, pos + 8)[0]
+                self.interfaces.append(self._idb(pos + 16, pos + blen - 4, endian, linktype))
+            pos += blen
+
+    def _idb(self, pos, end, endian, linktype):
+        name, resolution = f"{self._stem}:{len(self.interfaces)}", 6  # default: microseconds
+        while pos + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", self._mm, pos)
+            if code == 0:
+                break
+            value = self._mm[pos + 4:pos + 4 + length]
+            if code == 2:
+                name = value.decode("utf-8", "replace").rstrip("\0")
+            elif code == 9 and length:
+                resolution = value[0]
+            pos += 4 + (length + 3) // 4 * 4
+        units = 2 ** (resolution & 0x7F) if resolution & 0x80 else 10 ** resolution
+        if 1_000_000_000 % units == 0:
+            return {"name": name, "linktype": linktype, "mul": 1_000_000_000 // units, "div": 1}
+        return {"name": name, "linktype": linktype, "mul": 1_000_000_000, "div": units}
+
+class _Gather:
+    """Vectorised big-endian field reads at per-packet offsets, bounded by caplen."""
+
+    def __init__(self, buf, end):
+        self.buf = buf
+        self.end = end
+
+    def be(self, idx, width, ok):
+        ok = ok & (idx + width <= self.end)
+        safe = np.where(ok, idx, 0)
+        value = np.zeros(len(idx), dtype=np.uint64)
+        for k in range(width):
+            value = (value << np.uint64(8)) | self.buf[safe + k]
+        value = np.where(ok, value, np.uint64(0))
+        return value if width == 8 else value.astype(np.int64)
+
+def decode_packets(buf, chunk, linktypes):
+    """
+    Parse link/IP/transport headers of a chunk of packets in one vectorised pass.
+    Addresses are returned as IPv6 (IPv4 mapped into ::ffff:0:0/96) split into two
+    uint64 halves. IPv6 extension headers are not followed.
+    """
+    off = chunk["offset"]
+    end = off + chunk["caplen"]
+    g = _Gather(buf, end)
+    lt = linktypes[chunk["iface"]]
+
+    eth = lt == LINKTYPE_ETHERNET
+    etype = g.be(off + 12, 2, eth)
+    vlan = eth & ((etype == 0x8100) | (etype == 0x88A8))
+    etype = np.where(vlan, g.be(off + 16, 2, vlan), etype)
+    header = np.full(len(off), -1, dtype=np.int64)
+    header[eth] = np.where(vlan, 18, 14)[eth]
+    for linktype, size in LINK_HEADER.items():
+        header[lt == linktype] = size
+    known = (header >= 0) & (~eth | (etype == 0x0800) | (etype == 0x86DD))
+    l3 = off + np.maximum(header, 0)
+
+    version = g.be(l3, 1, known) >> 4
+    v4 = known & (version == 4) & (l3 + 20 <= end)
+    v6 = known & (version == 6) & (l3 + 40 <= end)
+    proto = np.where(v4, g.be(l3 + 9, 1, v4), g.be(l3 + 6, 1, v6))
+    l4 = l3 + np.where(v4, (g.be(l3, 1, v4) & 0x0F) * 4, 40)
+    fragment = v4 & ((g.be(l3 + 6, 2, v4) & 0x1FFF) != 0)  # later fragments carry no ports
+    ports = (v4 | v6) & ~fragment & ((proto == 6) | (proto == 17))
+
+    mapped = np.uint64(0xFFFF << 32)
+    zero = np.uint64(0)
+    return {
+        "v4": v4, "v6": v6, "ip": v4 | v6, "proto": proto,
+        "src_hi": np.where(v6, g.be(l3 + 8, 8, v6), zero),
+        "src_lo": np.where(v6, g.be(l3 + 16, 8, v6),
+                           np.where(v4, mapped | g.be(l3 + 12, 4, v4).astype(np.uint64), zero)),
+        "dst_hi": np.where(v6, g.be(l3 + 24, 8, v6), zero),
+        "dst_lo": np.where(v6, g.be(l3 + 32, 8, v6),
+                           np.where(v4, mapped | g.be(l3 + 16, 4, v4).astype(np.uint64), zero)),
+        "sport": g.be(l4, 2, ports),
+        "dport": g.be(l4 + 2, 2, ports),
+    }
+
+def _net_masks(cidrs):
+    out = []
+    for cidr in cidrs:
+        net = ipaddress.ip_network(cidr, strict=False)
+        value, prefix = int(net.network_address), net.prefixlen
+        if net.version == 4:
+            value, prefix = (0xFFFF << 32) | value, prefix + 96
+        mask = ((1 << 128) - 1) ^ ((1 << (128 - prefix)) - 1)
+        low = 2**64 - 1
+        out.append(tuple(np.uint64(v) for v in (value >> 64, value & low, mask >> 64, mask & low)))
+    return out
+
+def in_networks(hi, lo, masks):
+    """Vectorised membership of (hi, lo) addresses in any of the _net_masks() networks."""
+    hit = np.zeros(len(hi), dtype=bool)
+    for net_hi, net_lo, mask_hi, mask_lo in masks:
+        hit |= ((hi & mask_hi) == net_hi) & ((lo & mask_lo) == net_lo)
+    return hit
+
+_ip_names = {}
+
+def format_ip(hi, lo):
+    key = (int(hi), int(lo))
+    name = _ip_names.get(key)
+    if name is None:
+        value = (key[0] << 64) | key[1]
+        addr = ipaddress.IPv6Address(value)
+        name = _ip_names[key] = "N/A" if value == 0 else str(addr.ipv4_mapped or addr)
+    return name
+
+class FlowTable:
+    """
+    Bytes/packets per 5-tuple. Held to at most max_flows rows: when it grows past
+    that, the smallest flows are evicted (and counted), so a flow evicted and seen
+    again restarts from zero. The largest flows, which are the ones reported, are exact.
+    """
+
+    def __init__(self, max_flows=PCAP_MAX_FLOWS):
+        self.max_flows = max_flows
+        self.table = None
+        self.evicted_flows = 0
+        self.evicted_bytes = 0
+
+    def add(self, frame):
+        part = frame.groupby(FLOW_KEYS, sort=False).agg(
+            bytes=("bytes", "sum"), packets=("bytes", "size"),
+            first_ns=("ts_ns", "min"), last_ns=("ts_ns", "max"))
+        if self.table is not None:
+            part = pd.concat([self.table, part]).groupby(level=FLOW_KEYS, sort=False).agg(
+                {"bytes": "sum", "packets": "sum", "first_ns": "min", "last_ns": "max"})
+        if len(part) > self.max_flows:
+            keep = int(self.max_flows * 0.8)  # headroom so we don't evict on every chunk
+            part = part.sort_values("bytes", ascending=False)
+            self.evicted_flows += len(part) - keep
+            self.evicted_bytes += int(part["bytes"].iloc[keep:].sum())
+            part = part.iloc[:keep]
+        self.table = part
+
+    def __len__(self):
+        return 0 if self.table is None else len(self.table)
+
+    def top(self, n=20):
+        """The n largest flows by bytes with readable addresses and times."""
+        if self.table is None:
+            return pd.DataFrame(
+                columns=["protocol", "src", "sport", "dst", "dport", "bytes", "packets", "first", "last"])
+        top = self.table.nlargest(n, "bytes").reset_index()
+        return pd.DataFrame({
+            "protocol": [PROTOCOL_NAMES.get(int(p), str(int(p))) for p in top["proto"]],
+            "src": [format_ip(h, l) for h, l in zip(top["src_hi"], top["src_lo"])],
+            "sport": top["sport"].to_numpy(),
+            "dst": [format_ip(h, l) for h, l in zip(top["dst_hi"], top["dst_lo"])],
+            "dport": top["dport"].to_numpy(),
+            "bytes": top["bytes"].to_numpy(),
+            "packets": top["packets"].to_numpy(),
+            "first": _local_time(top["first_ns"].to_numpy()),
+            "last": _local_time(top["last_ns"].to_numpy()),
+        })
+
+def _local_time(ns):
+    """Epoch ns -> naive local timestamps, like the live collector's datetime.now()."""
+    return pd.to_datetime(ns, unit="ns", utc=True).tz_convert(LOCAL_TZ).tz_localize(None)
+
+class CaptureIngest:
+    """
+    Turns a capture into history-schema rows: one row per `interval` seconds per
+    capture interface, with bytes split into sent/received by whether the source is
+    a local address (`local_nets`), TCP/UDP/ICMP packet counts, and the busiest local
+    address as ip_address. Packets are decoded `chunk_packets` at a time and only
+    per-interval sums, a carried-over tail and the bounded flow table are kept, so
+    memory does not grow with capture size.
+    """
+
+    def __init__(self, interval=PCAP_INTERVAL, local_nets=PCAP_LOCAL_NETS,
+                 chunk_packets=PCAP_CHUNK_PACKETS, max_flows=PCAP_MAX_FLOWS, heavy_hitters=None):
+        self.interval = float(interval)
+        self.heavy_hitters = heavy_hitters  # optional HeavyHitterTracker fed with exact per-peer bytes
+        self.interval_ns = int(self.interval * 1e9)
+        self.local = _net_masks(local_nets)
+        self.chunk_packets = chunk_packets
+        self.flows = FlowTable(max_flows)
+        self.packets = 0
+        self.bytes = 0
+        self.non_ip = 0
+        self.rows = 0
+        self.seconds = 0.0  # decode + aggregation time, excluding the consumer's
+        self._pending = None
+        self._max_bucket = None
+        self._cum = {"bytes_sent": {}, "bytes_recv": {}}
+
+    @property
+    def packets_per_second(self):
+        return self.packets / self.seconds if self.seconds else 0.0
+
+    def iter_history(self, path):
+        """
+        Yield history-schema DataFrames as intervals complete. Packets arriving after
+        their interval was emitted (heavily reordered captures) come out as a late row.
+        """
+        with CaptureReader(path) as reader:
+            for chunk in reader.chunks(self.chunk_packets):
+                start = time.perf_counter()
+                with timed("pcap_chunk", rows=len(chunk["offset"])):
+                    linktypes = np.array([info["linktype"] for info in reader.interfaces], dtype=np.int64)
+                    done = self._add_chunk(reader.buf, chunk, linktypes)
+                    frame = self._to_history(done, reader.interfaces) if done is not None else None
+                self.seconds += time.perf_counter() - start
+                if frame is not None and len(frame):
+                    yield frame
+            if self._pending is not None and len(self._pending):
+                frame = self._to_history(self._pending, reader.interfaces)
+                self._pending = None
+                yield frame
+
+    def _add_chunk(self, buf, chunk, linktypes):
+        pkt = decode_packets(buf, chunk, linktypes)
+        ip = pkt["ip"]
+        sent = ip & in_networks(pkt["src_hi"], pkt["src_lo"], self.local)
+        origlen = chunk["origlen"]
+        self.packets += len(origlen)
+        self.bytes += int(origlen.sum())
+        self.non_ip += int((~ip).sum())
+
+        frame = pd.DataFrame({
+            "bucket": chunk["ts_ns"] // self.interval_ns,
+            "iface": chunk["iface"],
+            "ip_hi": np.where(sent, pkt["src_hi"], pkt["dst_hi"]),
+            "ip_lo": np.where(sent, pkt["src_lo"], pkt["dst_lo"]),
+            "bytes_sent": np.where(sent, origlen, 0),
+            "bytes_recv": np.where(sent, 0, origlen),
+            "tx_packets": sent.astype(np.int64),
+            "rx_packets": (~sent).astype(np.int64),
+            "tcp_segs": (ip & (pkt["proto"] == 6)).astype(np.int64),
+            "udp_dgrams": (ip & (pkt["proto"] == 17)).astype(np.int64),
+            "icmp_msgs": ((pkt["v4"] & (pkt["proto"] == 1))
+                          | (pkt["v6"] & (pkt["proto"] == 58))).astype(np.int64),
+        })
+        part = frame.groupby(BUCKET_KEYS, sort=False)[COUNT_COLUMNS].sum()
+        if ip.any():
+            self.flows.add(pd.DataFrame({
+                **{key: pkt[key][ip] for key in FLOW_KEYS}, "bytes": origlen[ip], "ts_ns": chunk["ts_ns"][ip],
+            }))
+            if self.heavy_hitters is not None:
+                out = sent[ip]
+                self.heavy_hitters.add(
+                    chunk["ts_ns"][ip] / 1e9,
+                    np.where(out, pkt["dst_hi"][ip], pkt["src_hi"][ip]),
+                    np.where(out, pkt["dst_lo"][ip], pkt["src_lo"][ip]),
+                    bytes_sent=np.where(out, origlen[ip], 0), bytes_recv=np.where(out, 0, origlen[ip]),
+                )
+
+        if self._pending is not None:
+            part = pd.concat([self._pending, part]).groupby(level=BUCKET_KEYS, sort=False).sum()
+        top = int(frame["bucket"].max())
+        self._max_bucket = top if self._max_bucket is None else max(self._max_bucket, top)
+        # keep the newest interval open: the next chunk (or slightly reordered
+        # packets) may still add to it
+        closed = part.index.get_level_values("bucket") < self._max_bucket
+        self._pending = part[~closed]
+        return part[closed] if closed.any() else None
+
+    def _to_history(self, done, interfaces):
+        rows = done.reset_index()
+        rows["total"] = rows["bytes_sent"] + rows["bytes_recv"]
+        busiest = (rows.sort_values("total", ascending=False, kind="stable")
+                   .drop_duplicates(["bucket", "iface"])[["bucket", "iface", "ip_hi", "ip_lo"]])
+        sums = rows.groupby(["bucket", "iface"], sort=True)[COUNT_COLUMNS].sum().reset_index()
+        sums = sums.merge(busiest, on=["bucket", "iface"], how="left").sort_values(["bucket", "iface"])
+
+        names = np.array([info["name"] for info in interfaces], dtype=object)
+        ips = [format_ip(h, l) for h, l in zip(sums["ip_hi"], sums["ip_lo"])]
+        counts = np.column_stack([
+            sums["tcp_segs"], sums["udp_dgrams"], sums["icmp_msgs"],
+            sums["tx_packets"] + sums["rx_packets"]
+            - sums["tcp_segs"] - sums["udp_dgrams"] - sums["icmp_msgs"],
+        ])
+        out = pd.DataFrame({
+            "timestamp": _local_time(sums["bucket"].to_numpy() * self.interval_ns),
+            "interface": names[sums["iface"].to_numpy()],
+            "ip_address": ips,
+            # offline ingestion makes no network calls (no geolocation lookups or cache writes)
+            "location": "Unknown",
+            "bytes_sent": sums["bytes_sent"].to_numpy(),
+            "bytes_recv": sums["bytes_recv"].to_numpy(),
+            "interval_s": self.interval,
+            "tcp_segs": sums["tcp_segs"].to_numpy(),
+            "udp_dgrams": sums["udp_dgrams"].to_numpy(),
+            "icmp_msgs": sums["icmp_msgs"].to_numpy(),
+            "tcp_retrans": 0,
+            "proto_errors": 0,
+            "rx_packets": sums["rx_packets"].to_numpy(),
+            "tx_packets": sums["tx_packets"].to_numpy(),
+            "iface_errors": 0,
+            "iface_drops": 0,
+            "protocol": np.array(["TCP", "UDP", "ICMP", "OTHER"])[counts.argmax(axis=1)],
+        })
+        for col in ("bytes_sent", "bytes_recv"):
+            base = out["interface"].map(self._cum[col]).fillna(0).astype(np.int64)
+            out["cum_" + col] = out.groupby("interface")[col].cumsum() + base
+            self._cum[col].update(out.groupby("interface")["cum_" + col].last().to_dict())
+        self.rows += len(out)
+        return out
+
+def load_capture(path, interval=PCAP_INTERVAL, local_nets=PCAP_LOCAL_NETS, capacity=HISTORY_CAPACITY):
+    """
+    Replay a capture through the feature engine and a fresh detector into a
+    HistoryStore, for the dashboard pages. Returns (store, ingest).
+    """
+    store = HistoryStore(capacity=capacity)
+    engine = FeatureEngine()
+    detector = StreamingDetector(background=False)
+    # hourly peer snapshots: a capture usually spans far more than the live hour
+    ingest = CaptureIngest(interval, local_nets, heavy_hitters=HeavyHitterTracker(interval=3600, keep=168))
+    for df in ingest.iter_history(path):
+        df = df.join(engine.update(df))
+        result = detector.update(to_feature_matrix(df))
+        if result is not None:
+            df["anomaly"], df["anomaly_score"] = result
+        store.append(df)
+    score_backlog(store, detector)
+    return store, ingest
+
+class _FrameWriter:
+    """Appends frames to one Parquet or CSV file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+        self._first = True
+
+    def write(self, df):
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            df.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Aggregate a pcap/pcapng capture into Wi-Fi Guardian history rows.")
+    parser.add_argument("capture", help="classic pcap or pcapng file")
+    parser.add_argument("--interval", type=float, default=PCAP_INTERVAL, help="seconds per history row")
+    parser.add_argument("--local", nargs="+", default=PCAP_LOCAL_NETS, metavar="CIDR",
+                        help="local networks; traffic from them counts as sent (default: private ranges)")
+    parser.add_argument("--out", help="write history rows to this .parquet or .csv file")
+    parser.add_argument("--flows", help="write the top flows to this .parquet or .csv file")
+    parser.add_argument("--top", type=int, default=20, help="flows to print / write")
+    parser.add_argument("--score", action="store_true",
+                        help="add rolling features and anomaly labels to --out")
+    parser.add_argument("--chunk-packets", type=int, default=PCAP_CHUNK_PACKETS)
+    args = parser.parse_args(argv)
+
+    ingest = CaptureIngest(args.interval, args.local, chunk_packets=args.chunk_packets,
+                           heavy_hitters=HeavyHitterTracker(interval=3600, keep=168))
+    writer = _FrameWriter(args.out) if args.out else None
+    engine = FeatureEngine() if args.score else None
+    detector = StreamingDetector(background=False) if args.score else None
+    started = time.perf_counter()
+    anomalies = 0
+    try:
+        for df in ingest.iter_history(args.capture):
+            if args.score:
+                df = df.join(engine.update(df))
+                result = detector.update(to_feature_matrix(df))
+                df["anomaly"], df["anomaly_score"] = result if result is not None else (np.nan, np.nan)
+                anomalies += int((df["anomaly"] == -1).sum())
+            if writer is not None:
+                writer.write(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{ingest.packets:,} packets ({ingest.bytes / 2**20:,.1f} MB on the wire, {ingest.non_ip:,} non-IP) "
+        f"-> {ingest.rows:,} rows in {elapsed:.2f}s; "
+        f"parse+aggregate {ingest.packets_per_second:,.0f} packets/s"
+        + (f"; {anomalies:,} anomalous rows" if args.score else "")
+    )
+    top = ingest.flows.top(args.top)
+    if ingest.flows.evicted_flows:
+        print(f"flow table: {len(ingest.flows):,} flows kept, {ingest.flows.evicted_flows:,} small flows "
+              f"({ingest.flows.evicted_bytes / 2**20:,.1f} MB) evicted")
+    print(top.to_string(index=False))
+    for metric in ("bytes_sent", "bytes_recv"):
+        peers = ingest.heavy_hitters.query(metric, n=args.top)
+        print(f"\ntop remote peers by {metric} (each within {peers.attrs['error_bound']:,.0f} bytes):")
+        print(peers.to_string(index=False))
+    if args.flows:
+        flows = _FrameWriter(args.flows)
+        flows.write(top)
+        flows.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,95 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, PageBreak, Table
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 import pandas as pd
-from utils.anomaly import detect_anomalies
+from utils.analysis_cache import describe, anomaly_labels, live_frame
+from utils.chart_utils import traffic_timeseries, traffic_3d
+from utils.constants import REPORT_CACHE_SIZE, REPORT_TABLE_ROWS
+from utils.metrics import instrument, timed
 import streamlit as st
-import plotly.express as px
 
-def generate_pdf():
+class ReportCache:
+    """
+    LRU of finished reports and of their expensive parts (rendered chart PNGs,
+    statistics tables), keyed by the data version they were built from.
+    """
+
+    def __init__(self, max_size=REPORT_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return value
+
+    def get_or_build(self, key, build):
+        value = self.get(key)
+        return value if value is not None else self.put(key, build())
+
+report_cache = ReportCache()
+
+STATS_COLUMNS = ["bytes_sent", "bytes_recv", "cum_bytes_sent", "cum_bytes_recv"]
+NUMERIC_DESCRIBE_ROWS = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+def report_version(df):
+    """Version key for a history frame: the producer's df.attrs version, else a content hash."""
+    version = df.attrs.get("version")
+    if version is not None:
+        return version
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return ("hash", digest.hexdigest())
+
+def _chart_png(df, version, kind):
+    def build():
+        fig = traffic_timeseries(df, title="Bytes Sent Over Time", template="plotly_white") if kind == "2d" \
+            else traffic_3d(df, title="3D Traffic", template="plotly_white")
+        with timed("pdf_chart_render"):
+            return fig.to_image(format="png")
+    return report_cache.get_or_build(("chart", kind, version), build)
+
+def _table_chunks(header, rows, chunk=REPORT_TABLE_ROWS):
+    """
+    Yield Tables of at most `chunk` rows: reportlab lays out and splits one huge Table
+    very slowly, while a run of page-sized tables flows page by page.
+    """
+    for start in range(0, len(rows), chunk):
+        yield Table([header] + rows[start:start + chunk], hAlign='LEFT', repeatRows=1)
+
+@instrument("generate_pdf", rows=lambda pdf, df, *a, **k: len(df))
+def build_report(df, progress=None, version=None, peers=None, store=None):
+    """
+    Builds the PDF for a history frame and returns its bytes. Safe to call off the
+    UI thread (no st.session_state access). progress(fraction, message) is called as
+    sections complete. Reports and their charts/statistics are cached by data version.
+    peers is an optional HeavyHitterTracker.query() frame for a top-peers section;
+    store is the live HistoryStore df was read from, if any (see utils.analysis_cache).
+    """
+    progress = progress or (lambda fraction, message: None)
+    version = version if version is not None else report_version(df)
+    report_key = ("report", version, None if peers is None else peers.attrs.get("version"))
+    cached = report_cache.get(report_key)
+    if cached is not None:
+        progress(1.0, "Report loaded from cache")
+        return cached
+
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
     styles = getSampleStyleSheet()
@@ -17,14 +98,12 @@ def generate_pdf():
     elements.append(Paragraph("WiFi Network Anomaly and Statistics Report", styles["Title"]))
     elements.append(Spacer(1, 12))
 
-    df = st.session_state.history.copy()
     if df.empty:
         elements.append(Paragraph("No data available to generate report.", styles["BodyText"]))
         doc.build(elements)
-        st.session_state.pdf_report = buffer.getvalue()
-        return
+        return buffer.getvalue()
 
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    progress(0.05, "Summarising statistics")
     total_points = len(df)
     max_sent = int(df["bytes_sent"].max())
     max_recv = int(df["bytes_recv"].max())
@@ -37,16 +116,19 @@ def generate_pdf():
         styles["BodyText"]
     ))
 
-    desc_stats = df[["bytes_sent", "bytes_recv", "cum_bytes_sent", "cum_bytes_recv"]].describe().reset_index()
-    stats_data = [[str(x) for x in row] for row in desc_stats.values]
+    def stats_table():
+        # cut from the describe table the statistics page shares (utils.analysis_cache)
+        desc_stats = describe(df, store).loc[NUMERIC_DESCRIBE_ROWS, STATS_COLUMNS].reset_index()
+        return [desc_stats.columns.tolist()] + [[str(x) for x in row] for row in desc_stats.values]
+    stats_data = report_cache.get_or_build(("stats", version), stats_table)
     elements.append(Spacer(1, 12))
     elements.append(Paragraph("Statistical Summary", styles["Heading2"]))
-    elements.append(Table([desc_stats.columns.tolist()] + stats_data, hAlign='LEFT'))
+    elements.append(Table(stats_data, hAlign='LEFT'))
     elements.append(PageBreak())
 
-    anomaly_df = detect_anomalies(df[["bytes_sent", "bytes_recv"]])
+    progress(0.2, "Collecting anomalies")
+    anomaly_df = anomaly_labels(df)
     if anomaly_df is not None:
-        df["anomaly"] = anomaly_df["anomaly"]
         elements.append(Paragraph("Detected Anomalies", styles["Heading2"]))
         num_anomalies = int((anomaly_df["anomaly"] == -1).sum())
         num_normals = int((anomaly_df["anomaly"] == 1).sum())
@@ -60,41 +142,103 @@ def generate_pdf():
         anomaly_rows = anomaly_df[anomaly_df["anomaly"] == -1].copy()
         if not anomaly_rows.empty:
             anomaly_rows = anomaly_rows.reset_index()
+            anomaly_rows = anomaly_rows.rename(columns={anomaly_rows.columns[0]: "index"})
             table_cols = ["index", "bytes_sent", "bytes_recv", "anomaly"]
-            table_data = [table_cols] + anomaly_rows[table_cols].astype(str).values.tolist()
             elements.append(Spacer(1, 6))
-            elements.append(Table(table_data, hAlign='LEFT'))
+            elements.extend(_table_chunks(table_cols, anomaly_rows[table_cols].astype(str).values.tolist()))
         else:
             elements.append(Paragraph("No anomalies detected.", styles["BodyText"]))
         elements.append(PageBreak())
 
-    # create charts and embed into PDF
+    if peers is not None and not peers.empty:
+        elements.append(Paragraph("Top Remote Peers", styles["Heading2"]))
+        elements.append(Paragraph(
+            f"Remote peers by connected sockets over the last hour (summed over socket-table reads, "
+            f"about once a second), counted in fixed memory; each value is within "
+            f"{peers.attrs.get('error_bound', 0):,.0f} of the true sum. The socket tables carry no "
+            f"byte counters, so per-peer bytes are only available from packet captures.",
+            styles["BodyText"]
+        ))
+        elements.append(Spacer(1, 6))
+        rows = [[p, f"{c:,.0f}", f"{l:,.0f}"]
+                for p, c, l in zip(peers["peer"], peers["estimate"], peers["lower"])]
+        elements.extend(_table_chunks(["peer", "connections (estimate)", "connections (at least)"], rows))
+        elements.append(PageBreak())
+
+    # create charts and embed into PDF (downsampled, and cached per data version)
+    progress(0.4, "Rendering 2D chart")
     try:
-        fig2d = px.scatter(
-            df, x="timestamp", y="bytes_sent", color="interface",
-            title="Bytes Sent Over Time", template="plotly_white"
-        )
-        img1 = fig2d.to_image(format="png")
-        img_io1 = BytesIO(img1)
+        img_io1 = BytesIO(_chart_png(df, version, "2d"))
         elements.append(Paragraph("Bytes Sent Over Time", styles["Heading2"]))
         elements.append(Image(img_io1, width=6 * inch, height=4 * inch))
         elements.append(Spacer(1, 12))
     except Exception:
         elements.append(Paragraph("Could not render 2D chart.", styles["BodyText"]))
 
+    progress(0.65, "Rendering 3D chart")
     try:
-        df["timestamp_float"] = df["timestamp"].apply(lambda x: x.timestamp())
-        fig3d = px.scatter_3d(
-            df, x="bytes_sent", y="bytes_recv", z="timestamp_float", color="interface",
-            title="3D Traffic", template="plotly_white"
-        )
-        img2 = fig3d.to_image(format="png")
-        img_io2 = BytesIO(img2)
+        img_io2 = BytesIO(_chart_png(df, version, "3d"))
         elements.append(Paragraph("3D Network Traffic", styles["Heading2"]))
         elements.append(Image(img_io2, width=6 * inch, height=4 * inch))
     except Exception:
         elements.append(Paragraph("Could not render 3D chart.", styles["BodyText"]))
 
+    progress(0.85, "Laying out pages")
     doc.build(elements)
-    st.session_state.pdf_report = buffer.getvalue()
+    progress(1.0, "Report ready")
+    return report_cache.put(report_key, buffer.getvalue())
+
+class ReportJob:
+    """Runs build_report on a background thread and exposes its progress/result."""
+
+    def __init__(self, df, peers=None, store=None):
+        self.version = report_version(df)
+        self.peers = peers
+        self.store = store
+        self.progress = 0.0
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+        self._thread = threading.Thread(target=self._run, args=(df,), daemon=True, name="pdf-report")
+        self._thread.start()
+
+    def _update(self, fraction, message):
+        self.progress = fraction
+        self.message = message
+
+    def _run(self, df):
+        try:
+            self.result = build_report(df, progress=self._update, version=self.version, peers=self.peers,
+                                       store=self.store)
+        except Exception as exc:
+            self.error = repr(exc)
+        finally:
+            self.elapsed = time.monotonic() - self.started
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+def _session_peers(history):
+    """Top-peers frame for the report when the session shows this machine's collector."""
+    from utils.collector import get_collector
+    collector = get_collector()
+    if history is not collector.store:
+        return None
+    return collector.heavy_hitters.query("connections", n=REPORT_TABLE_ROWS, since=time.time() - 3600)
+
+def start_report_job():
+    """Snapshot the session's history and start building its report in the background."""
+    history = st.session_state.history
+    df = live_frame(history)
+    st.session_state.report_job = ReportJob(df, peers=_session_peers(history), store=history)
+    return st.session_state.report_job
+
+def generate_pdf():
+    """Synchronous report for the session's history (kept for scripts/callers that wait)."""
+    history = st.session_state.history
+    df = live_frame(history)
+    st.session_state.pdf_report = build_report(df, peers=_session_peers(history), store=history)
     return st.session_state.pdf_report
@@ -0,0 +1,137 @@
+import os
+from utils.constants import PROCFS_ROOT
+
+# per-interval columns added to every sample row
+PROTOCOL_COLUMNS = [
+    "tcp_segs", "udp_dgrams", "icmp_msgs", "tcp_retrans", "proto_errors",
+    "rx_packets", "tx_packets", "iface_errors", "iface_drops",
+]
+# (file, section, field) -> system-wide counter name
+SYSTEM_COUNTERS = {
+    "tcp_segs": [("snmp", "Tcp", "InSegs"), ("snmp", "Tcp", "OutSegs")],
+    "udp_dgrams": [("snmp", "Udp", "InDatagrams"), ("snmp", "Udp", "OutDatagrams")],
+    "icmp_msgs": [("snmp", "Icmp", "InMsgs"), ("snmp", "Icmp", "OutMsgs")],
+    # RetransSegs already includes retransmits after a timeout (TcpExt.TCPTimeouts)
+    "tcp_retrans": [("snmp", "Tcp", "RetransSegs")],
+    "proto_errors": [
+        ("snmp", "Ip", "InHdrErrors"), ("snmp", "Tcp", "InErrs"),
+        ("snmp", "Udp", "InErrors"), ("snmp", "Icmp", "InErrors"),
+    ],
+}
+PROTOCOL_LABELS = {"tcp_segs": "TCP", "udp_dgrams": "UDP", "icmp_msgs": "ICMP"}
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def parse_kv_table(raw, wanted):
+    """
+    Parse /proc/net/snmp or /proc/net/netstat ("Section: names" line followed by a
+    "Section: values" line). Only sections in `wanted` are split, the rest are skipped.
+    """
+    out = {}
+    lines = raw.split(b"\n")
+    for header, values in zip(lines[::2], lines[1::2]):
+        section, _, names = header.partition(b":")
+        section = section.decode()
+        if section not in wanted:
+            continue
+        out[section] = dict(zip(names.decode().split(), (int(v) for v in values.partition(b":")[2].split())))
+    return out
+
+def parse_net_dev(raw):
+    """
+    /proc/net/dev -> {iface: (rx_packets, tx_packets, errors, drops)}.
+    Columns after "iface:" are rx bytes packets errs drop ... then tx bytes packets errs drop ...
+    """
+    out = {}
+    for line in raw.split(b"\n")[2:]:
+        name, sep, rest = line.partition(b":")
+        if not sep:
+            continue
+        f = rest.split()
+        out[name.strip().decode()] = (int(f[1]), int(f[9]), int(f[2]) + int(f[10]), int(f[3]) + int(f[11]))
+    return out
+
+def read_snapshot(procfs_root=PROCFS_ROOT):
+    """
+    One read of snmp and dev. Returns (system_counters, per_iface) or None when
+    procfs isn't available (non-Linux).
+    """
+    snmp = _read(os.path.join(procfs_root, "net", "snmp"))
+    dev = _read(os.path.join(procfs_root, "net", "dev"))
+    if snmp is None or dev is None:
+        return None
+    tables = {"snmp": parse_kv_table(snmp, {"Ip", "Tcp", "Udp", "Icmp"})}
+    system = {
+        name: sum(tables[src].get(section, {}).get(field, 0) for src, section, field in fields)
+        for name, fields in SYSTEM_COUNTERS.items()
+    }
+    return system, parse_net_dev(dev)
+
+class ProtocolSampler:
+    """
+    Per-interval protocol counters from procfs.
+
+    TCP/UDP/ICMP counters in /proc/net/snmp are host-wide, so each interval's deltas
+    are attributed to interfaces in proportion to their share of packets from
+    /proc/net/dev; per-interface sums therefore add up to the host totals. Packet,
+    error and drop counts are exact per interface. Holds the snapshot each
+    interface was last sampled at, like prev_counters does for byte counters, so
+    interfaces sampled on different schedules each get their own interval.
+    """
+
+    def __init__(self, procfs_root=PROCFS_ROOT):
+        self.procfs_root = procfs_root
+        self._prev = {}
+
+    def sample(self, ifaces):
+        """Returns {iface: {column: delta, ..., "protocol": dominant label}}."""
+        snapshot = read_snapshot(self.procfs_root)
+        if snapshot is None:
+            return {iface: dict.fromkeys(PROTOCOL_COLUMNS, 0) | {"protocol": "N/A"} for iface in ifaces}
+        deltas = {}  # id(previous snapshot) -> deltas since it, shared by ifaces sampled together
+        out = {}
+        for iface in ifaces:
+            prev = self._prev.get(iface)
+            self._prev[iface] = snapshot
+            if prev is None:
+                # first reading: no interval yet, mirror the byte counters and report zeros
+                out[iface] = dict.fromkeys(PROTOCOL_COLUMNS, 0) | {"protocol": "IDLE"}
+                continue
+            if id(prev) not in deltas:
+                deltas[id(prev)] = _deltas(prev, snapshot)
+            sys_delta, dev_delta, total_packets = deltas[id(prev)]
+            rx, tx, errors, drops = dev_delta.get(iface, (0, 0, 0, 0))
+            share = (rx + tx) / total_packets if total_packets else 0.0
+            row = {name: int(round(value * share)) for name, value in sys_delta.items()}
+            row.update(rx_packets=rx, tx_packets=tx, iface_errors=errors, iface_drops=drops)
+            counts = {label: row[col] for col, label in PROTOCOL_LABELS.items()}
+            row["protocol"] = max(counts, key=counts.get) if any(counts.values()) else "IDLE"
+            out[iface] = row
+        return out
+
+def _deltas(prev, snapshot):
+    """(system deltas, per-interface deltas, total packets) between two snapshots."""
+    (prev_system, prev_dev), (system, dev) = prev, snapshot
+    sys_delta = {k: max(0, system[k] - prev_system.get(k, 0)) for k in system}
+    dev_delta = {}
+    for iface, counters in dev.items():
+        before = prev_dev.get(iface, counters)
+        dev_delta[iface] = [max(0, now - old) for now, old in zip(counters, before)]
+    total_packets = sum(d[0] + d[1] for d in dev_delta.values())
+    return sys_delta, dev_delta, total_packets
+
+def protocol_totals(rows):
+    """
+    Packet counts per protocol summed over a frame of samples, with "OTHER" for
+    packets not accounted to TCP/UDP/ICMP. Returns {label: count}.
+    """
+    totals = {label: int(rows[col].sum()) for col, label in PROTOCOL_LABELS.items() if col in rows}
+    if "rx_packets" in rows and "tx_packets" in rows:
+        packets = int(rows["rx_packets"].sum() + rows["tx_packets"].sum())
+        totals["OTHER"] = max(0, packets - sum(totals.values()))
+    return {label: count for label, count in totals.items() if count > 0}
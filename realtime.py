@@ -1,19 +1,34 @@
+import time
 import streamlit as st
-import pandas as pd
+import numpy as np
 from streamlit_autorefresh import st_autorefresh
-import plotly.express as px
 
-from utils.network_utils import get_multi_iface_stats
-from utils.anomaly import detect_anomalies
-from utils.ui_utils import show_quote
+from utils.collector import get_collector
+from utils.alerts import get_alert_pipeline
+from utils.protocol_stats import PROTOCOL_COLUMNS, protocol_totals
+from utils.ui_utils import show_quote, selected_source
+from utils.analysis_cache import grouped
+from utils.scheduler import BURST
 from utils.constants import PLOTLY_CONFIG
+from utils.metrics import instrument
 import psutil
 
+@instrument("page.real_time_monitor")
 def real_time_monitor():
     st.title("📡 Real-Time WiFi Monitor")
 
-    # discover interfaces
-    all_ifaces = list(psutil.net_io_counters(pernic=True).keys())
+    # sampling and detection happen once per process in the background collector (or
+    # on the aggregator for remote hosts); this page only reads the shared store
+    collector = get_collector()
+    history, detector = selected_source()
+    st.session_state.history = history
+    remote = history is not collector.store
+
+    # discover interfaces (for a remote host: the ones its agent has reported)
+    if remote:
+        all_ifaces = history.categories("interface")
+    else:
+        all_ifaces = list(psutil.net_io_counters(pernic=True).keys())
 
     # heuristics to pick likely wireless interfaces across platforms
     default_ifaces = [
@@ -33,75 +48,129 @@ def real_time_monitor():
         show_quote()
         return
 
-    # refresh every 5 seconds
-    st_autorefresh(interval=5000, key="auto_refresh")
-
-    current_df = get_multi_iface_stats(selected_ifaces)
-
-    # append only new rows (current_df contains per-interval deltas)
-    if not current_df.empty:
-        # ensure history exists
-        if "history" not in st.session_state:
-            st.session_state.history = pd.DataFrame(
-                columns=[
-                    "timestamp", "interface", "ip_address", "location",
-                    "bytes_sent", "bytes_recv", "cum_bytes_sent", "cum_bytes_recv", "protocol"
-                ]
-            )
-        st.session_state.history = pd.concat([st.session_state.history, current_df], ignore_index=True)
-        # keep only the last 500 records to limit memory
-        if len(st.session_state.history) > 500:
-            st.session_state.history = st.session_state.history.iloc[-500:].reset_index(drop=True)
+    # repaint every 5 seconds, every second while a selected interface bursts (the
+    # sampling cadence itself is set per interface by the collector's scheduler)
+    rates = {} if remote else collector.scheduler.rates()
+    bursting = any(rates.get(iface, {}).get("state") == BURST for iface in selected_ifaces)
+    st_autorefresh(interval=1000 if bursting else 5000, key="auto_refresh")
 
     st.subheader("Recent Network Data (per-interval deltas)")
-    if st.session_state.history.empty:
-        st.info("Waiting for first interval data. Please keep the page open; the first interval records deltas as 0.")
+    with history.lock:
+        codes = [history.code_of("interface", iface) for iface in selected_ifaces]
+        selected = np.flatnonzero(np.isin(history.view("interface"), [c for c in codes if c is not None]))
+        recent = history.to_frame(positions=selected[-50:]) if len(selected) else None
+    if recent is None:
+        st.info("Waiting for first interval data. The collector records the first interval's deltas as 0.")
         return
 
-    st.session_state.history["timestamp"] = pd.to_datetime(st.session_state.history["timestamp"])
-    st.dataframe(st.session_state.history.tail(50))
-
-    # Anomaly detection on the per-interval deltas
-    # pass only numeric columns required by detector
-    try:
-        detector_input = st.session_state.history[["bytes_sent", "bytes_recv"]]
-    except Exception:
-        detector_input = None
-
-    anomaly_df = detect_anomalies(detector_input)
+    st.dataframe(recent)
+    sampling = [
+        f"{iface}: {r['state']}, {r['samples_per_s']:.1f} samples/s (target every {r['interval_s']:g}s)"
+        for iface, r in ((iface, rates.get(iface)) for iface in selected_ifaces) if r and r["samples_per_s"]
+    ]
+    if sampling:
+        st.caption("Adaptive sampling · " + " · ".join(sampling))
 
-    # if we got anomalies, show them (aligning the result with history)
-    if anomaly_df is not None:
+    if detector.fitted:
         st.subheader("Detected Anomalies and Explanation")
-        anomalies = anomaly_df[anomaly_df["anomaly"] == -1]
-        st.write(f"Anomalies detected: {len(anomalies)}")
-        if not anomalies.empty:
-            # join anomaly flags back to recent history rows for display (index alignment)
-            recent = st.session_state.history.tail(200).reset_index(drop=True).copy()
-            detector_slice = detect_anomalies(recent[["bytes_sent", "bytes_recv"]])
-            if detector_slice is not None:
-                recent["anomaly"] = detector_slice["anomaly"].values
-                st.dataframe(recent[recent["anomaly"] == -1])
-            else:
-                st.dataframe(anomalies)
-            st.warning("Unusual traffic patterns detected. Investigate sources or protocols involved.")
-        else:
-            st.success("No anomalies in recent data.")
-
-    # protocol distribution across the recorded history
-    if "protocol" in st.session_state.history.columns:
-        protocol_counts = st.session_state.history["protocol"].value_counts()
+        anomaly_pos = selected[history.view("anomaly")[selected] == -1]
+        st.write(f"Anomalies detected: {len(anomaly_pos)}")
+        if len(anomaly_pos):
+            st.dataframe(history.to_frame(positions=anomaly_pos[-200:]))
+        # one warning per open incident (utils.alerts), not per anomalous row or rerun
+        alerts = get_alert_pipeline()
+        incidents = [] if alerts is None else [
+            i for i in alerts.open_incidents(st.session_state.host if remote else alerts.local_host)
+            if i["interface"] in selected_ifaces
+        ]
+        for incident in incidents:
+            st.warning(
+                f"Open incident on {incident['interface']} since {incident['opened']}: "
+                f"{incident['events']} anomalous sample(s), last at {incident['last_seen']}. "
+                "Investigate sources or protocols involved."
+            )
+        if not incidents:
+            st.success("No open incidents." if len(anomaly_pos) else "No anomalies in recent data.")
+        if alerts is not None:
+            summary = alerts.summary()
+            st.caption(
+                f"Alerts: {summary['incidents']} incident(s) from {summary['events']} anomalous sample(s)"
+                + "".join(f" · {name}: {w['delivered']} delivered, {w['pending']} queued"
+                          + (f", {w['dropped']} dropped" if w["dropped"] else "")
+                          + (f", {w['failed']} failed ({w['last_error']})" if w["failed"] else "")
+                          for name, w in summary["sinks"].items())
+            )
+        timings = detector.timings
+        st.caption(
+            f"Detector: {timings['fits']} fit(s), last fit {timings['last_fit_seconds'] * 1000:.1f} ms "
+            f"on {timings['last_fit_rows']} rows; last score {timings['last_score_seconds'] * 1000:.2f} ms "
+            f"for {timings['last_score_rows']} new rows"
+            + (" (retraining in background)" if detector.retraining else "")
+            + (f" · host {st.session_state.host}" if remote else
+               f" · collector base interval {collector.interval:g}s, "
+               f"last sample {collector.last_sample_seconds * 1000:.1f} ms")
+        )
+        if detector.fit_error:
+            st.warning(f"Last detector refit failed, previous model still serving: {detector.fit_error}")
+        engine = detector.engine
+        per_detector = [
+            f"{name} {t['last_score_seconds'] * 1000:.2f} ms"
+            + (f" (failing: {engine.errors[name]})" if name in engine.errors else "")
+            for name, t in engine.timings.items() if t["score_calls"]
+        ]
+        if per_detector:
+            escalated = engine.escalated_rows / engine.scored_rows if engine.scored_rows else 0.0
+            st.caption("Detectors (last score) · " + " · ".join(per_detector)
+                       + f" · {escalated:.0%} of rows passed the cheap pre-filter")
+        model = None if remote else collector.model_info
+        if model and "error" in model:
+            st.caption(f"Saved model not used ({model['error']}); fitted from live samples instead.")
+        elif model:
+            restored = ""
+            if "load_seconds" in model:
+                restored = f", restored in {model['load_seconds'] * 1000:.0f} ms"
+            st.caption(f"Model artifact saved {model['saved_at']}, "
+                       f"trained on {model['training']['rows']} rows{restored}")
+
+    # plotly is imported on first use so the page's first paint (tables, detector
+    # status) doesn't wait for it
+    import plotly.express as px
+
+    # protocol distribution: packets per protocol from the kernel counters (utils.protocol_stats)
+    # per-interface sums are kept incrementally and shared across sessions (utils.analysis_cache)
+    per_iface = grouped(history, ["interface"], PROTOCOL_COLUMNS, "sum")
+    protocol_counts = protocol_totals(per_iface[per_iface.index.isin(selected_ifaces)])
+    if protocol_counts:
         fig_protocol = px.pie(
-            values=protocol_counts.values,
-            names=protocol_counts.index,
-            title="Protocol Distribution in Network Traffic"
+            values=list(protocol_counts.values()),
+            names=list(protocol_counts.keys()),
+            title="Protocol Distribution in Network Traffic (packets)"
         )
         st.plotly_chart(fig_protocol, config=PLOTLY_CONFIG, use_container_width=True)
 
-    # show top IPs by cumulative bytes (use cumulative counters for meaningful totals)
+    # top remote peers from the collector's fixed-memory sketches (utils.heavy_hitters)
+    peers = None if remote else collector.heavy_hitters.query("connections", n=10, since=time.time() - 3600)
+    if peers is not None and not peers.empty:
+        peers = peers.assign(zero=0.0, uncertainty=peers["estimate"] - peers["lower"])
+        fig_peers = px.bar(
+            peers, x="peer", y="estimate", error_y="zero", error_y_minus="uncertainty",
+            title="Top 10 Remote Peers by Connections (last hour)",
+            labels={"peer": "Remote Peer", "estimate": "Connected Sockets (summed over reads)"}
+        )
+        st.plotly_chart(fig_peers, config=PLOTLY_CONFIG, use_container_width=True)
+        st.caption(
+            f"Peers are ranked by connected sockets in the kernel socket tables, read about once a "
+            f"second; the tables carry no byte counters, so per-peer bytes come only from packet "
+            f"captures. Each bar is within {peers.attrs['error_bound']:,.0f} of the true sum (error "
+            f"bars show the guaranteed minimum)."
+        )
+        return
+
+    # no peer data (remote host or no connected sockets): top local addresses instead
+    per_ip = grouped(history, ["interface", "ip_address"], ["cum_bytes_sent", "cum_bytes_recv"], "max")
     ip_group = (
-        st.session_state.history.groupby("ip_address")[["cum_bytes_sent", "cum_bytes_recv"]]
-        .max().sort_values(by="cum_bytes_sent", ascending=False).head(10)
+        per_ip[per_ip.index.get_level_values("interface").isin(selected_ifaces)]
+        .groupby(level="ip_address").max().sort_values(by="cum_bytes_sent", ascending=False).head(10)
     )
     if not ip_group.empty:
         fig_ips = px.bar(
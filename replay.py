@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from utils.synthetic import generate_history, FakeCounters
+from utils.network_utils import sample_interfaces
+from utils.protocol_stats import ProtocolSampler, PROTOCOL_COLUMNS
+from utils.features import FeatureEngine
+from utils.anomaly import StreamingDetector, to_feature_matrix
+from utils.alerts import AlertPipeline
+from utils.constants import ALERT_WINDOW
+
+# recorded per-row values laid over the replayed samples: the counters only carry bytes
+RECORDED_COLUMNS = ["ip_address", "location", "protocol", *PROTOCOL_COLUMNS]
+
+# named detector configurations compared by default; each is StreamingDetector keyword
+# arguments plus an optional "features" dict of FeatureEngine ones and "alert_window"
+DEFAULT_CONFIGS = {
+    "live": {},
+    "cheap_only": {"detectors": ["robust_z", "ewma"]},
+    "half_space_trees": {"detectors": ["robust_z", "ewma", "half_space_trees"]},
+    "isolation_forest": {"detectors": ["isolation_forest"], "prefilter_ratio": 0.0},
+}
+
+def replay_frame(df):
+    """
+    A stored history frame in the shape FakeCounters replays: categorical interface
+    and ip_address, cumulative byte counters (rebuilt from the deltas if missing) and
+    packet counters, sorted by time.
+    """
+    df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    for col in ("interface", "ip_address"):
+        df[col] = (df[col] if col in df else pd.Series("N/A", index=df.index)).astype(str).astype("category")
+    for col in ("bytes_sent", "bytes_recv"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(np.int64)
+        if f"cum_{col}" not in df:
+            df[f"cum_{col}"] = df.groupby("interface", observed=True)[col].cumsum()
+    for col in ("tx_packets", "rx_packets"):
+        if col not in df:
+            df[col] = 0
+    return df
+
+def load_history(path):
+    """History rows from a CSV or Parquet file (or a utils.timeseries_store directory)."""
+    df = pd.read_csv(path) if path.endswith(".csv") else pd.read_parquet(path)
+    return replay_frame(df)
+
+def incidents_from_labels(df, column="is_burst"):
+    """Incidents from a boolean label column: each run of labelled samples on one interface."""
+    if column not in df:
+        return []
+    ts = df["timestamp"].to_numpy()
+    labels = df[column].fillna(False).to_numpy(dtype=bool)
+    out = []
+    for iface, pos in df.groupby("interface", observed=True).indices.items():
+        pos = pos[np.argsort(ts[pos], kind="stable")]
+        edges = np.diff(np.concatenate([[0], labels[pos].astype(np.int8), [0]]))
+        for first, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            out.append({"interface": str(iface), "start": pd.Timestamp(ts[pos[first]]),
+                        "end": pd.Timestamp(ts[pos[end - 1]])})
+    return out
+
+def load_incidents(path):
+    """Incidents from a CSV with start and end timestamps and an optional interface column."""
+    df = pd.read_csv(path)
+    return [
+        {"interface": None if pd.isna(row.get("interface")) else str(row["interface"]),
+         "start": pd.Timestamp(row["start"]), "end": pd.Timestamp(row["end"])}
+        for row in df.to_dict("records")
+    ]
+
+def replay(df, config=None, speed=None, log=None):
+    """
+    Feed a history frame through the collector's pipeline, tick by tick: cumulative
+    counters (utils.synthetic.FakeCounters) -> sample_interfaces deltas at the
+    recorded times -> FeatureEngine -> StreamingDetector -> alert decision (a -1
+    label, coalesced into incidents as utils.alerts would, without sinks). speed=N
+    paces ticks at N x real time; None runs as fast as possible.
+    Refits run inline (background=False unless the config says otherwise), so the
+    timing includes them and results are reproducible.
+
+    Returns per-row arrays ("flagged", "scored", "score", aligned with df) and the
+    timing: "seconds" spent in the pipeline, "wall_seconds" including pacing, "lag"
+    (the most a tick started behind schedule), detector fit and alert incident counts.
+    """
+    config = dict(config or {})
+    features = FeatureEngine(**config.pop("features", {}))
+    alerts = AlertPipeline([], window=config.pop("alert_window", ALERT_WINDOW))
+    config.setdefault("background", False)
+    detector = StreamingDetector(**config)
+    counters = FakeCounters(df)
+    protocols = ProtocolSampler(procfs_root=os.devnull)
+    recorded = {col: df[col].to_numpy() for col in RECORDED_COLUMNS if col in df}
+    names = df["interface"].astype(str).to_numpy()
+    times = counters.times
+    origin = times[0] if len(times) else None
+
+    flagged = np.zeros(len(df), dtype=bool)
+    scored = np.zeros(len(df), dtype=bool)
+    score = np.full(len(df), np.nan)
+    prev = {}
+    busy = lag = 0.0
+    started = time.perf_counter()
+    for tick in range(counters.ticks):
+        elapsed = (times[tick] - origin) / np.timedelta64(1, "s")
+        if speed:
+            behind = time.perf_counter() - started - elapsed / speed
+            if behind < 0:
+                time.sleep(-behind)
+            lag = max(lag, behind)
+        tick_start = time.perf_counter()
+        positions = counters.tick_rows(tick)
+        rows = sample_interfaces(counters.ifaces, prev, net_io=counters.net_io_counters(), addrs={},
+                                 protocol_sampler=protocols, now=pd.Timestamp(times[tick]).to_pydatetime(),
+                                 mono=elapsed)
+        if rows:
+            sample = pd.DataFrame(rows)
+            at = pd.Series(positions, index=names[positions]).loc[sample["interface"]].to_numpy()
+            for col, values in recorded.items():
+                sample[col] = values[at]
+            sample = sample.join(features.update(sample))
+            result = detector.update(to_feature_matrix(sample))
+            if result is not None:
+                labels, scores = result
+                flagged[at] = labels == -1
+                scored[at] = True
+                score[at] = scores
+                sample["anomaly"], sample["anomaly_score"] = labels, scores
+                alerts.write(sample)
+        busy += time.perf_counter() - tick_start
+        if log and tick and tick % 10_000 == 0:
+            log(f"  {tick:,}/{counters.ticks:,} ticks")
+    return {
+        "flagged": flagged, "scored": scored, "score": score,
+        "seconds": busy, "wall_seconds": time.perf_counter() - started, "lag": lag,
+        "fits": detector.timings["fits"],
+        "alert_incidents": alerts.summary()["incidents"],
+        "span_seconds": (times[-1] - origin) / np.timedelta64(1, "s") if len(times) else 0.0,
+    }
+
+def evaluate(df, flagged, scored, incidents, grace=0.0):
+    """
+    Detection quality of per-row alert decisions against labelled incidents.
+
+    An incident counts as detected when one of its interface's samples (any
+    interface's, if it names none) between its start and `grace` seconds after its
+    end is flagged. The delay is counted from the start, in that interface's samples
+    and in seconds. Incidents that ended before the detector started scoring are
+    left out. The false-positive rate is flagged / scored over samples outside every
+    incident window.
+    """
+    ts = df["timestamp"].to_numpy()
+    order = np.argsort(ts, kind="stable")
+    by_iface = {str(iface): pos[np.argsort(ts[pos], kind="stable")]
+                for iface, pos in df.groupby("interface", observed=True).indices.items()}
+    sorted_ts = {iface: ts[pos] for iface, pos in by_iface.items()}
+    sorted_ts[None] = ts[order]
+    grace = np.timedelta64(int(grace * 1e9), "ns")
+    in_incident = np.zeros(len(df), dtype=bool)
+    delays, delay_seconds = [], []
+    evaluated = 0
+    for incident in incidents:
+        iface = incident["interface"] or None
+        candidates = by_iface.get(iface, order[:0]) if iface else order
+        t = sorted_ts.get(iface, ts[:0])
+        lo = np.searchsorted(t, np.datetime64(incident["start"]), "left")
+        hi = np.searchsorted(t, np.datetime64(incident["end"]) + grace, "right")
+        window = candidates[lo:hi]
+        in_incident[window] = True
+        if not scored[window].any():
+            continue
+        evaluated += 1
+        hit = np.flatnonzero(flagged[window])
+        if len(hit):
+            delays.append(len(np.unique(t[lo:lo + hit[0]])))
+            delay_seconds.append((t[lo + hit[0]] - np.datetime64(incident["start"])) / np.timedelta64(1, "s"))
+
+    normal = scored & ~in_incident
+    false_positives = int((flagged & normal).sum())
+    return {
+        "incidents": evaluated,
+        "detected": len(delays),
+        "recall": len(delays) / evaluated if evaluated else None,
+        "delay_samples_mean": float(np.mean(delays)) if delays else None,
+        "delay_samples_median": float(np.median(delays)) if delays else None,
+        "delay_seconds_mean": float(np.mean(delay_seconds)) if delays else None,
+        "delay_seconds_p95": float(np.percentile(delay_seconds, 95)) if delays else None,
+        "false_positives": false_positives,
+        "fpr": false_positives / int(normal.sum()) if normal.any() else None,
+    }
+
+def backtest(df, config=None, incidents=(), speed=None, grace=0.0, name=None):
+    """replay() one configuration and evaluate() it; returns one summary row."""
+    run = replay(df, config, speed=speed)
+    rows = int(run["scored"].sum())
+    return {
+        "config": name,
+        "rows": len(df),
+        "scored": rows,
+        "seconds": run["seconds"],
+        "samples_per_s": len(df) / run["seconds"] if run["seconds"] else float("inf"),
+        "speedup": run["span_seconds"] / run["wall_seconds"] if run["wall_seconds"] else float("inf"),
+        "lag_seconds": run["lag"],
+        "fits": run["fits"],
+        "flagged": int(run["flagged"].sum()),
+        "alert_incidents": run["alert_incidents"],
+        **evaluate(df, run["flagged"], run["scored"], incidents, grace),
+    }
+
+_history = None
+_incidents = None
+
+def _init_worker(history, incidents):
+    global _history, _incidents
+    _history, _incidents = history, incidents
+
+def _backtest_one(args):
+    name, config, speed, grace = args
+    return backtest(_history, config, _incidents, speed=speed, grace=grace, name=name)
+
+def run_configs(df, configs=DEFAULT_CONFIGS, incidents=None, speed=None, grace=0.0, jobs=None, log=print):
+    """
+    Backtest every named configuration on df, one per worker process (the frame is
+    sent to each worker once). incidents defaults to the frame's is_burst labels.
+    Returns a DataFrame with one row per configuration.
+    """
+    incidents = incidents_from_labels(df) if incidents is None else incidents
+    jobs = min(jobs or os.cpu_count() or 1, len(configs))
+    tasks = [(name, config, speed, grace) for name, config in configs.items()]
+    log(f"replaying {len(df):,} rows, {len(incidents):,} labelled incidents, "
+        f"{len(configs)} configuration(s) on {jobs} process(es)")
+    if jobs == 1:
+        _init_worker(df, incidents)
+        results = [_backtest_one(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(df, incidents)) as pool:
+            results = list(pool.map(_backtest_one, tasks))
+    return pd.DataFrame(results).set_index("config")
+
+def _parse_configs(values):
+    """NAME=JSON arguments, or paths to JSON files mapping names to configurations."""
+    configs = {}
+    for value in values:
+        name, sep, spec = value.partition("=")
+        if sep:
+            configs[name] = json.loads(spec)
+        else:
+            with open(value) as f:
+                configs.update(json.load(f))
+    return configs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay stored or synthetic history through the detector pipeline "
+                    "and score configurations.")
+    parser.add_argument("input", nargs="?", help="CSV/Parquet history (default: synthetic traffic)")
+    parser.add_argument("--rows", type=int, default=20_000, help="synthetic rows")
+    parser.add_argument("--ifaces", type=int, default=4, help="synthetic interfaces")
+    parser.add_argument("--interval", type=float, default=5.0, help="synthetic seconds between samples")
+    parser.add_argument("--burst-rate", type=float, default=0.01, help="synthetic burst starts per row")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--incidents", help="CSV of start,end[,interface] (default: the is_burst column)")
+    parser.add_argument("--config", action="append", default=[], metavar="NAME=JSON|FILE",
+                        help="detector configuration, e.g. 'ewma={\"detectors\": [\"ewma\"]}' (repeatable)")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="replay at N x real time (default: max speed)")
+    parser.add_argument("--grace", type=float, default=0.0,
+                        help="seconds after an incident a detection still counts")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="worker processes (default: one per configuration)")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args(argv)
+    try:
+        df = load_history(args.input) if args.input else generate_history(
+            args.rows, ifaces=args.ifaces, interval=args.interval, seed=args.seed, burst_rate=args.burst_rate)
+        incidents = load_incidents(args.incidents) if args.incidents else None
+        configs = _parse_configs(args.config) if args.config else DEFAULT_CONFIGS
+        results = run_configs(df, configs, incidents, speed=args.speed, grace=args.grace, jobs=args.jobs)
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    display = ("display.width", 200, "display.max_columns", None, "display.float_format", "{:,.4g}".format)
+    with pd.option_context(*display):
+        print(results)
+    if args.out:
+        results.reset_index().to_json(args.out, orient="records", indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
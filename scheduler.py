@@ -0,0 +1,123 @@
+import math
+import threading
+
+from utils.constants import (
+    COLLECTOR_INTERVAL, SAMPLE_MIN_INTERVAL, SAMPLE_IDLE_INTERVAL, SAMPLE_IDLE_RATE,
+    SAMPLE_BURST_Z, SAMPLE_BURST_CV,
+)
+
+BURST, ACTIVE, IDLE = "burst", "active", "idle"
+
+class _IfaceState:
+    __slots__ = ("interval", "next_due", "state", "gap", "samples")
+
+    def __init__(self, interval, now):
+        self.interval = interval
+        self.next_due = now
+        self.state = ACTIVE
+        self.gap = None  # EWMA of measured seconds between samples
+        self.samples = 0
+
+class AdaptiveScheduler:
+    """
+    Per-interface sampling intervals for the collector.
+
+    After each sample, observe() classifies the interface from its rolling features
+    (utils.features) and detector label:
+    - burst: an anomaly, a rate z-score of SAMPLE_BURST_Z or more, or a rate whose
+      rolling std/mean reaches SAMPLE_BURST_CV; sampled every `fast` seconds;
+    - idle: under SAMPLE_IDLE_RATE bytes/s; its interval doubles up to `slow`;
+    - otherwise active; its interval doubles back up to `base` after a burst.
+
+    due() returns every interface whose next sample falls within half a fast
+    interval, so interfaces due at about the same time share one
+    net_io_counters() read. With fast == slow == base it is a fixed-rate schedule.
+    """
+
+    def __init__(self, base=COLLECTOR_INTERVAL, fast=SAMPLE_MIN_INTERVAL, slow=SAMPLE_IDLE_INTERVAL,
+                 idle_rate=SAMPLE_IDLE_RATE, burst_z=SAMPLE_BURST_Z, burst_cv=SAMPLE_BURST_CV):
+        self.base = float(base)
+        self.fast = min(float(fast), self.base)
+        self.slow = max(float(slow), self.base)
+        self.idle_rate = idle_rate
+        self.burst_z = burst_z
+        self.burst_cv = burst_cv
+        self._ifaces = {}
+        self._lock = threading.Lock()
+
+    @property
+    def adaptive(self):
+        return self.fast < self.slow
+
+    def due(self, ifaces, now):
+        """Interfaces to sample at monotonic time `now`; forgets interfaces no longer listed."""
+        with self._lock:
+            listed = set(ifaces)
+            for gone in set(self._ifaces) - listed:
+                del self._ifaces[gone]
+            out = []
+            for iface in ifaces:
+                state = self._ifaces.get(iface)
+                if state is None:
+                    state = self._ifaces[iface] = _IfaceState(self.base, now)
+                if state.next_due <= now + self.fast / 2:
+                    # provisional: observe() reschedules from the actual sample
+                    state.next_due = now + state.interval
+                    out.append(iface)
+            return out
+
+    def next_due(self, now):
+        """Monotonic time of the next due sample (now + base when nothing is scheduled)."""
+        with self._lock:
+            return min((s.next_due for s in self._ifaces.values()), default=now + self.base)
+
+    def classify(self, row):
+        """BURST, ACTIVE or IDLE for one sample row (a mapping of history columns)."""
+        def get(col):
+            value = row.get(col)
+            return 0.0 if value is None or (isinstance(value, float) and math.isnan(value)) else float(value)
+
+        if get("anomaly") == -1:
+            return BURST
+        rate = get("sent_rate") + get("recv_rate")
+        if rate < self.idle_rate:
+            return IDLE
+        if max(abs(get("sent_rate_z")), abs(get("recv_rate_z"))) >= self.burst_z:
+            return BURST
+        for metric in ("sent_rate", "recv_rate"):
+            mean = get(f"{metric}_mean")
+            if mean >= self.idle_rate and get(f"{metric}_std") / mean >= self.burst_cv:
+                return BURST
+        return ACTIVE
+
+    def observe(self, iface, row, sampled_at):
+        """Adapt iface's interval to the sample just taken at monotonic `sampled_at`."""
+        with self._lock:
+            state = self._ifaces.get(iface)
+            if state is None:
+                return
+            state.samples += 1
+            gap = row.get("interval_s") or 0.0
+            if gap > 0:
+                state.gap = gap if state.gap is None else 0.8 * state.gap + 0.2 * gap
+            # a first reading has no interval (all-zero deltas), so it says nothing about activity
+            if self.adaptive and gap > 0:
+                state.state = self.classify(row)
+                if state.state == BURST:
+                    state.interval = self.fast
+                elif state.state == IDLE:
+                    state.interval = min(self.slow, state.interval * 2)
+                else:
+                    state.interval = min(self.base, state.interval * 2)
+            state.next_due = sampled_at + state.interval
+
+    def rates(self):
+        """{iface: {"state", "interval_s" (target), "samples_per_s" (measured), "samples"}}."""
+        with self._lock:
+            return {
+                iface: {
+                    "state": s.state, "interval_s": s.interval, "samples": s.samples,
+                    "samples_per_s": 1.0 / s.gap if s.gap else None,
+                }
+                for iface, s in self._ifaces.items()
+            }
@@ -1,25 +1,28 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from utils.anomaly import detect_anomalies
+from utils.analysis_cache import describe, anomaly_labels
+from utils.ui_utils import history_range_selector
+from utils.metrics import instrument
 
+@instrument("page.statistics")
 def statistics():
     st.title("📈 Statistical Analysis")
 
-    df = st.session_state.history.copy()
+    df = history_range_selector(key="statistics_range")
     if df is None or df.empty:
         st.info("No data to analyze yet.")
         return
 
-    # Fix: import pandas allows using pd.to_datetime
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    st.dataframe(df.describe(include="all"))
+    # shared with the other pages and the PDF report, and kept up to date incrementally
+    # for the live history
+    st.dataframe(describe(df, st.session_state.get("history")))
 
-    anomaly_df = detect_anomalies(df[["bytes_sent", "bytes_recv"]])
+    anomaly_df = anomaly_labels(df)
     if anomaly_df is not None:
         st.subheader("Anomalies")
         st.dataframe(anomaly_df[["bytes_sent","bytes_recv","anomaly"]])
 
+        import plotly.express as px  # deferred until there is a chart to draw
+
         counts = anomaly_df["anomaly"].value_counts()
         fig = px.pie(
             names=["Normal","Anomaly"],
@@ -0,0 +1,180 @@
+import socket
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# psutil-compatible records so code under test can't tell the difference
+snetio = namedtuple("snetio", "bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout")
+snicaddr = namedtuple("snicaddr", "family address netmask broadcast ptp")
+
+def generate_history(rows, ifaces=4, interval=5.0, seed=0, burst_rate=0.01, burst_scale=20.0,
+                     start="2024-01-01"):
+    """
+    Deterministic synthetic traffic in the history schema, `rows` rows total spread
+    round-robin over `ifaces` interfaces every `interval` seconds.
+
+    Each interface has its own base rate, a 24h sinusoidal (diurnal) profile and
+    lognormal noise; bursts of a few consecutive samples are injected at
+    `burst_rate` and multiply traffic by ~burst_scale. The `is_burst` column labels
+    the injected rows so detection recall can be measured.
+    """
+    rng = np.random.default_rng(seed)
+    ticks = -(-rows // ifaces)
+    names = [f"wlan{i}" for i in range(ifaces)]
+    t = np.repeat(np.arange(ticks) * interval, ifaces)[:rows]
+    iface_idx = np.tile(np.arange(ifaces), ticks)[:rows]
+
+    base = rng.uniform(20_000, 200_000, size=ifaces)[iface_idx]
+    phase = rng.uniform(0, 2 * np.pi, size=ifaces)[iface_idx]
+    diurnal = 1.0 + 0.6 * np.sin(2 * np.pi * t / 86_400 + phase)
+    noise_sent = rng.lognormal(0.0, 0.25, size=rows)
+    noise_recv = rng.lognormal(0.0, 0.25, size=rows)
+    sent = base * diurnal * noise_sent * interval / 5.0
+    recv = 3.0 * base * diurnal * noise_recv * interval / 5.0
+
+    # bursts: start points per row, each lasting 1-4 ticks on the same interface
+    is_burst = np.zeros(rows, dtype=bool)
+    starts = np.flatnonzero(rng.random(rows) < burst_rate)
+    lengths = rng.integers(1, 5, size=len(starts))
+    for s, length in zip(starts, lengths):
+        is_burst[s:min(rows, s + length * ifaces):ifaces] = True
+    factor = np.where(is_burst, rng.uniform(0.5, 1.5, size=rows) * burst_scale, 1.0)
+    sent = (sent * factor).astype(np.int64)
+    recv = (recv * np.where(is_burst, factor / 2, 1.0)).astype(np.int64)
+
+    packets = (sent + recv) // 900 + 1
+    tcp = (packets * rng.uniform(0.6, 0.9, size=rows)).astype(np.int64)
+    udp = (packets - tcp) * 9 // 10
+
+    df = pd.DataFrame({
+        "timestamp": pd.Timestamp(start) + pd.to_timedelta(t, unit="s"),
+        "interface": pd.Categorical.from_codes(iface_idx, categories=names),
+        "ip_address": pd.Categorical.from_codes(
+            iface_idx, categories=[f"10.0.0.{i + 2}" for i in range(ifaces)]),
+        "location": "Private Network",
+        "bytes_sent": sent,
+        "bytes_recv": recv,
+        "interval_s": interval,
+        "tcp_segs": tcp,
+        "udp_dgrams": udp,
+        "icmp_msgs": (packets - tcp - udp),
+        "tcp_retrans": np.where(is_burst, tcp // 50, tcp // 1000),
+        "proto_errors": 0,
+        "rx_packets": packets * 3 // 4,
+        "tx_packets": packets - packets * 3 // 4,
+        "iface_errors": 0,
+        "iface_drops": 0,
+        "protocol": "TCP",
+        "is_burst": is_burst,
+    })
+    grouped = df.groupby("interface", observed=True)
+    df["cum_bytes_sent"] = grouped["bytes_sent"].cumsum()
+    df["cum_bytes_recv"] = grouped["bytes_recv"].cumsum()
+    return df
+
+class FakeCounters:
+    """
+    Stand-in for psutil's counter source, replaying a generate_history() frame:
+    every net_io_counters(pernic=True) call advances one tick and returns
+    cumulative counters. Pass .net_io_counters / .net_if_addrs wherever psutil's are used.
+    times[tick] is a tick's recorded timestamp and tick_rows(tick) its rows' positions
+    in the frame.
+    """
+
+    def __init__(self, history):
+        self.ifaces = [str(c) for c in history["interface"].cat.categories]
+        ts = history["timestamp"].to_numpy()
+        order = np.lexsort((history["interface"].cat.codes.to_numpy(), ts))
+        self._iface = history["interface"].cat.codes.to_numpy()[order]
+        self._cols = [
+            history[col].to_numpy(dtype=np.int64)[order]
+            for col in ("cum_bytes_sent", "cum_bytes_recv", "tx_packets", "rx_packets")
+        ]
+        self.times, self._bounds = np.unique(ts[order], return_index=True)
+        self._bounds = np.append(self._bounds, len(order))
+        self._order = order
+        self._pos = 0
+        self._addrs = {
+            iface: [snicaddr(socket.AF_INET, str(ip), "255.255.255.0", None, None)]
+            for iface, ip in zip(self.ifaces, history["ip_address"].cat.categories)
+        }
+
+    @property
+    def ticks(self):
+        return len(self._bounds) - 1
+
+    def tick_rows(self, tick):
+        return self._order[self._bounds[tick]:self._bounds[tick + 1]]
+
+    def net_io_counters(self, pernic=True):
+        tick = self._pos % self.ticks
+        self._pos += 1
+        lo, hi = self._bounds[tick], self._bounds[tick + 1]
+        sent, recv, tx, rx = (col[lo:hi].tolist() for col in self._cols)
+        return {
+            self.ifaces[code]: snetio(sent[i], recv[i], tx[i], rx[i], 0, 0, 0, 0)
+            for i, code in enumerate(self._iface[lo:hi].tolist())
+        }
+
+    def net_if_addrs(self):
+        return self._addrs
+
+def write_pcap(path, packets, rate=5_000.0, ifaces=1, seed=0, snaplen=64, start="2024-01-01"):
+    """
+    Deterministic classic pcap (Ethernet/IPv4, ~80% TCP, ~18% UDP, rest ICMP) with
+    `packets` packets at ~`rate` packets/s between a few local 192.168.1.x hosts and
+    public peers. Packets are truncated to `snaplen` bytes like a header-only capture;
+    orig_len carries the on-wire size. Written with NumPy in one pass, for benchmarks
+    of utils.pcap_ingest.
+    """
+    rng = np.random.default_rng(seed)
+    ts = pd.Timestamp(start).value + np.cumsum(rng.exponential(1e9 / rate, size=packets)).astype(np.int64)
+    record = np.dtype([
+        ("sec", "<u4"), ("usec", "<u4"), ("caplen", "<u4"), ("origlen", "<u4"), ("data", "u1", snaplen),
+    ])
+    out = np.zeros(packets, dtype=record)
+    out["sec"] = ts // 1_000_000_000
+    out["usec"] = ts % 1_000_000_000 // 1_000
+    origlen = rng.choice([60, 66, 590, 1514], p=[0.3, 0.3, 0.1, 0.3], size=packets)
+    out["caplen"] = np.minimum(origlen, snaplen)
+    out["origlen"] = origlen
+
+    data = out["data"]
+    data[:, 12], data[:, 13] = 0x08, 0x00                         # ethertype IPv4
+    data[:, 14], data[:, 22] = 0x45, 64                          # version/IHL, TTL
+    total = origlen - 14
+    data[:, 16], data[:, 17] = total >> 8, total & 0xFF
+    proto = rng.choice([6, 17, 1], p=[0.8, 0.18, 0.02], size=packets)
+    data[:, 23] = proto
+    local = np.tile(np.array([192, 168, 1, 2], dtype=np.uint8), (packets, 1))
+    local[:, 3] += rng.integers(0, max(1, ifaces * 4), size=packets).astype(np.uint8)
+    remote = np.column_stack([
+        rng.choice([8, 34, 93, 151, 172], size=packets), rng.integers(0, 256, size=(packets, 2)),
+        rng.integers(1, 255, size=packets),
+    ]).astype(np.uint8)
+    outbound = rng.random(packets) < 0.4
+    data[:, 26:30] = np.where(outbound[:, None], local, remote)    # src
+    data[:, 30:34] = np.where(outbound[:, None], remote, local)    # dst
+    ephemeral = rng.integers(32_768, 61_000, size=packets)
+    service = rng.choice([443, 80, 53, 22, 123], size=packets)
+    sport = np.where(outbound, ephemeral, service)
+    dport = np.where(outbound, service, ephemeral)
+    has_ports = proto != 1
+    data[:, 34] = np.where(has_ports, sport >> 8, 8)               # ICMP echo request type
+    data[:, 35] = np.where(has_ports, sport & 0xFF, 0)
+    data[:, 36] = np.where(has_ports, dport >> 8, 0)
+    data[:, 37] = np.where(has_ports, dport & 0xFF, 0)
+
+    # records are variable-length on disk: drop each row's padding beyond its caplen
+    # magic, version 2.4 (two little-endian u16), thiszone, sigfigs, snaplen, LINKTYPE_ETHERNET
+    header = np.array([0xA1B2C3D4, 2 | (4 << 16), 0, 0, snaplen, 1], dtype="<u4")
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        full = out["caplen"] == snaplen
+        if full.all():
+            f.write(out.tobytes())
+        else:
+            raw = out.view(np.uint8).reshape(packets, record.itemsize)
+            keep = np.arange(record.itemsize)[None, :] < (16 + out["caplen"])[:, None]
+            f.write(raw[keep].tobytes())
+    return path
@@ -0,0 +1,25 @@
+import os
+import sys
+import types
+import pytest
+
+# the repository is the `utils` package of the app (modules import each other as
+# utils.<name>); make this checkout importable under that name
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "utils" not in sys.modules:
+    package = types.ModuleType("utils")
+    package.__path__ = [ROOT]
+    sys.modules["utils"] = package
+
+# the same, for a fresh interpreter running one of the package's command-line entry points
+_RUN_MODULE = (
+    "import runpy, sys, types; package = types.ModuleType('utils'); package.__path__ = [sys.argv.pop(1)]; "
+    "sys.modules['utils'] = package; runpy.run_module('utils.' + sys.argv.pop(1), run_name='__main__')"
+)
+
+@pytest.fixture
+def module_command():
+    """argv running `python -m utils.<name> args...` from this checkout."""
+    def command(name, *args):
+        return [sys.executable, "-c", _RUN_MODULE, ROOT, name, *map(str, args)]
+    return command
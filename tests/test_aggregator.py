@@ -0,0 +1,48 @@
+import json
+import logging
+import subprocess
+import time
+import urllib.request
+
+from utils.aggregator import Aggregator
+from utils.agent import HttpTransport, encode_batch
+
+AGENTS = 3
+
+def test_agents_on_loopback(module_command, caplog):
+    aggregator = Aggregator("127.0.0.1", 0, 0, workers=2).start()
+    assert aggregator.running, aggregator.last_error
+    url = f"http://127.0.0.1:{aggregator.port}"
+    agents = [
+        subprocess.Popen(
+            module_command("agent", url, "--name", f"agent-{i}", "--fake-ifaces", 2, "--interval", 0.01,
+                           "--batch-rows", 20, "--flush-seconds", 0.1, "--duration", 2, "--report-every", 1),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        for i in range(AGENTS)
+    ]
+    outputs = [agent.communicate(timeout=60) for agent in agents]
+    assert [agent.returncode for agent in agents] == [0] * AGENTS, [err for _, err in outputs]
+
+    # agents flush their buffers on exit; wait for the workers to apply every batch
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        with urllib.request.urlopen(f"{url}/hosts") as response:
+            status = json.load(response)
+        if len(status["hosts"]) == AGENTS and not any(q.qsize() for q in aggregator._queues):
+            break
+        time.sleep(0.1)
+    assert [h["host"] for h in status["hosts"]] == [f"agent-{i}" for i in range(AGENTS)]
+    assert all(h["rows"] > 0 and h["duplicates"] == 0 for h in status["hosts"])
+    assert status["stats"]["errors"] == status["stats"]["bad_batches"] == 0
+    assert aggregator.stats["rows"] == sum(h["rows"] for h in aggregator.summary())
+
+    # a keep-alive connection still open at shutdown is closed without handler tracebacks
+    transport = HttpTransport(url)
+    row = {"timestamp": "2024-01-01T00:00:00", "interface": "wlan0", "bytes_sent": 1, "bytes_recv": 1}
+    assert transport.send(encode_batch("keep-alive", "test", 0, [row])) == (True, 0.0)
+    with caplog.at_level(logging.ERROR, logger="asyncio"):
+        aggregator.stop()
+    assert not aggregator.running
+    assert not caplog.records
+    transport.close()
@@ -0,0 +1,62 @@
+import json
+import pandas as pd
+
+from utils.alerts import AlertPipeline, FileSink, WebhookSink, start_stub, storm
+
+def _stub(**options):
+    server = start_stub(port=0, **options)
+    return server, f"http://127.0.0.1:{server.server_address[1]}/alerts"
+
+def test_storm_through_webhook_and_file(tmp_path):
+    server, url = _stub()
+    path = tmp_path / "alerts.jsonl"
+    pipeline = AlertPipeline([WebhookSink(url), FileSink(str(path))], window=60, batch_seconds=0.05)
+    try:
+        # 10 interfaces x 500 rows, with a silence longer than the window every 200 rows:
+        # three incidents per interface
+        assert storm(pipeline, 5_000, ifaces=10, per_write=500, window=60) > 0
+        summary = pipeline.summary()
+        assert summary["events"] == 5_000
+        assert summary["incidents"] == 30
+        assert summary["resolved"] == 20 and summary["open"] == 10
+
+        assert pipeline.flush()
+        summary = pipeline.summary()
+        assert summary["resolved"] == 30 and summary["open"] == 0
+        for name in ("webhook", "file"):
+            sink = summary["sinks"][name]
+            assert sink["delivered"] == 60 and sink["pending"] == 0
+            assert sink["dropped"] == sink["failed"] == 0
+        assert server.received == len(server.ids) == 60
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert {(n["type"], n["incident"]["id"]) for n in lines} == server.ids
+
+        # flush leaves the workers running: the shared pipeline keeps delivering
+        rows = pd.DataFrame({
+            "timestamp": [pd.Timestamp("2025-01-01")], "interface": ["eth0"], "anomaly": [-1],
+            "anomaly_score": [-0.2], "bytes_sent": [10], "bytes_recv": [20],
+        })
+        pipeline.write(rows, host="remote")
+        pipeline.write(rows, host="remote")  # re-reported row
+        assert pipeline.flush()
+        assert pipeline.summary()["duplicates"] == 1
+        assert server.received == 62
+        assert ("incident_resolved", "remote/eth0/2025-01-01T00:00:00") in server.ids
+    finally:
+        pipeline.close()
+        server.shutdown()
+    assert all(not worker._thread.is_alive() for worker in pipeline.workers)
+
+def test_failing_webhook_is_given_up_on(tmp_path):
+    server, url = _stub(fail_rate=1.0)
+    pipeline = AlertPipeline([WebhookSink(url)], window=60, batch_seconds=0.05, retries=1, max_backoff=0.1)
+    try:
+        storm(pipeline, 200, ifaces=2, per_write=100, window=60)
+        assert pipeline.flush(timeout=10)
+        sink = pipeline.summary()["sinks"]["webhook"]
+        assert sink["delivered"] == 0
+        assert sink["failed"] == 4 and sink["retries"] >= 1
+        assert "HTTP 503" in sink["last_error"]
+    finally:
+        pipeline.close(timeout=1)
+        server.shutdown()
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from utils.analysis_cache import describe_history, grouped_history, _describe_aggregate, DESCRIBE_ROWS
+from utils.history_store import HistoryStore
+from utils.constants import ANALYSIS_BLOCK_ROWS
+
+SCHEMA = {
+    "timestamp": "datetime64[ns]",
+    "interface": "category",
+    "ip_address": "category",
+    "bytes_sent": "int64",
+    "interval_s": "float64",
+    "anomaly": "float64",
+}
+CAPACITY = ANALYSIS_BLOCK_ROWS + ANALYSIS_BLOCK_ROWS // 2  # the retained window straddles blocks
+
+def _rows(first, n, rng):
+    seq = np.arange(first, first + n)
+    return pd.DataFrame({
+        "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(seq, unit="s"),
+        # uneven shares, so describe's "top" is never a tie
+        "interface": np.where(seq % 10 < 6, "wlan0", np.where(seq % 10 < 9, "eth0", "lo")),
+        # one busy peer and a steady stream of new ones (forces dictionary compactions)
+        "ip_address": [
+            f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" if i % 5 else "10.0.0.1" for i in seq
+        ],
+        "bytes_sent": rng.integers(0, 50_000, n),
+        "interval_s": np.where(rng.random(n) < 0.05, np.nan, rng.choice([0.5, 1.0, 2.0], n)),
+        "anomaly": np.nan,
+    })
+
+def _check(store):
+    df = store.to_frame()
+    got, want = describe_history(store), df.describe(include="all")
+    assert list(got.columns) == list(want.columns)
+    for col in df.columns:
+        for row in want[col].dropna().index:
+            expected, actual = want.at[row, col], got.at[row, col]
+            if isinstance(expected, pd.Timestamp):
+                assert abs(actual - expected) <= pd.Timedelta(microseconds=1), (col, row)
+            elif isinstance(expected, str):
+                assert actual == expected, (col, row)
+            else:
+                assert np.isclose(actual, expected, rtol=1e-9), (col, row, actual, expected)
+        assert set(got[col].dropna().index) <= set(DESCRIBE_ROWS)
+
+    for by, columns, how in ((["interface"], ["bytes_sent", "interval_s"], "sum"),
+                             (["interface", "ip_address"], ["bytes_sent"], "max")):
+        got = grouped_history(store, by, columns, how)
+        want = df.groupby(by, observed=True)[columns].agg(how)
+        want.index = want.index.map(lambda key: tuple(map(str, key)) if isinstance(key, tuple) else str(key))
+        got = got.loc[want.index]
+        assert np.allclose(got.to_numpy(dtype=float), want.to_numpy(dtype=float), equal_nan=True), (by, how)
+
+def test_block_aggregates_match_pandas():
+    rng = np.random.default_rng(0)
+    store = HistoryStore(capacity=CAPACITY, schema=SCHEMA)
+    aggregate = _describe_aggregate(store)
+    total = compactions = 0
+    for n in (700, 300, 1, 400, 1200, 2500, 90, 1100, 1500):
+        rewrites = store.rewrites
+        store.append(_rows(total, n, rng))
+        total += n
+        before = aggregate.rows_computed
+        _check(store)
+        if store.rewrites == rewrites:
+            # only rows appended since the last read (plus a straddled block) are aggregated
+            assert aggregate.rows_computed - before <= n + ANALYSIS_BLOCK_ROWS
+        else:
+            compactions += 1  # codes were renumbered: every block is recomputed
+    assert store.total > 4 * CAPACITY  # wrapped several times
+    assert compactions and len(store.categories("ip_address")) <= 2 * CAPACITY + 1500
+
+    # rewrites: late labels and a relabelled interface refresh only the blocks they touch
+    seqs = store.seqs()
+    store.set("anomaly", seqs[::7], np.where(rng.random(len(seqs[::7])) < 0.1, -1.0, 1.0))
+    store.set("interface", seqs[-20:-10], "wlan1")
+    store.set("bytes_sent", seqs[:5], [10**9] * 5)
+    _check(store)
+
+    store.append(_rows(total, 50, rng))
+    _check(store)
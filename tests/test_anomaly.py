@@ -0,0 +1,28 @@
+import numpy as np
+
+from utils.anomaly import StreamingDetector, DETECTOR_FEATURES
+
+def test_failed_background_refit_is_kept():
+    X = np.random.default_rng(0).normal(size=(200, len(DETECTOR_FEATURES)))
+    detector = StreamingDetector(retrain_every=20, background=True)
+    detector.update(X[:50])
+    refit = detector.engine.refit
+
+    def broken(name, X):
+        raise MemoryError("refit failed")
+
+    detector.engine.refit = broken
+    for start in range(50, 100, 10):
+        detector.update(X[start:start + 10])
+    detector._worker.join()
+    assert detector.fit_error == "MemoryError('refit failed')"
+    # the first models keep serving
+    assert detector.timings["fits"] == 1
+    assert detector.score(X[:5]) is not None
+
+    detector.engine.refit = refit
+    for start in range(100, 150, 10):
+        detector.update(X[start:start + 10])
+    detector._worker.join()
+    assert detector.fit_error is None
+    assert detector.timings["fits"] == 2
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from utils.anomaly import DETECTOR_FEATURES, detect_anomalies
+from utils.batch_score import BYTE_FEATURES, default_features, main, score_file
+from utils.features import compute_features
+from utils.synthetic import generate_history
+
+def test_csv_chunks_keep_passthrough_schema(tmp_path):
+    n = 40
+    pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=n, freq="s"),
+        "interface": "wlan0",
+        # the first chunk's addresses are all "N/A"
+        "ip_address": ["N/A"] * 20 + [f"10.0.0.{i}" for i in range(20)],
+        "bytes_sent": np.arange(n),
+        "bytes_recv": np.arange(n),
+    }).to_csv(tmp_path / "samples.csv", index=False)
+
+    assert main([str(tmp_path / "samples.csv"), str(tmp_path / "flags.parquet"),
+                 "--chunk-rows", "20", "--jobs", "1"]) == 0
+    out = pd.read_parquet(tmp_path / "flags.parquet")
+    assert out["row"].tolist() == list(range(n))
+    assert out["ip_address"].tolist()[:20] == ["N/A"] * 20
+
+def test_scores_match_detect_anomalies(tmp_path):
+    df = generate_history(400, ifaces=2, seed=1)
+    df.to_parquet(tmp_path / "samples.parquet", index=False)
+    assert default_features(str(tmp_path / "samples.parquet")) == BYTE_FEATURES
+
+    # the sample covers the whole file, so the engine is fitted on the same rows
+    score_file(str(tmp_path / "samples.parquet"), str(tmp_path / "flags.parquet"),
+               jobs=1, chunk_rows=150, sample_rows=1_000, log=lambda message: None)
+    out = pd.read_parquet(tmp_path / "flags.parquet")
+    expected = detect_anomalies(df[["bytes_sent", "bytes_recv"]])
+    assert (out["anomaly"].to_numpy() == expected["anomaly"].to_numpy()).all()
+    assert np.allclose(out["anomaly_score"], expected["anomaly_score"])
+    assert (out["anomaly"] == -1).any()
+
+    df.join(compute_features(df)).to_parquet(tmp_path / "with_features.parquet", index=False)
+    assert default_features(str(tmp_path / "with_features.parquet")) == DETECTOR_FEATURES
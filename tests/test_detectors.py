@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import detectors
+from utils.anomaly import detect_anomalies, detector_params, BATCH_DETECTOR_PARAMS
+from utils.detectors import DetectorEngine
+
+class ColumnDetector:
+    """Scores each row by one column of X; records the rows it was asked to score."""
+    streaming = True
+    fitted = True
+
+    def __init__(self, column, cheap=False, threshold=1.0, fail=False):
+        self.column = column
+        self.cheap = cheap
+        self.threshold = threshold
+        self.fail = fail
+        self.seen = []
+
+    def partial_fit(self, X):
+        return self
+
+    def score_samples(self, X):
+        if self.fail:
+            raise RuntimeError("model exploded")
+        self.seen.append(X[:, self.column].copy())
+        return X[:, self.column] * self.threshold
+
+@pytest.fixture
+def engine(monkeypatch):
+    """A cheap gate on column 0 and two costly detectors on columns 1 and 2."""
+    for name in ("gate", "costly_a", "costly_b"):
+        monkeypatch.setitem(detectors.DETECTORS, name, ColumnDetector)
+
+    def build(**options):
+        params = {"gate": {"column": 0, "cheap": True}, "costly_a": {"column": 1, "threshold": 4.0},
+                  "costly_b": {"column": 2, "threshold": 0.5}}
+        return DetectorEngine(("gate", "costly_a", "costly_b"), params, **options)
+    return build
+
+# normalised scores: gate, costly_a, costly_b
+X = np.array([
+    [0.1, 5.0, 5.0],   # under the pre-filter: the costly detectors never see it
+    [0.9, 0.5, 2.5],
+    [2.0, 0.2, 0.4],   # the gate fires, the costly detectors overrule it
+])
+
+def test_prefilter(engine):
+    eng = engine(prefilter_ratio=0.8, combine="mean")
+    result = eng.score(X)
+    assert list(result["escalated"]) == [False, True, True]
+    assert list(eng.detectors["costly_a"].seen[0]) == [0.5, 0.2]
+    assert np.isnan(result["detectors"]["costly_a"][0])
+    assert np.allclose(result["detectors"]["gate"], X[:, 0])
+    assert np.allclose(result["scores"], [0.1, 1.5, 0.3])
+    assert list(result["labels"]) == [1, -1, 1]
+    assert (eng.scored_rows, eng.escalated_rows) == (3, 2)
+
+    # prefilter_ratio=0: every row goes to every detector
+    eng = engine(prefilter_ratio=0.0, combine="mean")
+    result = eng.score(X)
+    assert result["escalated"].all()
+    assert np.allclose(result["scores"], [5.0, 1.5, 0.3])
+    assert list(result["labels"]) == [-1, -1, 1]
+
+def test_combine_max(engine):
+    result = engine(prefilter_ratio=0.8, combine="max").score(X)
+    assert np.allclose(result["scores"], [0.1, 2.5, 0.4])
+    assert list(result["labels"]) == [1, -1, 1]
+
+def test_failing_detector_is_left_out(engine):
+    eng = engine(prefilter_ratio=0.0, combine="mean")
+    eng.detectors["costly_b"].fail = True
+    result = eng.score(X)
+    assert eng.errors == {"costly_b": "RuntimeError('model exploded')"}
+    assert "costly_b" not in result["detectors"]
+    assert np.allclose(result["scores"], X[:, 1])  # costly_a decides alone
+
+    # with every costly detector failing, the cheap gate decides
+    eng.detectors["costly_a"].fail = True
+    result = eng.score(X)
+    assert set(eng.errors) == {"costly_a", "costly_b"}
+    assert not result["escalated"].any()
+    assert np.allclose(result["scores"], X[:, 0])
+
+    # recovering clears the error
+    eng.detectors["costly_a"].fail = eng.detectors["costly_b"].fail = False
+    eng.score(X)
+    assert eng.errors == {}
+
+def _traffic(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.normal(5_000, 500, n), rng.normal(20_000, 2_000, n)])
+    spikes = np.arange(50, n, 100)
+    X[spikes] *= 40
+    return X, spikes
+
+def test_refit_swaps_in_a_fitted_detector():
+    X, spikes = _traffic()
+    eng = DetectorEngine(("robust_z", "isolation_forest"), detector_params(0.05, 42, len(X)))
+    old = eng.detectors["isolation_forest"]
+    eng.errors["isolation_forest"] = "MemoryError()"
+    eng.refit("isolation_forest", X)
+
+    new = eng.detectors["isolation_forest"]
+    assert new is not old and new.fitted and not old.fitted
+    assert eng.timings["isolation_forest"]["fit_seconds"] > 0
+    assert "isolation_forest" not in eng.errors
+    # the streaming detector has seen nothing yet: the refitted forest decides alone
+    result = eng.score(X)
+    assert set(result["detectors"]) == {"isolation_forest"}
+    assert (result["labels"][spikes] == -1).all()
+
+def test_detect_anomalies_uses_the_batch_engine():
+    X, spikes = _traffic()
+    df = pd.DataFrame({"bytes_sent": X[:, 0], "bytes_recv": X[:, 1], "interface": "eth0"})
+    out = detect_anomalies(df)
+    assert list(out.columns) == ["bytes_sent", "bytes_recv", "interface", "anomaly", "anomaly_score"]
+    assert (out["anomaly"].iloc[spikes] == -1).all()
+    assert ((out["anomaly"] == -1) == (out["anomaly_score"] <= 0)).all()
+
+    params = detector_params(BATCH_DETECTOR_PARAMS["contamination"], BATCH_DETECTOR_PARAMS["random_state"],
+                             len(X))
+    eng = DetectorEngine(BATCH_DETECTOR_PARAMS["detectors"], params)
+    expected = eng.partial_fit(X).score(X)
+    assert (out["anomaly"].to_numpy() == expected["labels"]).all()
+    assert np.allclose(out["anomaly_score"], 1.0 - expected["scores"])
+
+    assert detect_anomalies(df.iloc[:9]) is None
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from utils.features import FEATURE_COLUMNS, FeatureEngine, compute_features
+
+WINDOW = 16
+
+def _samples(seed=0):
+    """Two interleaved interfaces; eth0 drops out for a while and comes back."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for tick in range(120):
+        for iface in ("wlan0", "eth0"):
+            if iface == "eth0" and 40 <= tick < 70:
+                continue  # interface gap
+            first = tick == 0 or (iface == "eth0" and tick == 70)
+            burst = tick % 37 == 5
+            rows.append({
+                "interface": iface,
+                # the first reading after (re)appearing has no interval yet
+                "interval_s": 0.0 if first else rng.choice([0.5, 1.0, 2.0]),
+                "bytes_sent": 0 if first else int(rng.integers(1_000, 5_000) * (50 if burst else 1)),
+                "bytes_recv": 0 if first else int(rng.integers(0, 20_000)),
+            })
+    return pd.DataFrame(rows)
+
+def test_batch_features_match_streaming():
+    df = _samples()
+    assert (df["interface"] == "wlan0").sum() > 4 * WINDOW  # the rolling window wraps several times
+
+    engine = FeatureEngine(window=WINDOW, alpha=0.2)
+    # streaming sees the rows in uneven batches, as the collector produces them
+    bounds = [0, 1, 7, 60, 61, 150, len(df)]
+    streamed = pd.concat([engine.update(df.iloc[lo:hi]) for lo, hi in zip(bounds, bounds[1:])])
+
+    batch = compute_features(df, window=WINDOW, alpha=0.2)
+    assert list(batch.columns) == FEATURE_COLUMNS
+    assert batch.index.equals(streamed.index)
+    for col in FEATURE_COLUMNS:
+        assert np.allclose(batch[col], streamed[col], rtol=1e-9, atol=1e-6), col
@@ -0,0 +1,54 @@
+import socket
+from types import SimpleNamespace
+import requests
+
+from utils import geolocation, network_utils
+from utils.geolocation import GeoCache, GeoService, UNKNOWN
+from utils.network_utils import get_multi_iface_stats
+from utils.constants import GEO_PLACEHOLDER
+
+class CountingSession(requests.Session):
+    """Answers 8.8.8.8 and fails every other address, counting outbound calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        if "8.8.8.8" not in url:
+            raise requests.ConnectionError("provider down")
+        return SimpleNamespace(status_code=200, json=lambda: {"city": "Mountain View", "country": "US"})
+
+class SessionState(dict):
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+def test_repeated_ticks_make_no_outbound_calls(monkeypatch):
+    session = CountingSession()
+    service = GeoService(provider_url="http://geo.invalid/{ip}", cache=GeoCache(), session=session)
+    monkeypatch.setattr(geolocation, "_service", service)
+    addrs = {
+        "wlan0": [SimpleNamespace(family=socket.AF_INET, address="8.8.8.8")],
+        "eth0": [SimpleNamespace(family=socket.AF_INET, address="1.1.1.1")],
+    }
+    net_io = {}
+    monkeypatch.setattr(network_utils, "psutil", SimpleNamespace(
+        net_io_counters=lambda pernic=True: net_io, net_if_addrs=lambda: addrs))
+    monkeypatch.setattr(network_utils, "st", SimpleNamespace(session_state=SessionState()))
+
+    def tick(n):
+        net_io.update({iface: SimpleNamespace(bytes_sent=n * 100, bytes_recv=n * 200) for iface in addrs})
+        df = get_multi_iface_stats(list(addrs))
+        return dict(zip(df["interface"], df["location"]))
+
+    assert tick(0) == {"wlan0": GEO_PLACEHOLDER, "eth0": GEO_PLACEHOLDER}
+    assert service.wait(timeout=5)
+    assert len(session.calls) == service.requests_made == 2
+
+    # positive cache hit for wlan0, negative cache ("Unknown") for eth0
+    for n in range(1, 20):
+        assert tick(n) == {"wlan0": "Mountain View, US", "eth0": UNKNOWN}
+    assert service.pending() == 0
+    assert len(session.calls) == service.requests_made == 2
+    service.shutdown()
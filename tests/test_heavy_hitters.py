@@ -0,0 +1,43 @@
+import sys
+import pytest
+
+from utils.heavy_hitters import HeavyHitterTracker, ProcNetPeers
+
+HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+def _addr(ip, port):
+    word = int.from_bytes(bytes(map(int, ip.split("."))), sys.byteorder)
+    return f"{word:08X}:{port:04X}"
+
+def _line(n, remote, state="01", queues="00000010:00000000"):
+    local = _addr("192.168.1.5", 40000 + n)
+    return f"{n:4d}: {local} {remote} {state} {queues} 00:00000000 00000000 1000 0 1\n"
+
+def test_live_peers_are_ranked_by_connected_sockets(tmp_path):
+    (tmp_path / "net").mkdir()
+    (tmp_path / "net" / "tcp").write_text(HEADER + "".join([
+        _line(0, _addr("93.184.216.34", 443)),
+        _line(1, _addr("93.184.216.34", 443), queues="0000FFFF:00000000"),  # queues don't weigh in
+        _line(2, _addr("1.1.1.1", 853)),
+        _line(3, _addr("0.0.0.0", 0), state="0A"),  # listening
+        _line(4, _addr("127.0.0.1", 8501)),  # loopback
+    ]))
+    connected = ProcNetPeers(procfs_root=str(tmp_path)).connections()
+    assert connected is not None
+    hi, lo, sockets = connected
+
+    tracker = HeavyHitterTracker(metrics=("connections",))
+    for _ in range(3):
+        tracker.add(1000.0, hi, lo, connections=sockets)
+    top = tracker.query("connections")
+    assert top["peer"].tolist() == ["93.184.216.34", "1.1.1.1"]
+    assert top["estimate"].tolist() == [6.0, 3.0]
+    assert top.attrs["total"] == 9.0
+
+    with pytest.raises(ValueError):
+        tracker.add(1000.0, hi, lo, bytes_sent=sockets)
+
+def test_no_connected_sockets(tmp_path):
+    (tmp_path / "net").mkdir()
+    (tmp_path / "net" / "tcp").write_text(HEADER)
+    assert ProcNetPeers(procfs_root=str(tmp_path)).connections() is None
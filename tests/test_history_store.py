@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from utils.history_store import HistoryStore
+
+SCHEMA = {
+    "timestamp": "datetime64[ns]", "interface": "category", "ip_address": "category", "bytes_sent": "int64",
+}
+
+def _rows(first, n, ifaces=("wlan0", "eth0")):
+    seq = np.arange(first, first + n)
+    return pd.DataFrame({
+        "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(seq, unit="s"),
+        "interface": [ifaces[i % len(ifaces)] for i in seq],
+        "ip_address": [f"10.0.{i // 256}.{i % 256}" for i in seq],  # a new address every row
+        "bytes_sent": seq * 10,
+    })
+
+def test_ring_wrap():
+    store = HistoryStore(capacity=8, schema=SCHEMA)
+    assert list(store.append(_rows(0, 5))) == [0, 1, 2, 3, 4]
+    assert list(store.seqs()) == [0, 1, 2, 3, 4]
+    assert list(store.view("bytes_sent")) == [0, 10, 20, 30, 40]
+
+    # past capacity: the oldest rows are recycled and the rest stay one contiguous view
+    store.append(_rows(5, 7))
+    assert store.total == 12 and len(store) == 8
+    assert list(store.seqs()) == list(range(4, 12))
+    assert list(store.view("bytes_sent")) == list(range(40, 120, 10))
+    assert list(store.view("bytes_sent", 3)) == [90, 100, 110]
+    assert list(store.seqs(3)) == [9, 10, 11]
+    assert store.view("bytes_sent").base is not None  # a view, not a copy
+    frame = store.to_frame()
+    assert list(frame.index) == list(range(4, 12))
+    assert list(frame["interface"]) == ["wlan0", "eth0"] * 4
+
+    # a batch larger than the capacity keeps only its newest rows
+    store.append(_rows(12, 20))
+    assert list(store.seqs()) == list(range(24, 32))
+    assert list(store.view("bytes_sent")) == list(range(240, 320, 10))
+
+    # rewrites of evicted rows are dropped; retained ones are logged by seq range
+    rewrites = store.rewrites
+    store.set("bytes_sent", [3, 25, 27], [-1, -2, -3])
+    store.set("bytes_sent", [0, 1], [-1, -1])
+    assert list(store.view("bytes_sent")[:4]) == [240, -2, 260, -3]
+    assert store.rewrites_since(rewrites) == [("bytes_sent", 25, 27)]
+    assert store.rewrites_since(store.rewrites) == []
+
+def test_rewrite_log_overflow():
+    store = HistoryStore(capacity=8, schema=SCHEMA)
+    store.append(_rows(0, 8))
+    rewrites = store.rewrites
+    for _ in range(300):
+        store.set("bytes_sent", [7], [0])
+    assert store.rewrites_since(rewrites) is None  # readers must recompute everything
+    assert len(store.rewrites_since(store.rewrites - 10)) == 10
+
+def test_category_dictionaries_stay_bounded():
+    store = HistoryStore(capacity=8, schema=SCHEMA)
+    for first in range(0, 200, 3):
+        store.append(_rows(first, 3))
+        assert len(store.categories("ip_address")) <= 2 * store.capacity + 3
+    assert store.total == 201
+
+    # the retained rows decode to the values appended, after every renumbering
+    frame = store.to_frame()
+    expected = _rows(193, 8)
+    assert list(frame["ip_address"]) == list(expected["ip_address"])
+    assert list(frame["interface"]) == list(expected["interface"])
+    assert store.categories("interface") == ["wlan0", "eth0"]  # nothing to drop
+    counts = store.value_counts("ip_address")
+    assert len(counts) == 8 and (counts == 1).all()
+    assert store.code_of("ip_address", "10.0.0.0") is None
+
+    # a compaction is reported as a rewrite of the column's retained rows
+    rewrites = store.rewrites
+    for first in range(201, 201 + 2 * store.capacity):
+        store.append(_rows(first, 1))
+        if store.rewrites_since(rewrites):
+            break
+    assert store.rewrites_since(rewrites) == [("ip_address", first - 8, first - 1)]
+    assert list(store.to_frame()["ip_address"]) == list(_rows(first - 7, 8)["ip_address"])
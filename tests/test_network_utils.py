@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+from utils.network_utils import AddressMap
+
+Counters = namedtuple("Counters", "bytes_sent bytes_recv")
+
+class FakeAddrs:
+    """net_if_addrs stand-in that counts reads."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def __call__(self):
+        self.reads += 1
+        return {"read": self.reads}
+
+def test_address_map_refresh_triggers():
+    addrs = FakeAddrs()
+    amap = AddressMap(max_age=60, net_if_addrs=addrs)
+    io = {"eth0": Counters(100, 200), "wlan0": Counters(10, 20)}
+    assert amap.get(io, mono=0.0) == {"read": 1}
+
+    # counters only moving forward on the same interfaces: no re-read
+    for t in range(1, 60):
+        io = {iface: Counters(c.bytes_sent + 5, c.bytes_recv + 5) for iface, c in io.items()}
+        assert amap.get(io, mono=float(t)) == {"read": 1}
+
+    # an interface appears, then disappears
+    io["tun0"] = Counters(0, 0)
+    assert amap.get(io, mono=60.0) == {"read": 2}
+    del io["tun0"]
+    assert amap.get(io, mono=61.0) == {"read": 3}
+
+    # counters going backwards: the interface was restarted
+    io["eth0"] = Counters(io["eth0"].bytes_sent + 1, 0)
+    assert amap.get(io, mono=62.0) == {"read": 4}
+    assert amap.get(io, mono=63.0) == {"read": 4}
+
+    # max_age passed since the last read
+    assert amap.get(io, mono=62.0 + 60) == {"read": 4}
+    assert amap.get(io, mono=62.0 + 60.5) == {"read": 5}
+    assert amap.refreshes == addrs.reads == 5
@@ -0,0 +1,77 @@
+import ipaddress
+import os
+import struct
+import numpy as np
+import pandas as pd
+
+from utils import geolocation, network_utils
+from utils.pcap_ingest import CaptureIngest
+from utils.synthetic import write_pcap
+from utils.constants import PCAP_LOCAL_NETS
+
+def read_pcap(path):
+    """(ts_ns, origlen, data) per record of a little-endian microsecond pcap."""
+    raw = open(path, "rb").read()
+    records, pos = [], 24
+    while pos < len(raw):
+        sec, usec, caplen, origlen = struct.unpack_from("<IIII", raw, pos)
+        records.append((sec * 1_000_000_000 + usec * 1_000, origlen, raw[pos + 16:pos + 16 + caplen]))
+        pos += 16 + caplen
+    return records
+
+def _block(btype, body):
+    body += b"\0" * (-len(body) % 4)
+    return struct.pack("<II", btype, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+def write_pcapng(path, records, name="wlan0"):
+    """The same packets as one pcapng section with nanosecond timestamps."""
+    options = struct.pack("<HH", 2, len(name)) + name.encode() + b"\0" * (-len(name) % 4)
+    options += struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0)
+    with open(path, "wb") as f:
+        f.write(_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1)))
+        f.write(_block(1, struct.pack("<HHI", 1, 0, 65535) + options))
+        for ts, origlen, data in records:
+            f.write(_block(6, struct.pack("<IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(data), origlen) + data))
+
+def _ingest(path, **options):
+    ingest = CaptureIngest(interval=1.0, chunk_packets=500, **options)
+    return pd.concat(list(ingest.iter_history(path)), ignore_index=True), ingest
+
+def test_pcap_and_pcapng_round_trip(tmp_path, monkeypatch):
+    def no_lookups(*args, **kwargs):
+        raise AssertionError("capture ingestion must not resolve locations")
+
+    monkeypatch.setattr(network_utils, "get_ip_geolocation", no_lookups)
+    monkeypatch.setattr(geolocation, "get_geo_service", no_lookups)
+    monkeypatch.chdir(tmp_path)
+
+    pcap = write_pcap(str(tmp_path / "capture.pcap"), 3_000, rate=500.0, seed=3)
+    records = read_pcap(pcap)
+    pcapng = str(tmp_path / "capture.pcapng")
+    write_pcapng(pcapng, records)
+
+    rows, ingest = _ingest(pcap)
+    assert ingest.packets == len(records) and ingest.non_ip == 0
+    assert (rows["location"] == "Unknown").all()
+    assert not os.path.exists(tmp_path / ".geo_cache.json")
+
+    # per-interval sums add up to the packets written
+    origlen = np.array([r[1] for r in records])
+    proto = np.array([r[2][23] for r in records])
+    local = [ipaddress.ip_network(net) for net in PCAP_LOCAL_NETS]
+    outbound = np.array([any(ipaddress.ip_address(r[2][26:30]) in net for net in local) for r in records])
+    assert rows["bytes_sent"].sum() == origlen[outbound].sum()
+    assert rows["bytes_recv"].sum() == origlen[~outbound].sum()
+    assert rows["tcp_segs"].sum() == (proto == 6).sum()
+    assert rows["udp_dgrams"].sum() == (proto == 17).sum()
+    assert rows["icmp_msgs"].sum() == (proto == 1).sum()
+    assert (rows["rx_packets"] + rows["tx_packets"]).sum() == len(records)
+    ts = np.array([r[0] for r in records])
+    assert len(rows) == len(np.unique(ts // 1_000_000_000))
+    assert rows["cum_bytes_sent"].iloc[-1] == rows["bytes_sent"].sum()
+
+    # the pcapng copy gives the same rows, under the interface name it records
+    ng_rows, ng_ingest = _ingest(pcapng)
+    assert ng_ingest.packets == ingest.packets
+    assert set(rows["interface"]) == {"capture"} and set(ng_rows["interface"]) == {"wlan0"}
+    pd.testing.assert_frame_equal(rows.drop(columns="interface"), ng_rows.drop(columns="interface"))
@@ -0,0 +1,111 @@
+import os
+
+from utils.protocol_stats import ProtocolSampler, PROTOCOL_COLUMNS, parse_kv_table, parse_net_dev
+
+DEV_HEADER = (
+    "Inter-|   Receive                                                |  Transmit\n"
+    " face |bytes    packets errs drop fifo frame compressed multicast"
+    "|bytes    packets errs drop fifo colls carrier compressed\n"
+)
+
+def _table(sections):
+    lines = []
+    for section, fields in sections.items():
+        lines.append(f"{section}: " + " ".join(fields))
+        lines.append(f"{section}: " + " ".join(str(v) for v in fields.values()))
+    return "\n".join(lines) + "\n"
+
+def write_procfs(root, tcp=(0, 0), retrans=0, timeouts=0, udp=(0, 0), icmp=(0, 0), hdr_errors=0, dev=None):
+    """
+    A fixture procfs: snmp/netstat counters and /proc/net/dev rows of
+    iface -> (rx packets, tx packets, rx errors, rx drops).
+    """
+    net = os.path.join(root, "net")
+    os.makedirs(net, exist_ok=True)
+    snmp = _table({
+        "Ip": {"Forwarding": 1, "InReceives": 0, "InHdrErrors": hdr_errors},
+        "Icmp": {"InMsgs": icmp[0], "InErrors": 0, "OutMsgs": icmp[1]},
+        "IcmpMsg": {"InType3": 7},
+        "Tcp": {"ActiveOpens": 4, "InSegs": tcp[0], "OutSegs": tcp[1], "RetransSegs": retrans, "InErrs": 0},
+        "Udp": {"InDatagrams": udp[0], "NoPorts": 0, "InErrors": 0, "OutDatagrams": udp[1]},
+    })
+    netstat = _table({"TcpExt": {"SyncookiesSent": 0, "TCPTimeouts": timeouts}})
+    rows = [
+        f"{iface:>6}: {rx * 100} {rx} {errs} {drops} 0 0 0 0 {tx * 100} {tx} 0 0 0 0 0 0"
+        for iface, (rx, tx, errs, drops) in (dev or {}).items()
+    ]
+    for name, text in (("snmp", snmp), ("netstat", netstat), ("dev", DEV_HEADER + "\n".join(rows) + "\n")):
+        with open(os.path.join(net, name), "w") as f:
+            f.write(text)
+
+def test_parse_kv_table_and_net_dev(tmp_path):
+    write_procfs(str(tmp_path), tcp=(100, 80), retrans=3, timeouts=2,
+                 dev={"lo": (5, 5, 0, 0), "eth0": (30, 20, 1, 2)})
+    snmp = (tmp_path / "net" / "snmp").read_bytes()
+    tables = parse_kv_table(snmp, {"Tcp", "Udp"})
+    assert set(tables) == {"Tcp", "Udp"}
+    assert tables["Tcp"]["InSegs"] == 100 and tables["Tcp"]["RetransSegs"] == 3
+    netstat = parse_kv_table((tmp_path / "net" / "netstat").read_bytes(), {"TcpExt"})
+    assert netstat == {"TcpExt": {"SyncookiesSent": 0, "TCPTimeouts": 2}}
+
+    dev = parse_net_dev((tmp_path / "net" / "dev").read_bytes())
+    assert dev == {"lo": (5, 5, 0, 0), "eth0": (30, 20, 1, 2)}
+
+def test_deltas_split_by_packet_share(tmp_path):
+    root = str(tmp_path)
+    write_procfs(root, tcp=(1000, 1000), retrans=10, timeouts=5, udp=(50, 50),
+                 dev={"eth0": (100, 100, 0, 0), "wlan0": (100, 100, 0, 0)})
+    sampler = ProtocolSampler(procfs_root=root)
+    first = sampler.sample(["eth0", "wlan0"])
+    assert first["eth0"] == dict.fromkeys(PROTOCOL_COLUMNS, 0) | {"protocol": "IDLE"}
+
+    # eth0 moved 3/4 of the packets in the interval
+    write_procfs(root, tcp=(1060, 1020), retrans=14, timeouts=9, udp=(50, 70), icmp=(2, 2), hdr_errors=4,
+                 dev={"eth0": (160, 100, 1, 3), "wlan0": (110, 110, 0, 0)})
+    rows = sampler.sample(["eth0", "wlan0"])
+    eth0, wlan0 = rows["eth0"], rows["wlan0"]
+    assert (eth0["rx_packets"], eth0["tx_packets"]) == (60, 0)
+    assert (eth0["iface_errors"], eth0["iface_drops"]) == (1, 3)
+    assert (wlan0["rx_packets"], wlan0["tx_packets"]) == (10, 10)
+    assert (eth0["tcp_segs"], wlan0["tcp_segs"]) == (60, 20)
+    assert (eth0["udp_dgrams"], wlan0["udp_dgrams"]) == (15, 5)
+    assert (eth0["icmp_msgs"], wlan0["icmp_msgs"]) == (3, 1)
+    assert (eth0["proto_errors"], wlan0["proto_errors"]) == (3, 1)
+    # RetransSegs only: TCPTimeouts are already counted in it
+    assert eth0["tcp_retrans"] + wlan0["tcp_retrans"] == 4
+    assert eth0["protocol"] == wlan0["protocol"] == "TCP"
+
+def test_counters_going_backwards(tmp_path):
+    root = str(tmp_path)
+    write_procfs(root, tcp=(500, 500), udp=(10, 10), dev={"eth0": (200, 200, 4, 4)})
+    sampler = ProtocolSampler(procfs_root=root)
+    sampler.sample(["eth0"])
+
+    # the interface was re-created and the host counters reset: no negative deltas
+    write_procfs(root, tcp=(20, 20), udp=(30, 10), dev={"eth0": (5, 5, 0, 0)})
+    row = sampler.sample(["eth0"])["eth0"]
+    assert all(row[col] == 0 for col in PROTOCOL_COLUMNS)
+    assert row["protocol"] == "IDLE"
+
+    # deltas resume from the new baseline
+    write_procfs(root, tcp=(30, 30), udp=(30, 10), dev={"eth0": (15, 15, 0, 0)})
+    row = sampler.sample(["eth0"])["eth0"]
+    assert (row["tcp_segs"], row["rx_packets"], row["tx_packets"]) == (20, 10, 10)
+
+def test_interfaces_sampled_on_their_own_schedule(tmp_path):
+    root = str(tmp_path)
+    write_procfs(root, tcp=(0, 0), dev={"eth0": (0, 0, 0, 0), "wlan0": (0, 0, 0, 0)})
+    sampler = ProtocolSampler(procfs_root=root)
+    sampler.sample(["eth0", "wlan0"])
+    write_procfs(root, tcp=(10, 10), dev={"eth0": (10, 10, 0, 0), "wlan0": (0, 0, 0, 0)})
+    assert sampler.sample(["eth0"])["eth0"]["tcp_segs"] == 20
+
+    # wlan0's interval spans both changes
+    write_procfs(root, tcp=(20, 20), dev={"eth0": (10, 10, 0, 0), "wlan0": (10, 10, 0, 0)})
+    rows = sampler.sample(["eth0", "wlan0"])
+    assert rows["eth0"]["tcp_segs"] == 0
+    assert rows["wlan0"]["tcp_segs"] == 20  # half the packets since its last sample
+
+def test_missing_procfs(tmp_path):
+    rows = ProtocolSampler(procfs_root=str(tmp_path)).sample(["eth0"])
+    assert rows["eth0"] == dict.fromkeys(PROTOCOL_COLUMNS, 0) | {"protocol": "N/A"}
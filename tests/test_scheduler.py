@@ -0,0 +1,80 @@
+from utils.scheduler import AdaptiveScheduler, BURST, ACTIVE, IDLE
+
+QUIET = {"interval_s": 1.0, "sent_rate": 100.0, "recv_rate": 100.0}
+BUSY = {"interval_s": 1.0, "sent_rate": 50_000.0, "recv_rate": 50_000.0,
+        "sent_rate_mean": 50_000.0, "sent_rate_std": 5_000.0, "sent_rate_z": 0.5}
+
+def _tick(scheduler, now, rows):
+    """Sample every due interface at monotonic `now` with the given rows."""
+    due = scheduler.due(list(rows), now)
+    for iface in due:
+        scheduler.observe(iface, rows[iface], now)
+    return due
+
+def test_classify():
+    scheduler = AdaptiveScheduler(base=1.0, fast=0.1, slow=8.0, idle_rate=512, burst_z=3.0, burst_cv=1.0)
+    assert scheduler.classify(QUIET) == IDLE
+    assert scheduler.classify(BUSY) == ACTIVE
+    assert scheduler.classify(BUSY | {"anomaly": -1}) == BURST
+    assert scheduler.classify(QUIET | {"anomaly": -1}) == BURST  # a label wins over the rate
+    assert scheduler.classify(BUSY | {"recv_rate_z": -4.0}) == BURST
+    assert scheduler.classify(BUSY | {"sent_rate_std": 60_000.0}) == BURST
+    assert scheduler.classify(BUSY | {"sent_rate_z": float("nan")}) == ACTIVE
+
+def test_burst_active_idle_transitions():
+    scheduler = AdaptiveScheduler(base=1.0, fast=0.1, slow=8.0)
+    now = 0.0
+    # the first sample has no interval yet: it keeps the base interval
+    assert _tick(scheduler, now, {"eth0": {"interval_s": 0.0}}) == ["eth0"]
+    assert scheduler.rates()["eth0"]["state"] == ACTIVE
+    assert scheduler.next_due(now) == 1.0
+
+    # idle: the interval doubles up to `slow`
+    intervals = []
+    for _ in range(6):
+        now = scheduler.next_due(now)
+        assert _tick(scheduler, now, {"eth0": QUIET}) == ["eth0"]
+        intervals.append(scheduler.rates()["eth0"]["interval_s"])
+    assert intervals == [2.0, 4.0, 8.0, 8.0, 8.0, 8.0]
+    assert scheduler.rates()["eth0"]["state"] == IDLE
+
+    # not due yet: nothing to sample until the idle interval has passed
+    assert _tick(scheduler, now + 1.0, {"eth0": QUIET}) == []
+
+    # a burst drops straight to the fast interval
+    now = scheduler.next_due(now)
+    _tick(scheduler, now, {"eth0": BUSY | {"anomaly": -1}})
+    rates = scheduler.rates()["eth0"]
+    assert (rates["state"], rates["interval_s"], rates["samples"]) == (BURST, 0.1, 8)
+    assert scheduler.next_due(now) == now + 0.1
+
+    # back to active: doubles back up to `base`, never beyond
+    intervals = []
+    for _ in range(5):
+        now = scheduler.next_due(now)
+        _tick(scheduler, now, {"eth0": BUSY})
+        intervals.append(scheduler.rates()["eth0"]["interval_s"])
+    assert intervals == [0.2, 0.4, 0.8, 1.0, 1.0]
+    assert scheduler.rates()["eth0"]["state"] == ACTIVE
+
+def test_interfaces_due_together_share_a_read():
+    scheduler = AdaptiveScheduler(base=1.0, fast=0.1, slow=8.0)
+    assert _tick(scheduler, 0.0, {"eth0": {}, "wlan0": {}}) == ["eth0", "wlan0"]
+    # wlan0 was sampled slightly later, but within half a fast interval
+    scheduler.observe("wlan0", {}, 0.04)
+    assert _tick(scheduler, 1.0, {"eth0": BUSY, "wlan0": BUSY}) == ["eth0", "wlan0"]
+
+    # an interface no longer listed is forgotten
+    scheduler.due(["eth0"], 2.0)
+    assert set(scheduler.rates()) == {"eth0"}
+
+def test_fixed_rate_schedule():
+    scheduler = AdaptiveScheduler(base=2.0, fast=2.0, slow=2.0)
+    assert not scheduler.adaptive
+    now = 0.0
+    for row in ({"interval_s": 0.0}, QUIET, BUSY | {"anomaly": -1}, QUIET):
+        assert _tick(scheduler, now, {"eth0": row}) == ["eth0"]
+        assert scheduler.rates()["eth0"]["interval_s"] == 2.0
+        now = scheduler.next_due(now)
+    assert now == 8.0
+    assert scheduler.rates()["eth0"]["state"] == ACTIVE
@@ -0,0 +1,63 @@
+import glob
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from utils.timeseries_store import ParquetStore, compute_rollup
+
+def _samples(start, n, iface="wlan0"):
+    return pd.DataFrame({
+        "timestamp": pd.date_range(start, periods=n, freq="s"),
+        "interface": iface,
+        "ip_address": "N/A",
+        "bytes_sent": np.arange(n, dtype=np.int64),
+        "bytes_recv": np.arange(n, dtype=np.int64) * 2,
+    })
+
+def test_query_over_written_partitions(tmp_path):
+    store = ParquetStore(str(tmp_path), batch_rows=10, compact_files=3)
+    now = datetime.now().replace(microsecond=0)
+    for k in range(7):
+        store.write(_samples(now - timedelta(minutes=30 - k), 10))
+    store.flush()
+
+    # datetime bounds are microsecond Timestamps; query_recent passes them as is
+    recent = store.query_recent(timedelta(hours=1), level="raw")
+    assert len(recent) == 70
+    assert recent["timestamp"].is_monotonic_increasing
+
+    start = pd.Timestamp(now - timedelta(minutes=30)).as_unit("s")
+    part = store.query(start, start + pd.Timedelta(seconds=4), level="raw", columns=["bytes_sent"])
+    assert list(part.columns) == ["timestamp", "bytes_sent"]
+    assert part["bytes_sent"].tolist() == [0, 1, 2, 3, 4]
+    assert store.query(now - timedelta(hours=1), now, level="raw", interfaces=["eth0"]).empty
+
+def test_compaction_keeps_compacted_files_and_rollups_exact(tmp_path):
+    store = ParquetStore(str(tmp_path), batch_rows=10, compact_files=2)
+    start = pd.Timestamp(datetime.now().date()) + pd.Timedelta(hours=1, minutes=59, seconds=50)
+    frames = [_samples(start + pd.Timedelta(seconds=10 * k), 10) for k in range(6)]
+    for frame in frames[:4]:
+        store.write(frame)
+    day = start.strftime("%Y-%m-%d")
+    raw_dir = os.path.join(str(tmp_path), "raw", f"date={day}")
+    compacted = sorted(glob.glob(os.path.join(raw_dir, "compacted-*.parquet")))
+    assert len(compacted) == 2
+    for frame in frames[4:]:
+        store.write(frame)
+    # the earlier compacted files are not rewritten
+    assert set(compacted) < set(glob.glob(os.path.join(raw_dir, "compacted-*.parquet")))
+
+    raw = pd.concat(frames, ignore_index=True)
+    for level in ("1min", "1h"):
+        rollup = store.query(start.floor("1D"), start.ceil("1D"), level=level)
+        expected = compute_rollup(raw, level)
+        pd.testing.assert_frame_equal(rollup[expected.columns], expected, check_dtype=False)
+    daily = store.query(start.floor("1D"), start.ceil("1D"), level="1d")
+    assert daily["samples"].tolist() == [60]
+    assert daily["bytes_sent"].tolist() == [raw["bytes_sent"].sum()]
+    assert daily["bytes_sent_max"].tolist() == [raw["bytes_sent"].max()]
+
+    store.compact_all()
+    daily = store.query(start.floor("1D"), start.ceil("1D"), level="1d")
+    pd.testing.assert_frame_equal(daily, compute_rollup(raw, "1d"), check_dtype=False)
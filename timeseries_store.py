@@ -0,0 +1,291 @@
+import glob
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.protocol_stats import PROTOCOL_COLUMNS
+from utils.constants import (
+    PARQUET_DIR, PARQUET_BATCH_ROWS, PARQUET_FLUSH_SECONDS, PARQUET_ROW_GROUP_ROWS,
+    PARQUET_COMPACT_FILES
+)
+
+# columns persisted for raw samples (location is display-only and stays in memory)
+RAW_COLUMNS = [
+    "timestamp", "interface", "ip_address", "bytes_sent", "bytes_recv",
+    "cum_bytes_sent", "cum_bytes_recv", "interval_s", *PROTOCOL_COLUMNS, "protocol",
+    "anomaly", "anomaly_score",
+]
+ROLLUP_LEVELS = {"1min": "1min", "1h": "1h", "1d": "1D"}
+ROLLUP_METRICS = ["bytes_sent", "bytes_recv"]
+ROLLUP_SUMS = PROTOCOL_COLUMNS  # summed per bucket (no percentiles)
+# widest time span each level is used for when picking a level automatically
+AUTO_LEVELS = [
+    ("raw", timedelta(hours=2)),
+    ("1min", timedelta(days=2)),
+    ("1h", timedelta(days=90)),
+    ("1d", None),
+]
+
+def _partition_dir(root, level, day):
+    return os.path.join(root, level, f"date={day}")
+
+def _ns_scalar(ts):
+    # Timestamp.value is nanoseconds whatever the Timestamp's unit (datetime -> us)
+    return pa.scalar(pd.Timestamp(ts).value, pa.timestamp("ns"))
+
+def _concat_tables(tables):
+    try:
+        return pa.concat_tables(tables, promote_options="default")
+    except TypeError:  # pyarrow < 14
+        return pa.concat_tables(tables, promote=True)
+
+def compute_rollup(df, level):
+    """
+    Aggregate raw samples into `level` buckets per interface: sample count and the
+    sum / max / p50 / p95 / p99 of each metric, plus summed protocol counters.
+    bytes_sent / bytes_recv hold the bucket sums so rollups can be plotted like raw history.
+    """
+    if df.empty:
+        return pd.DataFrame()
+    df = df.assign(timestamp=pd.to_datetime(df["timestamp"]).dt.floor(ROLLUP_LEVELS[level]))
+    grouped = df.groupby(["timestamp", "interface"], observed=True)
+    out = grouped.size().rename("samples").to_frame()
+    for col in ROLLUP_METRICS:
+        g = grouped[col]
+        out[col] = g.sum()
+        out[f"{col}_max"] = g.max()
+        for q in (50, 95, 99):
+            out[f"{col}_p{q}"] = g.quantile(q / 100)
+    for col in ROLLUP_SUMS:
+        if col in df.columns:
+            out[col] = grouped[col].sum()
+    out = out.reset_index()
+    out["interface"] = out["interface"].astype(str)
+    return out
+
+def _day_from_hours(hours):
+    """
+    A day's 1d rollup from its 1h rollup: sample counts, sums and maxima are exact,
+    percentiles are the sample-weighted mean of the hourly ones (used until the day is
+    over and its 1d rollup is rebuilt from raw rows).
+    """
+    if hours.empty:
+        return pd.DataFrame()
+    hours = hours.assign(timestamp=hours["timestamp"].dt.floor("1D"))
+    weighted = [c for c in hours.columns if c.rsplit("_", 1)[-1] in ("p50", "p95", "p99")]
+    hours[weighted] = hours[weighted].mul(hours["samples"], axis=0)
+    grouped = hours.groupby(["timestamp", "interface"])
+    out = grouped.sum()
+    for col in ROLLUP_METRICS:
+        out[f"{col}_max"] = grouped[f"{col}_max"].max()
+    out[weighted] = out[weighted].div(out["samples"], axis=0)
+    return out.reset_index()[hours.columns]
+
+class ParquetStore:
+    """
+    Append-only, day-partitioned Parquet history with precomputed rollups.
+
+    Layout under root: raw/date=YYYY-MM-DD/*.parquet and
+    rollup_<level>/date=YYYY-MM-DD/rollup.parquet for 1min, 1h and 1d.
+    write() buffers samples and flushes them in batches; once a day partition has
+    PARQUET_COMPACT_FILES small files they are merged into one file with large row
+    groups and the rollups for the hours they cover are rebuilt (so rollups for the
+    current day lag raw data by at most PARQUET_COMPACT_FILES flushes). query() reads
+    through pyarrow.dataset so partition/row-group filters and column selection are
+    pushed down.
+    """
+
+    def __init__(self, root=PARQUET_DIR, batch_rows=PARQUET_BATCH_ROWS,
+                 flush_seconds=PARQUET_FLUSH_SECONDS, row_group_rows=PARQUET_ROW_GROUP_ROWS,
+                 compact_files=PARQUET_COMPACT_FILES):
+        self.root = root
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.row_group_rows = row_group_rows
+        self.compact_files = compact_files
+        self._buffer = []
+        self._buffered_rows = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._io_lock = threading.RLock()  # serialises file writes/compaction across threads
+        os.makedirs(os.path.join(root, "raw"), exist_ok=True)
+
+    # -- writes ---------------------------------------------------------------
+
+    def write(self, df):
+        """Buffer samples; flushes when the batch is full or old enough."""
+        if df is None or df.empty:
+            return
+        cols = [c for c in RAW_COLUMNS if c in df.columns]
+        with self._lock:
+            self._buffer.append(df[cols])
+            self._buffered_rows += len(df)
+            due = (self._buffered_rows >= self.batch_rows
+                   or time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            batch = pd.concat(self._buffer, ignore_index=True)
+            self._buffer = []
+            self._buffered_rows = 0
+            self._last_flush = time.monotonic()
+        batch["timestamp"] = pd.to_datetime(batch["timestamp"])
+        for col in ("interface", "ip_address", "protocol"):
+            if col in batch.columns:
+                batch[col] = batch[col].astype(str)
+        days = batch["timestamp"].dt.strftime("%Y-%m-%d")
+        with self._io_lock:
+            for day, part in batch.groupby(days):
+                path = _partition_dir(self.root, "raw", day)
+                os.makedirs(path, exist_ok=True)
+                table = pa.Table.from_pandas(part.reset_index(drop=True), preserve_index=False)
+                pq.write_table(table, os.path.join(path, f"part-{uuid.uuid4().hex}.parquet"))
+                if len(glob.glob(os.path.join(path, "part-*.parquet"))) >= self.compact_files:
+                    self.compact(day)
+            # days before the newest one in the batch are over (or got late rows):
+            # compact what's left of them and make their 1d rollups exact
+            newest = days.max()
+            closed = set(days[days < newest])
+            for path in glob.glob(os.path.join(self.root, "raw", "date=*")):
+                day = os.path.basename(path).split("=", 1)[1]
+                if day < newest and glob.glob(os.path.join(path, "part-*.parquet")):
+                    closed.add(day)
+            for day in sorted(closed):
+                self.compact(day, final=True)
+
+    def compact(self, day, final=False):
+        """
+        Merge a day's small raw files into one sorted file and bring its rollups up to
+        date. Earlier compacted files are not rewritten: the 1min and 1h rollups are
+        rebuilt for the hours the merged rows fall in only, and the 1d rollup is derived
+        from the 1h one. final=True (the day is over) rebuilds the 1d rollup from all of
+        the day's raw rows, once.
+        """
+        path = _partition_dir(self.root, "raw", day)
+        with self._io_lock:
+            files = sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+            if files:
+                self._merge_files(day, files)
+            if final:
+                self._write_rollup(day, "1d", compute_rollup(self._read_raw(day), "1d"))
+
+    def _merge_files(self, day, files):
+        path = _partition_dir(self.root, "raw", day)
+        table = _concat_tables([pq.read_table(f) for f in files]).sort_by("timestamp")
+        tmp = os.path.join(path, f".compacted-{uuid.uuid4().hex}.tmp")
+        pq.write_table(table, tmp, row_group_size=self.row_group_rows)
+        os.replace(tmp, os.path.join(path, f"compacted-{uuid.uuid4().hex}.parquet"))
+        for f in files:
+            os.remove(f)
+        timestamps = table.column("timestamp").to_pandas()
+        first = timestamps.min().floor("1h")
+        last = timestamps.max().floor("1h") + pd.Timedelta(hours=1)
+        raw = self._read_raw(day, first, last)
+        for level in ("1min", "1h"):
+            self._merge_rollup(day, level, compute_rollup(raw, level), first, last)
+        self._write_rollup(day, "1d", _day_from_hours(self._read_rollup(day, "1h")))
+
+    def _read_raw(self, day, start=None, end=None):
+        """A day's raw rows (start <= timestamp < end if given), rollup columns only."""
+        dataset = ds.dataset(_partition_dir(self.root, "raw", day), format="parquet")
+        wanted = ["timestamp", "interface", *ROLLUP_METRICS, *ROLLUP_SUMS]
+        expr = None
+        if start is not None:
+            expr = (ds.field("timestamp") >= _ns_scalar(start)) & (ds.field("timestamp") < _ns_scalar(end))
+        columns = [c for c in wanted if c in dataset.schema.names]
+        return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+    def _read_rollup(self, day, level):
+        path = os.path.join(_partition_dir(self.root, f"rollup_{level}", day), "rollup.parquet")
+        return pq.read_table(path).to_pandas() if os.path.exists(path) else pd.DataFrame()
+
+    def _merge_rollup(self, day, level, rollup, start, end):
+        """Replace a day's `level` rollup rows in [start, end) with `rollup`."""
+        if rollup.empty:
+            return
+        old = self._read_rollup(day, level)
+        if not old.empty:
+            old = old[(old["timestamp"] < start) | (old["timestamp"] >= end)]
+            rollup = pd.concat([old, rollup], ignore_index=True)
+        self._write_rollup(day, level, rollup.sort_values(["timestamp", "interface"], kind="stable"))
+
+    def _write_rollup(self, day, level, rollup):
+        if rollup.empty:
+            return
+        path = _partition_dir(self.root, f"rollup_{level}", day)
+        os.makedirs(path, exist_ok=True)
+        tmp = os.path.join(path, ".rollup.tmp")
+        pq.write_table(pa.Table.from_pandas(rollup.reset_index(drop=True), preserve_index=False), tmp)
+        os.replace(tmp, os.path.join(path, "rollup.parquet"))
+
+    def compact_all(self):
+        """Flush and compact every raw partition (e.g. on shutdown or from cron)."""
+        self.flush()
+        for path in glob.glob(os.path.join(self.root, "raw", "date=*")):
+            self.compact(os.path.basename(path).split("=", 1)[1], final=True)
+
+    # -- reads ----------------------------------------------------------------
+
+    def pick_level(self, start, end):
+        span = pd.Timestamp(end) - pd.Timestamp(start)
+        for level, widest in AUTO_LEVELS:
+            if widest is None or span <= widest:
+                return level
+        return "1d"
+
+    def query(self, start, end=None, level="auto", columns=None, interfaces=None):
+        """
+        Samples (or rollup rows) with start <= timestamp <= end. level is "raw",
+        "1min", "1h", "1d" or "auto" (chosen from the span). Only the partitions,
+        row groups and columns needed are read.
+        """
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp.now()
+        start = pd.Timestamp(start)
+        if level == "auto":
+            level = self.pick_level(start, end)
+        if level == "raw":
+            # make buffered samples visible; rollups catch up when their day is compacted
+            self.flush()
+        base = os.path.join(self.root, "raw" if level == "raw" else f"rollup_{level}")
+        if not glob.glob(os.path.join(base, "date=*", "*.parquet")):
+            return pd.DataFrame()
+        partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+        dataset = ds.dataset(base, format="parquet", partitioning=partitioning)
+        days = [d.strftime("%Y-%m-%d") for d in pd.date_range(start.normalize(), end.normalize(), freq="D")]
+        expr = (
+            ds.field("date").isin(days)
+            & (ds.field("timestamp") >= _ns_scalar(start))
+            & (ds.field("timestamp") <= _ns_scalar(end))
+        )
+        if interfaces:
+            expr = expr & ds.field("interface").isin(list(interfaces))
+        if columns is not None:
+            columns = [c for c in dict.fromkeys(["timestamp", *columns]) if c in dataset.schema.names]
+        df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+        if "date" in df.columns:
+            df = df.drop(columns="date")
+        return df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+    def query_recent(self, span, level="auto", columns=None, interfaces=None):
+        end = datetime.now()
+        return self.query(end - span, end, level=level, columns=columns, interfaces=interfaces)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_parquet_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ParquetStore()
+        return _store
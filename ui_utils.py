@@ -1,5 +1,7 @@
 import streamlit as st
 import random
+import pandas as pd
+from datetime import timedelta
 
 PIO_SETTINGS = {
     # kept empty here; plotting style controlled in each module
@@ -29,3 +31,110 @@ def load_css():
 
 def show_quote():
     st.markdown(f"<h3 style='text-align: center; color: #4CAF50;'>{random.choice(QUOTES)}</h3>", unsafe_allow_html=True)
+
+HISTORY_RANGES = {
+    "Live (in memory)": None,
+    "Last hour": timedelta(hours=1),
+    "Last day": timedelta(days=1),
+    "Last week": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+}
+CAPTURE_RANGE = "Capture file (pcap/pcapng)"
+
+def capture_frame(path):
+    """
+    History frame for a replayed capture (utils.pcap_ingest.load_capture), kept in
+    the session until the file changes.
+    """
+    import os
+    stat = os.stat(path)
+    version = ("pcap", os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    cached = st.session_state.get("capture_frame")
+    if cached is None or cached[0] != version:
+        from utils.pcap_ingest import load_capture
+        with st.spinner("Parsing capture..."):
+            store, ingest = load_capture(path)
+        df = store.to_frame()
+        df.attrs["version"] = version
+        st.session_state.capture_frame = cached = (version, df, ingest.packets, ingest.packets_per_second)
+    _, df, packets, rate = cached
+    st.caption(f"{packets:,} packets -> {len(df):,} rows (parsed at {rate:,.0f} packets/s).")
+    return df
+
+LOCAL_HOST = "This machine"
+
+def host_selector():
+    """Sidebar choice between this machine and the hosts reporting to the aggregator."""
+    from utils.aggregator import get_aggregator
+    aggregator = get_aggregator()
+    if not aggregator.running:
+        st.caption(f"Aggregator not running: {aggregator.last_error}")
+        return
+    st.selectbox("Host", [LOCAL_HOST] + sorted(aggregator.hosts), key="host")
+    st.session_state.history = selected_source()[0]
+
+def selected_source():
+    """(history store, detector) for the host picked with host_selector()."""
+    host = st.session_state.get("host", LOCAL_HOST)
+    if host != LOCAL_HOST:
+        from utils.aggregator import get_aggregator
+        state = get_aggregator().hosts.get(host)
+        if state is not None:
+            return state.store, state.detector
+    from utils.collector import get_collector
+    collector = get_collector()
+    return collector.store, collector.detector
+
+def history_range_selector(key):
+    """
+    Lets a page pick between the in-memory history and a span of the persisted
+    Parquet store. Older spans come back as rollups (bucket sums in bytes_sent /
+    bytes_recv), picked automatically from the span length.
+    """
+    # only this machine's samples are persisted; remote hosts are live-only
+    local = st.session_state.get("host", LOCAL_HOST) == LOCAL_HOST
+    choices = [k for k, v in HISTORY_RANGES.items() if local or v is None] + [CAPTURE_RANGE]
+    choice = st.selectbox("Time range", choices, key=key)
+    if choice == CAPTURE_RANGE:
+        path = st.text_input("Capture path", key=f"{key}_capture")
+        if not path:
+            return pd.DataFrame()
+        try:
+            return capture_frame(path)
+        except (OSError, ValueError) as exc:
+            st.error(f"Cannot read capture: {exc}")
+            return pd.DataFrame()
+    span = HISTORY_RANGES[choice]
+    if span is None:
+        # one shared frame per store version: switching pages with no new samples reuses it
+        from utils.analysis_cache import live_frame
+        return live_frame(st.session_state.history)
+    from utils.timeseries_store import get_parquet_store
+    store = get_parquet_store()
+    df = store.query_recent(span)
+    if not df.empty and "samples" in df.columns:
+        st.caption(f"Showing {len(df)} rollup buckets for {choice.lower()}.")
+    return df
+
+def diagnostics_panel():
+    """Sidebar table of per-stage latency (see utils.metrics) and where /metrics is served."""
+    from utils.metrics import registry
+    from utils.constants import METRICS_HOST, METRICS_PORT, FIRST_RENDER_BUDGET
+    with st.expander("🩺 Diagnostics"):
+        first = st.session_state.get("first_render_seconds")
+        if first is not None:
+            (st.caption if first <= FIRST_RENDER_BUDGET else st.warning)(
+                f"First render {first:.2f}s (budget {FIRST_RENDER_BUDGET:g}s)"
+            )
+        if not registry.enabled:
+            st.caption("Instrumentation is disabled (METRICS_ENABLED).")
+            return
+        rows = registry.snapshot()
+        if not rows:
+            st.caption("No timings recorded yet.")
+        else:
+            st.dataframe(
+                [{k: (round(v, 2) if isinstance(v, float) else v) for k, v in row.items()} for row in rows],
+                hide_index=True,
+            )
+        st.caption(f"Prometheus: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
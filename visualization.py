@@ -1,58 +1,32 @@
 import streamlit as st
-import plotly.express as px
-import pandas as pd
-from utils.constants import PLOTLY_CONFIG
+from utils.constants import PLOTLY_CONFIG, CHART_POINTS_2D, CHART_POINTS_3D
+from utils.ui_utils import history_range_selector
+from utils.chart_utils import figure_cache, data_version, traffic_timeseries, traffic_3d
+from utils.metrics import instrument
 
+@instrument("page.visualization")
 def visualization():
     st.title("📊 Network Data Visualization")
-    df = st.session_state.history.copy()
+    df = history_range_selector(key="visualization_range")
     if df.empty:
         st.info("No network data to visualize. Please use the real-time monitor first.")
         return
 
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    # figures are cached by data version: reruns with no new samples reuse them as-is
+    version = data_version(df)
 
-    # plot per-interval bytes_sent over time
-    fig2d = px.scatter(
-        df,
-        x="timestamp",
-        y="bytes_sent",
-        color="interface",
-        symbol="interface",
-        title="Bytes Sent (per-interval) Over Time",
-        labels={"bytes_sent": "Bytes Sent (per-interval)", "timestamp": "Time", "interface": "Interface"},
-        template="plotly_dark",
-    )
-    fig2d.update_traces(marker=dict(size=10, line=dict(width=1)))
-    fig2d.update_layout(
-        xaxis=dict(showgrid=True),
-        yaxis=dict(showgrid=True),
-        legend=dict(title="Interface", orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    # plot per-interval bytes_sent over time (WebGL, LTTB-downsampled per interface)
+    fig2d = figure_cache.get_or_build(
+        ("2d", version, CHART_POINTS_2D),
+        lambda: traffic_timeseries(df, points=CHART_POINTS_2D),
     )
     st.plotly_chart(fig2d, config=PLOTLY_CONFIG, use_container_width=True)
 
-    df["timestamp_float"] = df["timestamp"].apply(lambda x: x.timestamp())
-    fig3d = px.scatter_3d(
-        df,
-        x="bytes_sent",
-        y="bytes_recv",
-        z="timestamp_float",
-        color="interface",
-        title="3D Network Traffic (per-interval)",
-        labels={
-            "bytes_sent": "Bytes Sent",
-            "bytes_recv": "Bytes Received",
-            "timestamp_float": "Time"
-        },
-        template="plotly_dark",
-    )
-    fig3d.update_traces(marker=dict(size=6))
-    fig3d.update_layout(
-        scene=dict(
-            xaxis_title="Bytes Sent",
-            yaxis_title="Bytes Received",
-            zaxis_title="Time",
-        ),
-        legend=dict(title="Interface")
+    fig3d = figure_cache.get_or_build(
+        ("3d", version, CHART_POINTS_3D),
+        lambda: traffic_3d(df, points=CHART_POINTS_3D),
     )
     st.plotly_chart(fig3d, config=PLOTLY_CONFIG, use_container_width=True)
+    if len(df) > CHART_POINTS_2D:
+        st.caption(f"{len(df):,} samples downsampled to ~{CHART_POINTS_2D:,} points per interface (2D) "
+                   f"and {CHART_POINTS_3D:,} points (3D).")